@@ -1,3 +1,5 @@
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro, para o tempo total incluir os outros middlewares (core/perfilamento.py)
+    'core.perfilamento.PerfilamentoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,7 +47,8 @@ ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mede o tempo de renderização para o perfilamento
+        'BACKEND': 'core.perfilamento.TemplatesMedidos',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,6 +75,74 @@ DATABASES = {
     }
 }
 
+# Perfil de produção do SQLite, ativado com DJANGO_DB_PERFIL=producao:
+# WAL (leitores não bloqueiam o escritor), conexões persistentes com
+# verificação de saúde e transações IMMEDIATE para não falhar com
+# "database is locked" ao promover uma leitura a escrita.
+SQLITE_PRODUCAO = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA busy_timeout=20000;'
+            'PRAGMA cache_size=-65536;'
+            'PRAGMA mmap_size=268435456;'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    },
+}
+
+if os.environ.get('DJANGO_DB_PERFIL') == 'producao':
+    DATABASES['default'].update(SQLITE_PRODUCAO)
+
+# Mensagens, reações e timeline divididas por canal em N bancos (core/shards.py),
+# ativado com DJANGO_MENSAGENS_SHARDS=N. Os shards herdam o perfil do default.
+MENSAGENS_SHARDS = [
+    f'mensagens_{indice}' for indice in range(int(os.environ.get('DJANGO_MENSAGENS_SHARDS', 0)))
+]
+
+for alias in MENSAGENS_SHARDS:
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': BASE_DIR / f'{alias}.sqlite3'}
+
+DATABASE_ROUTERS = ['core.shards.RoteadorMensagens']
+
+
+# Atrás de um proxy reverso, o cabeçalho com o IP do cliente para o limite de
+# tentativas de login (core/autenticacao.py), ex.: HTTP_X_FORWARDED_FOR
+LOGIN_CABECALHO_IP = os.environ.get('DJANGO_LOGIN_CABECALHO_IP') or None
+
+
+# Perfilamento das requisições (core/perfilamento.py): Server-Timing e uma
+# linha JSON por requisição; cProfile em parte das requisições lentas.
+PERFILAMENTO_LIMITE_MS = int(os.environ.get('DJANGO_PERFILAMENTO_LIMITE_MS', 500))
+PERFILAMENTO_AMOSTRAGEM = float(os.environ.get('DJANGO_PERFILAMENTO_AMOSTRAGEM', 0.01))
+PERFILAMENTO_DIR = BASE_DIR / 'perfis'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Em desenvolvimento o runserver já lista as requisições: só as lentas
+        'core.perfilamento': {
+            'handlers': ['console'],
+            'level': os.environ.get('DJANGO_PERFILAMENTO_LOG', 'WARNING' if DEBUG else 'INFO'),
+        },
+    },
+}
+
+# Nos testes (manage.py test) nada de cProfile, de arquivos em PERFILAMENTO_DIR
+# nem de linhas no console; os testes do perfilamento ligam o que precisam
+if sys.argv[1:2] == ['test']:
+    PERFILAMENTO_AMOSTRAGEM = 0
+    LOGGING['loggers']['core.perfilamento']['level'] = 'CRITICAL'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,4 +190,8 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Timeline (fan-out na escrita para quem tem até TIMELINE_LIMITE_FANOUT seguidores)
+TIMELINE_MAX_ENTRADAS = 500
+TIMELINE_LIMITE_FANOUT = 1000
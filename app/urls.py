@@ -32,6 +32,9 @@ urlpatterns = [
     path('pesquisa/<int:pk>/remover/', views.remover_pesquisa, name='remover_pesquisa'),
     path('pesquisa/limpar/', views.limpar_pesquisas, name='limpar_pesquisas'),
     
+    # TIMELINE
+    path('timeline/', views.timeline, name='timeline'),
+    
     # CANAIS E CHAT 
     path('canal/criar/', views.criar_canal, name='criar_canal'),
     path('chat/<int:canal_id>/', views.chat, name='chat'),
@@ -40,20 +43,30 @@ urlpatterns = [
     # ADMIN 
     path('cargo/criar/', views.criar_cargo, name='criar_cargo'),
     path('admin-panel/', views.admin_panel, name='admin_panel'),
+    path('admin-panel/api/<str:lista>/', views.admin_panel_lista, name='admin_panel_lista'),
     path('admin-panel/chat-request/<int:request_id>/aceitar/', views.aceitar_chat_request, name='aceitar_chat_request'),
     path('admin-panel/chat-request/<int:request_id>/recusar/', views.recusar_chat_request, name='recusar_chat_request'),
     path('admin-panel/cargo-request/<int:request_id>/aceitar/', views.aceitar_cargo_request, name='aceitar_cargo_request'),
     path('admin-panel/cargo-request/<int:request_id>/recusar/', views.recusar_cargo_request, name='recusar_cargo_request'),
+    path('admin-panel/solicitacoes/moderar/', views.moderar_solicitacoes, name='moderar_solicitacoes'),
     path('admin-panel/usuario/<int:usuario_id>/deletar/', views.deletar_usuario, name='deletar_usuario'),
     path('admin-panel/canal/<int:canal_id>/deletar/', views.deletar_canal, name='deletar_canal'),
     path('admin-panel/cargo/<int:cargo_id>/deletar/', views.deletar_cargo, name='deletar_cargo'),
+    path('admin-panel/exportar/avaliacoes-disciplinas/', views.exportar_avaliacoes_disciplinas, name='exportar_avaliacoes_disciplinas'),
+    path('admin-panel/exportar/avaliacoes-professores/', views.exportar_avaliacoes_professores, name='exportar_avaliacoes_professores'),
+    path('admin-panel/exportar/canal/<int:canal_id>/mensagens/', views.exportar_mensagens_canal, name='exportar_mensagens_canal'),
 
     # AVALIACAO
     path('avaliacao_disciplina/', views.avaliacao_disciplina, name='avaliacao_disciplina'),
     path('disciplina/', views.avaliacao_disciplina, name='disciplina'),  # Alias para compatibilidade
     path('avaliar/<str:codigo>/', views.avaliar_disciplina, name='avalie_disciplina'),
     path('disciplina/avaliar/<str:codigo>/', views.avaliar_disciplina, name='disciplina_avaliar'),  # Alias
+    path('avaliar-lote/', views.avaliar_disciplinas_lote, name='avaliar_disciplinas_lote'),
     path('avaliacao_professores/', views.avaliacao_professores, name='avaliacao_professores'),
+    path('disciplina/<str:codigo>/estatisticas/', views.estatisticas_disciplina, name='estatisticas_disciplina'),
+    path('professor/<int:professor_id>/estatisticas/', views.estatisticas_professor, name='estatisticas_professor'),
+    path('ranking/disciplinas/', views.ranking, {'tipo': 'disciplina'}, name='ranking_disciplinas'),
+    path('ranking/professores/', views.ranking, {'tipo': 'professor'}, name='ranking_professores'),
 
     # GUILHERME
     path('telaavdisciplina1/', views.telaavdisciplina1, name='telaavdisciplina1'),
@@ -1,17 +1,49 @@
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
+from .forms import ImportarCatalogoForm
+from .importacao import ErroImportacao, importar_catalogo
+from .agregados import recalcular_agregado_disciplina, recalcular_agregado_professor
+from . import expurgo, moderacao
 from .models import (
     CustomUser, Cargo, UsuarioCargo, Canal, 
     MembroCanal, Mensagem, Reacao, Notificacao,
     Novidade, Evento, Seguidor, PesquisaRecente,
     ChatRequest, CargoRequest, AvaliacaoDisciplina, Disciplinas,
-    Professores, Avaliacao
+    Professores, Avaliacao, EntradaTimeline, AgregadoDisciplina, AgregadoProfessor,
+    PosicaoRanking, Expurgo, EmailPendente
 )
 
 
+class ExclusaoEmSegundoPlanoMixin:
+    # Excluir pelo admin só agenda o expurgo (core/expurgo.py) e volta na hora
+    agendar_exclusao = None
+    
+    def get_deleted_objects(self, objs, request):
+        # Não percorre as dependências na tela de confirmação
+        objs = list(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+    
+    def delete_model(self, request, obj):
+        self.agendar_exclusao(obj, request.user)
+    
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.agendar_exclusao(obj, request.user)
+        self.message_user(request, 'Os registros relacionados serão apagados em segundo plano.')
+
+
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ExclusaoEmSegundoPlanoMixin, UserAdmin):
+    agendar_exclusao = staticmethod(expurgo.agendar_exclusao_usuario)
     list_display = ('username', 'fullname', 'matricula', 'email', 'is_staff', 'created_at')
+    show_full_result_count = False
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'created_at')
     search_fields = ('username', 'fullname', 'matricula', 'email')
     ordering = ('-created_at',)
@@ -34,6 +66,7 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(Cargo)
 class CargoAdmin(admin.ModelAdmin):
     list_display = ('nome', 'cor', 'criado_por', 'created_at')
+    list_select_related = ('criado_por',)
     list_filter = ('created_at',)
     search_fields = ('nome', 'descricao')
     ordering = ('nome',)
@@ -53,6 +86,7 @@ class CargoAdmin(admin.ModelAdmin):
 @admin.register(UsuarioCargo)
 class UsuarioCargoAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'cargo', 'ativo', 'atribuido_em')
+    list_select_related = ('usuario', 'cargo')
     list_filter = ('cargo', 'ativo', 'atribuido_em')
     search_fields = ('usuario__username', 'usuario__fullname', 'cargo__nome')
     ordering = ('-atribuido_em',)
@@ -60,8 +94,10 @@ class UsuarioCargoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Canal)
-class CanalAdmin(admin.ModelAdmin):
+class CanalAdmin(ExclusaoEmSegundoPlanoMixin, admin.ModelAdmin):
+    agendar_exclusao = staticmethod(expurgo.agendar_exclusao_canal)
     list_display = ('nome', 'tipo', 'ativo', 'criado_por', 'total_membros', 'created_at')
+    list_select_related = ('criado_por',)
     list_filter = ('tipo', 'ativo', 'created_at')
     search_fields = ('nome', 'descricao')
     ordering = ('-created_at',)
@@ -82,14 +118,20 @@ class CanalAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total_membros=Count('canal_membros'))
+    
     def total_membros(self, obj):
-        return obj.membros.count()
+        return obj.total_membros
     total_membros.short_description = 'Membros'
+    total_membros.admin_order_field = 'total_membros'
 
 
 @admin.register(MembroCanal)
 class MembroCanalAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'canal', 'papel', 'entrou_em', 'ultima_leitura')
+    list_select_related = ('usuario', 'canal')
+    show_full_result_count = False
     list_filter = ('papel', 'entrou_em', 'canal__tipo')
     search_fields = ('usuario__username', 'usuario__fullname', 'canal__nome')
     ordering = ('-entrou_em',)
@@ -108,6 +150,8 @@ class MembroCanalAdmin(admin.ModelAdmin):
 @admin.register(Mensagem)
 class MensagemAdmin(admin.ModelAdmin):
     list_display = ('autor', 'canal', 'conteudo_resumido', 'editada', 'created_at')
+    list_select_related = ('autor', 'canal')
+    show_full_result_count = False
     list_filter = ('editada', 'created_at', 'canal')
     search_fields = ('conteudo', 'autor__username', 'canal__nome')
     ordering = ('-created_at',)
@@ -135,6 +179,8 @@ class MensagemAdmin(admin.ModelAdmin):
 @admin.register(Reacao)
 class ReacaoAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'mensagem_info', 'emoji', 'created_at')
+    list_select_related = ('usuario', 'mensagem__autor', 'mensagem__canal')
+    show_full_result_count = False
     list_filter = ('emoji', 'created_at')
     search_fields = ('usuario__username', 'mensagem__conteudo')
     ordering = ('-created_at',)
@@ -148,6 +194,8 @@ class ReacaoAdmin(admin.ModelAdmin):
 @admin.register(Notificacao)
 class NotificacaoAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'tipo', 'titulo', 'lida', 'created_at')
+    list_select_related = ('usuario',)
+    show_full_result_count = False
     list_filter = ('tipo', 'lida', 'created_at')
     search_fields = ('usuario__username', 'titulo', 'mensagem')
     ordering = ('-created_at',)
@@ -224,6 +272,8 @@ class EventoAdmin(admin.ModelAdmin):
 @admin.register(Seguidor)
 class SeguidorAdmin(admin.ModelAdmin):
     list_display = ['seguidor', 'seguido', 'data_inicio']
+    list_select_related = ['seguidor', 'seguido']
+    show_full_result_count = False
     list_filter = ['data_inicio']
     search_fields = ['seguidor__username', 'seguido__username']
     date_hierarchy = 'data_inicio'
@@ -240,9 +290,21 @@ class SeguidorAdmin(admin.ModelAdmin):
     readonly_fields = ['data_inicio']
 
 
+@admin.register(EntradaTimeline)
+class EntradaTimelineAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'mensagem', 'criado_em']
+    list_select_related = ['usuario', 'mensagem__autor', 'mensagem__canal']
+    show_full_result_count = False
+    search_fields = ['usuario__username']
+    raw_id_fields = ['usuario', 'mensagem']
+    readonly_fields = ['criado_em']
+
+
 @admin.register(PesquisaRecente)
 class PesquisaRecenteAdmin(admin.ModelAdmin):
     list_display = ['usuario', 'usuario_pesquisado', 'data_pesquisa']
+    list_select_related = ['usuario', 'usuario_pesquisado']
+    show_full_result_count = False
     list_filter = ['data_pesquisa']
     search_fields = ['usuario__username', 'usuario_pesquisado__username']
     date_hierarchy = 'data_pesquisa'
@@ -253,6 +315,7 @@ class PesquisaRecenteAdmin(admin.ModelAdmin):
 @admin.register(ChatRequest)
 class ChatRequestAdmin(admin.ModelAdmin):
     list_display = ('nome', 'solicitado_por', 'status', 'created_at', 'aprovado_por')
+    list_select_related = ('solicitado_por', 'aprovado_por')
     list_filter = ('status', 'tipo', 'created_at')
     search_fields = ('nome', 'descricao', 'solicitado_por__username')
     ordering = ('-created_at',)
@@ -274,11 +337,24 @@ class ChatRequestAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    actions = ['aprovar_selecionadas', 'recusar_selecionadas']
+    
+    def aprovar_selecionadas(self, request, queryset):
+        aprovadas = moderacao.aprovar_chat_requests(queryset.values_list('id', flat=True), request.user)
+        self.message_user(request, f'{aprovadas} solicitação(ões) de chat aprovada(s).')
+    aprovar_selecionadas.short_description = 'Aprovar solicitações selecionadas'
+    
+    def recusar_selecionadas(self, request, queryset):
+        recusadas = moderacao.recusar_chat_requests(queryset.values_list('id', flat=True), request.user)
+        self.message_user(request, f'{recusadas} solicitação(ões) de chat recusada(s).')
+    recusar_selecionadas.short_description = 'Recusar solicitações selecionadas'
 
 
 @admin.register(CargoRequest)
 class CargoRequestAdmin(admin.ModelAdmin):
     list_display = ('nome', 'solicitado_por', 'status', 'created_at', 'aprovado_por')
+    list_select_related = ('solicitado_por', 'aprovado_por')
     list_filter = ('status', 'created_at')
     search_fields = ('nome', 'descricao', 'solicitado_por__username')
     ordering = ('-created_at',)
@@ -296,6 +372,63 @@ class CargoRequestAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    actions = ['aprovar_selecionadas', 'recusar_selecionadas']
+    
+    def aprovar_selecionadas(self, request, queryset):
+        aprovadas, ignoradas = moderacao.aprovar_cargo_requests(queryset.values_list('id', flat=True), request.user)
+        self.message_user(request, f'{aprovadas} solicitação(ões) de cargo aprovada(s).')
+        if ignoradas:
+            self.message_user(
+                request,
+                f'{ignoradas} solicitação(ões) ignorada(s): já existe um cargo com o mesmo nome.',
+                messages.WARNING,
+            )
+    aprovar_selecionadas.short_description = 'Aprovar solicitações selecionadas'
+    
+    def recusar_selecionadas(self, request, queryset):
+        recusadas = moderacao.recusar_cargo_requests(queryset.values_list('id', flat=True), request.user)
+        self.message_user(request, f'{recusadas} solicitação(ões) de cargo recusada(s).')
+    recusar_selecionadas.short_description = 'Recusar solicitações selecionadas'
+
+
+@admin.register(Expurgo)
+class ExpurgoAdmin(admin.ModelAdmin):
+    list_display = ('descricao', 'tipo', 'status', 'progresso_display', 'solicitado_por', 'created_at', 'concluido_em')
+    list_select_related = ('solicitado_por',)
+    list_filter = ('tipo', 'status')
+    search_fields = ('descricao',)
+    ordering = ('-created_at',)
+    readonly_fields = ('tipo', 'objeto_id', 'descricao', 'total', 'removidos', 'erro', 'solicitado_por', 'created_at', 'updated_at', 'concluido_em')
+    
+    def progresso_display(self, obj):
+        return f'{obj.progresso}% ({obj.removidos}/{obj.total})'
+    progresso_display.short_description = 'Progresso'
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(EmailPendente)
+class EmailPendenteAdmin(admin.ModelAdmin):
+    list_display = ('assunto', 'status', 'tentativas', 'proxima_tentativa', 'created_at', 'enviado_em')
+    list_filter = ('status', 'created_at')
+    search_fields = ('assunto',)
+    ordering = ('-created_at',)
+    show_full_result_count = False
+    readonly_fields = ('created_at', 'enviado_em', 'ultimo_erro')
+    
+    actions = ['reenviar']
+    
+    def reenviar(self, request, queryset):
+        # Os que desistiram de vez já tiveram o corpo apagado (core/emails.py)
+        reagendados = queryset.exclude(status='enviado').exclude(corpo='').update(
+            status='pendente',
+            tentativas=0,
+            proxima_tentativa=timezone.now(),
+        )
+        self.message_user(request, f'{reagendados} e-mail(s) reagendado(s) para envio.')
+    reenviar.short_description = 'Reenviar e-mails selecionados'
 
 
 # Configurações globais do Admin
@@ -303,29 +436,128 @@ admin.site.site_header = "Rede Acadêmica - Administração"
 admin.site.site_title = "Rede Acadêmica Admin"
 admin.site.index_title = "Painel de Controle"
 
+class ImportarCatalogoMixin:
+    change_list_template = 'admin/core/importar_change_list.html'
+    
+    def get_urls(self):
+        urls = [
+            path(
+                'importar-csv/',
+                self.admin_site.admin_view(self.importar_csv),
+                name=f'{self.opts.app_label}_{self.opts.model_name}_importar_csv',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def importar_csv(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:index')
+        
+        if request.method == 'POST':
+            form = ImportarCatalogoForm(request.POST, request.FILES)
+            if form.is_valid():
+                # Lê o upload em streaming, sem carregar o arquivo inteiro
+                arquivo = io.TextIOWrapper(form.cleaned_data['arquivo'].file, encoding='utf-8-sig', newline='')
+                try:
+                    resultado = importar_catalogo(arquivo, delimitador=form.cleaned_data['delimitador'])
+                except (ErroImportacao, UnicodeDecodeError) as erro:
+                    self.message_user(request, f'Erro na importação: {erro}', messages.ERROR)
+                else:
+                    self.message_user(
+                        request,
+                        f"{resultado['linhas']} linha(s) importada(s) em {resultado['segundos']:.2f}s "
+                        f"({resultado['linhas_por_segundo']:.0f} linhas/s).",
+                    )
+                    return redirect(f'admin:{self.opts.app_label}_{self.opts.model_name}_changelist')
+        else:
+            form = ImportarCatalogoForm()
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'form': form,
+            'title': 'Importar catálogo (CSV)',
+        }
+        return render(request, 'admin/core/importar_catalogo.html', context)
+
+
 @admin.register(Disciplinas)
-class DisciplinasAdmin(admin.ModelAdmin):
+class DisciplinasAdmin(ImportarCatalogoMixin, admin.ModelAdmin):
     list_display = ('nome', 'codigo')
 
 @admin.register(AvaliacaoDisciplina)
 class AvaliacaoDisciplinaAdmin(admin.ModelAdmin):
     list_display = ('disciplina', 'usuario', 'criado_em')
+    list_select_related = ('disciplina', 'usuario')
+    show_full_result_count = False
     list_filter = ('disciplina', 'usuario', 'criado_em')
     search_fields = ('usuario__username', 'disciplina__nome', 'disciplina__codigo')
     date_hierarchy = 'criado_em'
 
+    # O site soma as avaliações novas no agregado (core/agregados.py); aqui
+    # qualquer mudança recalcula a disciplina
+    def save_model(self, request, obj, form, change):
+        anterior = form.initial.get('disciplina') if change else None
+        super().save_model(request, obj, form, change)
+        for disciplina_id in {anterior, obj.disciplina_id} - {None}:
+            recalcular_agregado_disciplina(disciplina_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_agregado_disciplina(obj.disciplina_id)
+
+    def delete_queryset(self, request, queryset):
+        disciplinas_ids = set(queryset.values_list('disciplina_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for disciplina_id in disciplinas_ids:
+            recalcular_agregado_disciplina(disciplina_id)
+
+@admin.register(AgregadoDisciplina)
+class AgregadoDisciplinaAdmin(admin.ModelAdmin):
+    list_display = ('disciplina', 'total', 'atualizado_em')
+    list_select_related = ('disciplina',)
+    search_fields = ('disciplina__nome', 'disciplina__codigo')
+    readonly_fields = ('atualizado_em',)
+
 @admin.register(Professores)
-class ProfessoresAdmin(admin.ModelAdmin):
+class ProfessoresAdmin(ImportarCatalogoMixin, admin.ModelAdmin):
     list_display = ('nome', 'total_disciplinas')
     search_fields = ('nome',)
     filter_horizontal = ('disciplinas',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total_disciplinas=Count('disciplinas'))
+    
     def total_disciplinas(self, obj):
-        return obj.disciplinas.count()
+        return obj.total_disciplinas
     total_disciplinas.short_description = 'Total de Disciplinas'
+    total_disciplinas.admin_order_field = 'total_disciplinas'
 
 @admin.register(Avaliacao)
 class AvaliacaoAdmin(admin.ModelAdmin):
     list_display = ('professor', 'disciplina', 'dominio', 'metodos', 'relacionamento', 'compatibilidade', 'clareza')
+    list_select_related = ('professor', 'disciplina')
+    show_full_result_count = False
     list_filter = ('professor', 'disciplina')
-    search_fields = ('professor__nome', 'disciplina__nome', 'disciplina__codigo')
\ No newline at end of file
+    search_fields = ('professor__nome', 'disciplina__nome', 'disciplina__codigo')
+
+    def delete_queryset(self, request, queryset):
+        # A exclusão em massa não passa por Avaliacao.delete()
+        pares = set(queryset.values_list('professor_id', 'disciplina_id'))
+        super().delete_queryset(request, queryset)
+        for professor_id, disciplina_id in pares:
+            recalcular_agregado_professor(professor_id, disciplina_id)
+
+@admin.register(AgregadoProfessor)
+class AgregadoProfessorAdmin(admin.ModelAdmin):
+    list_display = ('professor', 'disciplina', 'atualizado_em')
+    list_select_related = ('professor', 'disciplina')
+    search_fields = ('professor__nome', 'disciplina__nome', 'disciplina__codigo')
+    readonly_fields = ('atualizado_em',)
+
+@admin.register(PosicaoRanking)
+class PosicaoRankingAdmin(admin.ModelAdmin):
+    list_display = ('posicao', 'tipo', 'disciplina', 'professor', 'total', 'media_bayesiana', 'calculado_em')
+    list_filter = ('tipo',)
+    list_select_related = ('disciplina', 'professor')
+    ordering = ('tipo', 'posicao')
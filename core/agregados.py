@@ -0,0 +1,207 @@
+"""
+Agregados de avaliações mantidos incrementalmente.
+
+As médias exibidas nas telas de avaliação são lidas destas tabelas em vez
+de recalcular Avg() sobre todas as avaliações a cada busca.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .estatisticas import invalidar_disciplina, invalidar_professor, invalidar_todas
+from .models import AgregadoDisciplina, AgregadoProfessor, Avaliacao, AvaliacaoDisciplina, periodo_de
+
+
+TAMANHO_LOTE = 500
+
+
+def registrar_avaliacao_disciplina(avaliacao):
+    registrar_avaliacoes_disciplinas([avaliacao])
+
+
+def registrar_avaliacoes_disciplinas(avaliacoes):
+    # Soma o lote por disciplina e faz um único UPDATE para cada uma
+    somas = {}
+    for avaliacao in avaliacoes:
+        soma = somas.setdefault(avaliacao.disciplina_id, dict.fromkeys(AgregadoDisciplina.CRITERIOS, 0))
+        soma.setdefault('total', 0)
+        soma['total'] += 1
+        for criterio in AgregadoDisciplina.CRITERIOS:
+            soma[criterio] += int(getattr(avaliacao, criterio))
+
+    with transaction.atomic():
+        AgregadoDisciplina.objects.bulk_create(
+            [AgregadoDisciplina(disciplina_id=disciplina_id) for disciplina_id in somas],
+            ignore_conflicts=True
+        )
+        for disciplina_id, soma in somas.items():
+            AgregadoDisciplina.objects.filter(
+                disciplina_id=disciplina_id
+            ).update(
+                total=F('total') + soma['total'],
+                **{
+                    f'soma_{criterio}': F(f'soma_{criterio}') + soma[criterio]
+                    for criterio in AgregadoDisciplina.CRITERIOS
+                }
+            )
+            invalidar_disciplina(disciplina_id)
+
+
+def medias_disciplina(disciplina):
+    try:
+        agregado = AgregadoDisciplina.objects.get(disciplina=disciplina)
+    except AgregadoDisciplina.DoesNotExist:
+        agregado = AgregadoDisciplina(disciplina=disciplina)
+    return agregado.medias()
+
+
+def recalcular_agregados_disciplinas():
+    somas = AvaliacaoDisciplina.objects.values('disciplina_id').annotate(
+        total=Count('id'),
+        **{f'soma_{criterio}': Sum(criterio) for criterio in AgregadoDisciplina.CRITERIOS}
+    ).order_by()
+
+    agregados = [AgregadoDisciplina(**linha) for linha in somas]
+
+    with transaction.atomic():
+        AgregadoDisciplina.objects.all().delete()
+        AgregadoDisciplina.objects.bulk_create(agregados, batch_size=500)
+    invalidar_todas()
+
+    return len(agregados)
+
+
+def preencher_periodos(simular=False):
+    """
+    Preenche o período das avaliações de disciplina anteriores ao campo com o
+    semestre de criado_em e remove as repetidas: das avaliações de um aluno
+    para a mesma disciplina no mesmo período fica só a mais recente.
+    Devolve (ids a preencher, ids removidos); com `simular`, não grava nada.
+    """
+    pendentes = {}
+    for avaliacao_id, criado_em in (
+        AvaliacaoDisciplina.objects.filter(periodo=None).values_list('id', 'criado_em').iterator()
+    ):
+        pendentes[avaliacao_id] = periodo_de(timezone.localtime(criado_em))
+
+    # A mais recente de cada (usuario, disciplina, periodo), já preenchida ou não
+    mais_recentes = {}
+    removidas = []
+    avaliacoes = AvaliacaoDisciplina.objects.exclude(usuario=None).filter(
+        disciplina_id__in=AvaliacaoDisciplina.objects.filter(periodo=None).values('disciplina_id')
+    ).order_by('criado_em', 'id').values_list('id', 'usuario_id', 'disciplina_id', 'periodo')
+    for avaliacao_id, usuario_id, disciplina_id, periodo in avaliacoes.iterator():
+        chave = (usuario_id, disciplina_id, periodo or pendentes[avaliacao_id])
+        anterior = mais_recentes.get(chave)
+        mais_recentes[chave] = avaliacao_id
+        if anterior is not None:
+            removidas.append(anterior)
+
+    if simular:
+        return list(pendentes), removidas
+
+    # Remove antes de preencher, para a restrição valer a cada lote; se o
+    # comando parar no meio, rodar de novo continua de onde parou
+    for inicio in range(0, len(removidas), TAMANHO_LOTE):
+        AvaliacaoDisciplina.objects.filter(id__in=removidas[inicio:inicio + TAMANHO_LOTE]).delete()
+    removidas_set = set(removidas)
+    por_periodo = {}
+    for avaliacao_id, periodo in pendentes.items():
+        if avaliacao_id not in removidas_set:
+            por_periodo.setdefault(periodo, []).append(avaliacao_id)
+    for periodo, ids in por_periodo.items():
+        for inicio in range(0, len(ids), TAMANHO_LOTE):
+            AvaliacaoDisciplina.objects.filter(id__in=ids[inicio:inicio + TAMANHO_LOTE]).update(periodo=periodo)
+
+    if removidas:
+        recalcular_agregados_disciplinas()
+    return list(pendentes), removidas
+
+
+def recalcular_agregado_disciplina(disciplina_id):
+    linha = AvaliacaoDisciplina.objects.filter(disciplina_id=disciplina_id).aggregate(
+        total=Count('id'),
+        **{f'soma_{criterio}': Sum(criterio) for criterio in AgregadoDisciplina.CRITERIOS}
+    )
+
+    with transaction.atomic():
+        AgregadoDisciplina.objects.filter(disciplina_id=disciplina_id).delete()
+        if linha['total']:
+            AgregadoDisciplina.objects.create(disciplina_id=disciplina_id, **linha)
+        invalidar_disciplina(disciplina_id)
+
+
+def registrar_avaliacao_professor(avaliacao):
+    incrementos = {}
+    for criterio in AgregadoProfessor.CRITERIOS:
+        valor = getattr(avaliacao, criterio)
+        if valor is None or valor == '':
+            continue
+        incrementos[f'total_{criterio}'] = F(f'total_{criterio}') + 1
+        incrementos[f'soma_{criterio}'] = F(f'soma_{criterio}') + int(valor)
+
+    with transaction.atomic():
+        AgregadoProfessor.objects.get_or_create(
+            professor_id=avaliacao.professor_id,
+            disciplina_id=avaliacao.disciplina_id
+        )
+        if incrementos:
+            AgregadoProfessor.objects.filter(
+                professor_id=avaliacao.professor_id,
+                disciplina_id=avaliacao.disciplina_id
+            ).update(**incrementos)
+        invalidar_professor(avaliacao.professor_id, avaliacao.disciplina_id)
+
+
+def _somas_professores(avaliacoes):
+    return avaliacoes.values('professor_id', 'disciplina_id').annotate(
+        **{f'total_{criterio}': Count(criterio) for criterio in AgregadoProfessor.CRITERIOS},
+        **{f'soma_{criterio}': Sum(criterio) for criterio in AgregadoProfessor.CRITERIOS}
+    ).order_by()
+
+
+def _agregado_professor(linha):
+    # Sum() devolve None quando todos os valores do critério são nulos
+    for criterio in AgregadoProfessor.CRITERIOS:
+        linha[f'soma_{criterio}'] = linha[f'soma_{criterio}'] or 0
+    return AgregadoProfessor(**linha)
+
+
+def recalcular_agregado_professor(professor_id, disciplina_id):
+    linhas = list(_somas_professores(
+        Avaliacao.objects.filter(professor_id=professor_id, disciplina_id=disciplina_id)
+    ))
+
+    with transaction.atomic():
+        AgregadoProfessor.objects.filter(
+            professor_id=professor_id,
+            disciplina_id=disciplina_id
+        ).delete()
+        if linhas:
+            _agregado_professor(linhas[0]).save()
+        invalidar_professor(professor_id, disciplina_id)
+
+
+def medias_professores(disciplina):
+    agregados = {
+        agregado.professor_id: agregado
+        for agregado in AgregadoProfessor.objects.filter(disciplina=disciplina)
+    }
+
+    resultado = []
+    for professor in disciplina.professores.all().order_by('nome'):
+        agregado = agregados.get(professor.id) or AgregadoProfessor()
+        resultado.append({'nome': professor.nome, **agregado.medias()})
+    return resultado
+
+
+def recalcular_agregados_professores():
+    agregados = [_agregado_professor(linha) for linha in _somas_professores(Avaliacao.objects.all())]
+
+    with transaction.atomic():
+        AgregadoProfessor.objects.all().delete()
+        AgregadoProfessor.objects.bulk_create(agregados, batch_size=500)
+    invalidar_todas()
+
+    return len(agregados)
@@ -0,0 +1,145 @@
+"""
+Login assíncrono com o hash de senha fora do loop de eventos.
+
+O PBKDF2 é caro de propósito. Em vez de prender um worker por login, a
+verificação roda num pool limitado de processos (LOGIN_PROCESSOS) e no
+máximo LOGIN_CONCORRENCIA verificações por processo do servidor ficam em
+andamento ou na fila; o excedente espera até LOGIN_ESPERA_MAXIMA segundos e
+depois recebe 503.
+
+Antes de qualquer hash, dois baldes de fichas (token bucket), um por IP e
+outro por username, recusam rajadas de tentativas com 429. Os baldes ficam
+no banco, então o limite vale para todos os processos. Atrás de um proxy
+reverso, LOGIN_CABECALHO_IP diz em que cabeçalho está o IP do cliente.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .models import BaldeFichas
+from .provisionamento import iniciar_processo
+
+
+PROCESSOS = getattr(settings, 'LOGIN_PROCESSOS', os.cpu_count() or 1)
+
+CONCORRENCIA = getattr(settings, 'LOGIN_CONCORRENCIA', 32)
+
+ESPERA_MAXIMA = getattr(settings, 'LOGIN_ESPERA_MAXIMA', 5)
+
+# (capacidade, fichas repostas por segundo)
+BALDE_IP = getattr(settings, 'LOGIN_BALDE_IP', (20, 1))
+
+BALDE_USERNAME = getattr(settings, 'LOGIN_BALDE_USERNAME', (5, 1 / 30))
+
+# Chave de request.META com o IP do cliente (ex.: 'HTTP_X_FORWARDED_FOR');
+# None usa o REMOTE_ADDR, que atrás de um proxy é o endereço do proxy
+CABECALHO_IP = getattr(settings, 'LOGIN_CABECALHO_IP', None)
+
+# Intervalo entre as tentativas de pegar o semáforo sem bloquear o loop
+INTERVALO_SEMAFORO = 0.01
+
+
+class LoginRecusado(Exception):
+    def __init__(self, mensagem, status):
+        super().__init__(mensagem)
+        self.status = status
+
+
+_pool = None
+
+# Um semáforo de threads por processo: vale para todos os loops de eventos
+# (sob WSGI cada requisição assíncrona roda num loop próprio)
+_semaforo = threading.BoundedSemaphore(CONCORRENCIA)
+
+
+def _pool_hash():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESSOS, initializer=iniciar_processo)
+    return _pool
+
+
+def verificar_senha(senha, codificada):
+    """
+    Roda no processo do pool. Devolve (valida, novo_hash); novo_hash vem
+    preenchido quando o hasher preferido mudou e a senha precisa ser
+    atualizada, como faz o AbstractBaseUser.check_password.
+    """
+    if not codificada:
+        # Usuário inexistente: gasta o mesmo tempo para não revelar isso
+        make_password(senha)
+        return False, None
+
+    if not check_password(senha, codificada):
+        return False, None
+
+    preferido = get_hasher('default')
+    try:
+        atual = identify_hasher(codificada)
+    except ValueError:
+        return True, None
+    if atual.algorithm != preferido.algorithm or preferido.must_update(codificada):
+        return True, make_password(senha)
+    return True, None
+
+
+def ip_cliente(request):
+    if CABECALHO_IP:
+        # O último endereço é o que o proxy acrescentou; os anteriores vêm do
+        # cliente e podem ser forjados
+        enderecos = [endereco.strip() for endereco in request.META.get(CABECALHO_IP, '').split(',')]
+        if enderecos[-1]:
+            return enderecos[-1]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def consumir_ficha(chave, capacidade, taxa):
+    agora = time.time()
+    saldo = Least(Value(float(capacidade)), F('fichas') + (Value(agora) - F('visto_em')) * Value(float(taxa)))
+
+    def consumir():
+        # Um UPDATE só: ler e descontar o saldo é atômico também entre processos
+        return BaldeFichas.objects.filter(GreaterThanOrEqual(saldo, 1), chave=chave).update(
+            fichas=saldo - 1, visto_em=agora, cheio_em=Value(agora) + (Value(float(capacidade)) - saldo + 1) / taxa
+        ) > 0
+
+    if consumir():
+        return True
+    # Balde novo; os que já encheram de novo equivalem a não existir
+    BaldeFichas.objects.filter(cheio_em__lt=agora).delete()
+    _, criado = BaldeFichas.objects.get_or_create(
+        chave=chave, defaults={'fichas': capacidade - 1, 'visto_em': agora, 'cheio_em': agora + 1 / taxa}
+    )
+    # Sem criar: sem fichas, ou outra requisição criou o balde entre as duas consultas
+    return criado or consumir()
+
+
+async def limitar_tentativas(ip, username):
+    if not await sync_to_async(consumir_ficha)(f'login:ip:{ip}', *BALDE_IP):
+        raise LoginRecusado('Muitas tentativas deste endereço. Aguarde alguns instantes.', 429)
+    if not await sync_to_async(consumir_ficha)(f'login:usuario:{username.lower()}', *BALDE_USERNAME):
+        raise LoginRecusado('Muitas tentativas para este usuário. Aguarde alguns instantes.', 429)
+
+
+async def averificar_senha(senha, codificada):
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while not _semaforo.acquire(blocking=False):
+        if time.monotonic() >= limite:
+            raise LoginRecusado('Muitos logins ao mesmo tempo. Tente novamente em instantes.', 503)
+        await asyncio.sleep(INTERVALO_SEMAFORO)
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool_hash(), verificar_senha, senha, codificada)
+    finally:
+        _semaforo.release()
@@ -0,0 +1,161 @@
+"""
+Catálogo de disciplinas em memória.
+
+O catálogo inteiro é carregado uma vez por processo e indexado por código
+normalizado, nome normalizado e palavras do nome. Quando uma disciplina é
+alterada, a versão compartilhada do catálogo (core/versoes.py) muda e cada
+processo recarrega o catálogo na próxima busca.
+"""
+
+import threading
+
+from django.db.models import Q
+
+from . import versoes
+from .models import Disciplinas, normalizar_codigo, normalizar_texto
+
+
+VERSAO = 'catalogo'
+
+TAMANHO_LOTE = 500
+
+# Limite da lista de sugestões quando a busca é ambígua
+MAX_CANDIDATOS = 10
+
+_lock = threading.Lock()
+_catalogo = {'versao': None}
+
+
+def invalidar_catalogo():
+    versoes.renovar(VERSAO)
+
+
+def _versao_atual():
+    return versoes.versao(VERSAO)
+
+
+def _carregar(versao):
+    por_id = {}
+    por_codigo = {}
+    por_nome = {}
+    por_palavra = {}
+
+    campos = ['id', 'nome', 'codigo', 'codigo_normalizado', 'nome_normalizado']
+    for valores in Disciplinas.objects.order_by('id').values_list(*campos):
+        disciplina = dict(zip(campos, valores))
+        # Disciplinas anteriores aos campos normalizados (ver normalizar_catalogo)
+        disciplina['codigo_normalizado'] = disciplina['codigo_normalizado'] or normalizar_codigo(disciplina['codigo'])
+        disciplina['nome_normalizado'] = disciplina['nome_normalizado'] or normalizar_texto(disciplina['nome'])
+        por_id[disciplina['id']] = disciplina
+        por_codigo.setdefault(disciplina['codigo_normalizado'], disciplina['id'])
+        por_nome.setdefault(disciplina['nome_normalizado'], disciplina['id'])
+        for palavra in disciplina['nome_normalizado'].split():
+            por_palavra.setdefault(palavra, set()).add(disciplina['id'])
+
+    return {
+        'versao': versao,
+        'por_id': por_id,
+        'por_codigo': por_codigo,
+        'por_nome': por_nome,
+        'por_palavra': por_palavra,
+    }
+
+
+def _obter_catalogo():
+    global _catalogo
+    versao = _versao_atual()
+    if _catalogo['versao'] != versao:
+        with _lock:
+            if _catalogo['versao'] != versao:
+                _catalogo = _carregar(versao)
+    return _catalogo
+
+
+def _instancia(dados):
+    # Instância "salva" sem ir ao banco, com os campos do catálogo
+    campos = ['id', 'nome', 'codigo', 'codigo_normalizado', 'nome_normalizado']
+    return Disciplinas.from_db('default', campos, [dados[campo] for campo in campos])
+
+
+def disciplina_por_codigo(codigo):
+    """Busca exata por código (ou nome) normalizado. Devolve None se não achar."""
+    catalogo = _obter_catalogo()
+
+    disciplina_id = catalogo['por_codigo'].get(normalizar_codigo(codigo))
+    if disciplina_id is None:
+        disciplina_id = catalogo['por_nome'].get(normalizar_texto(codigo))
+    if disciplina_id is None:
+        return None
+    return _instancia(catalogo['por_id'][disciplina_id])
+
+
+def buscar_disciplinas(q):
+    """
+    Devolve as disciplinas que casam com `q`, da mais para a menos relevante.
+    A ordem é determinística: em caso de empate vale o código.
+    """
+    catalogo = _obter_catalogo()
+    codigo = normalizar_codigo(q)
+    texto = normalizar_texto(q)
+    if not texto:
+        return []
+
+    # Caminho rápido: código ou nome exatos
+    exato = catalogo['por_codigo'].get(codigo)
+    if exato is None:
+        exato = catalogo['por_nome'].get(texto)
+    if exato is not None:
+        return [_instancia(catalogo['por_id'][exato])]
+
+    # Todas as palavras da busca presentes no nome
+    palavras = texto.split()
+    conjuntos = [catalogo['por_palavra'].get(palavra, set()) for palavra in palavras]
+    ids = set.intersection(*conjuntos) if conjuntos else set()
+    pontuados = {disciplina_id: 2 for disciplina_id in ids}
+
+    # Sem palavra completa: código começando com a busca ou trecho do nome
+    if not pontuados:
+        for disciplina in catalogo['por_id'].values():
+            if codigo and disciplina['codigo_normalizado'].startswith(codigo):
+                pontuados[disciplina['id']] = 1
+            elif texto in disciplina['nome_normalizado'] or (codigo and codigo in disciplina['codigo_normalizado']):
+                pontuados[disciplina['id']] = 0
+
+    ordenados = sorted(
+        pontuados,
+        key=lambda disciplina_id: (-pontuados[disciplina_id], catalogo['por_id'][disciplina_id]['codigo_normalizado'])
+    )
+    return [_instancia(catalogo['por_id'][disciplina_id]) for disciplina_id in ordenados[:MAX_CANDIDATOS]]
+
+
+def normalizar_catalogo():
+    """
+    Preenche os campos normalizados das disciplinas criadas antes deles.
+    Devolve (preenchidas, conflitos): conflitos é {codigo_normalizado: [ids]}
+    dos códigos que normalizam para o mesmo valor. A disciplina mais antiga
+    fica com o código; as outras continuam sem ele até alguém juntá-las ou
+    corrigir o código.
+    """
+    donos = dict(
+        Disciplinas.objects.exclude(codigo_normalizado=None).values_list('codigo_normalizado', 'id')
+    )
+    conflitos = {}
+    pendentes = []
+    for disciplina in Disciplinas.objects.filter(
+        Q(codigo_normalizado=None) | Q(nome_normalizado='')
+    ).order_by('id').iterator():
+        codigo = normalizar_codigo(disciplina.codigo)
+        dono = donos.setdefault(codigo, disciplina.id)
+        if dono == disciplina.id:
+            disciplina.codigo_normalizado = codigo
+        else:
+            conflitos.setdefault(codigo, [dono]).append(disciplina.id)
+        disciplina.nome_normalizado = normalizar_texto(disciplina.nome)
+        pendentes.append(disciplina)
+
+    Disciplinas.objects.bulk_update(
+        pendentes, ['codigo_normalizado', 'nome_normalizado'], batch_size=TAMANHO_LOTE
+    )
+    if pendentes:
+        invalidar_catalogo()
+    return len(pendentes), conflitos
@@ -0,0 +1,146 @@
+"""
+Gravação de mensagens com "group commit".
+
+No SQLite cada INSERT em autocommit pega o lock de escrita do banco e faz
+seu próprio fsync; em rajadas as requisições fazem fila e estouram com
+"database is locked". Com MENSAGENS_COMMIT_EM_GRUPO = True, as threads das
+requisições entregam as mensagens a uma única thread gravadora, que junta
+o que chegar em até COMMIT_EM_GRUPO_ESPERA_MS (ou COMMIT_EM_GRUPO_TAMANHO
+mensagens) e grava tudo com um bulk_create numa só transação. Quem chamou
+espera o lote e recebe a mensagem já com id.
+
+Desligado (o padrão), criar_mensagem grava com o save() de sempre.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, transaction
+
+from . import shards
+from .models import Mensagem
+
+
+TAMANHO_LOTE = getattr(settings, 'COMMIT_EM_GRUPO_TAMANHO', 100)
+
+ESPERA = getattr(settings, 'COMMIT_EM_GRUPO_ESPERA_MS', 5) / 1000
+
+TEMPO_MAXIMO = getattr(settings, 'COMMIT_EM_GRUPO_TEMPO_MAXIMO', 10)
+
+
+def ativo():
+    return getattr(settings, 'MENSAGENS_COMMIT_EM_GRUPO', False)
+
+
+class GravadorEmGrupo:
+    def __init__(self, tamanho_lote=TAMANHO_LOTE, espera=ESPERA):
+        self.tamanho_lote = tamanho_lote
+        self.espera = espera
+        self.fila = queue.Queue()
+        self.thread = threading.Thread(target=self._executar, name='gravador-mensagens', daemon=True)
+        self.thread.start()
+
+    def gravar(self, mensagem):
+        futuro = Future()
+        self.fila.put((mensagem, futuro))
+        return futuro
+
+    def _coletar(self):
+        # Bloqueia até a primeira mensagem e junta as que chegarem na janela
+        pendentes = [self.fila.get()]
+        limite = monotonic() + self.espera
+        while len(pendentes) < self.tamanho_lote:
+            restante = limite - monotonic()
+            if restante <= 0:
+                break
+            try:
+                pendentes.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return pendentes
+
+    def _gravar_lote(self, banco, pendentes):
+        try:
+            with transaction.atomic(using=banco):
+                Mensagem.objects.using(banco).bulk_create([mensagem for mensagem, _ in pendentes])
+        except Exception:
+            # Isola a mensagem com problema para não derrubar o lote todo
+            for mensagem, futuro in pendentes:
+                if not shards.SHARDS:
+                    mensagem.pk = None
+                try:
+                    Mensagem.objects.using(banco).bulk_create([mensagem])
+                except Exception as erro:
+                    futuro.set_exception(erro)
+                else:
+                    futuro.set_result(mensagem)
+            return
+
+        for mensagem, futuro in pendentes:
+            futuro.set_result(mensagem)
+
+    def _executar(self):
+        while True:
+            pendentes = self._coletar()
+            try:
+                close_old_connections()
+                # Com shards, um lote por banco
+                por_banco = {}
+                for mensagem, futuro in pendentes:
+                    por_banco.setdefault(shards.banco_do_canal(mensagem.canal_id), []).append((mensagem, futuro))
+                for banco, lote in por_banco.items():
+                    self._gravar_lote(banco, lote)
+            except Exception as erro:
+                for _, futuro in pendentes:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+
+
+_gravador = None
+_gravador_pid = None
+_lock = threading.Lock()
+
+
+def gravador():
+    # Um gravador por processo (inclusive depois de um fork do servidor)
+    global _gravador, _gravador_pid
+    with _lock:
+        if _gravador is None or _gravador_pid != os.getpid():
+            _gravador = GravadorEmGrupo()
+            _gravador_pid = os.getpid()
+        return _gravador
+
+
+def criar_mensagem(canal, autor, conteudo, arquivo=None, responde_a_id=None, em_grupo=None):
+    responde_a = None
+    if responde_a_id:
+        # Pelo canal a consulta vai ao shard certo
+        responde_a = canal.mensagens.filter(id=responde_a_id).first()
+
+    mensagem = Mensagem(
+        canal=canal,
+        autor=autor,
+        conteudo=conteudo,
+        arquivo=arquivo,
+        responde_a=responde_a,
+    )
+
+    if em_grupo is None:
+        em_grupo = ativo()
+
+    # Anexos passam pelo storage no save() e, dentro de uma transação que já
+    # escreveu, esperar pela thread gravadora travaria no lock do SQLite
+    if not em_grupo or arquivo or transaction.get_connection().in_atomic_block:
+        mensagem.save()
+        return mensagem
+
+    # bulk_create não chama Mensagem.save(), então a permissão é checada aqui
+    if not canal.usuario_pode_acessar(autor):
+        raise ValidationError("Você não tem permissão para enviar mensagens neste canal.")
+    shards.atribuir_id(mensagem)
+    return gravador().gravar(mensagem).result(timeout=TEMPO_MAXIMO)
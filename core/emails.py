@@ -0,0 +1,107 @@
+"""
+Caixa de saída de e-mails.
+
+As views só gravam o e-mail na tabela EmailPendente, então a resposta não
+espera pelo servidor SMTP. O comando `enviar_emails` envia os pendentes em
+lotes usando uma única conexão (get_connection + send_messages) por lote.
+Falhas são reagendadas com espera exponencial até MAX_TENTATIVAS.
+
+O corpo é apagado quando o e-mail é enviado ou desiste de vez: os e-mails
+levam códigos de redefinição de senha, que não devem ficar guardados em
+texto puro (e já teriam expirado numa nova tentativa).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import EmailPendente
+
+
+TAMANHO_LOTE = getattr(settings, 'EMAIL_FILA_TAMANHO_LOTE', 100)
+
+MAX_TENTATIVAS = getattr(settings, 'EMAIL_FILA_MAX_TENTATIVAS', 6)
+
+# Espera antes da tentativa n: ESPERA_BASE * 2 ** (n - 1), até ESPERA_MAXIMA
+ESPERA_BASE = getattr(settings, 'EMAIL_FILA_ESPERA_BASE', 30)
+
+ESPERA_MAXIMA = getattr(settings, 'EMAIL_FILA_ESPERA_MAXIMA', 60 * 60)
+
+
+def enfileirar_email(assunto, corpo, destinatarios, remetente=None):
+    return EmailPendente.objects.create(
+        assunto=assunto,
+        corpo=corpo,
+        remetente=remetente or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@redeacademica.com'),
+        destinatarios=list(destinatarios),
+    )
+
+
+def _registrar_falha(email, erro, agora):
+    email.tentativas += 1
+    email.ultimo_erro = f'{type(erro).__name__}: {erro}'
+    if email.tentativas >= MAX_TENTATIVAS:
+        email.status = 'falhou'
+        email.corpo = ''
+    else:
+        espera = min(ESPERA_BASE * 2 ** (email.tentativas - 1), ESPERA_MAXIMA)
+        email.proxima_tentativa = agora + timedelta(seconds=espera)
+    email.save(update_fields=['tentativas', 'ultimo_erro', 'status', 'proxima_tentativa', 'corpo'])
+
+
+def enviar_pendentes(limite=TAMANHO_LOTE, conexao=None):
+    """
+    Envia até `limite` e-mails vencidos. Devolve (enviados, falhas).
+    Pensado para um único worker rodando por vez.
+    """
+    agora = timezone.now()
+    emails = list(
+        EmailPendente.objects.filter(status='pendente', proxima_tentativa__lte=agora)
+        .order_by('proxima_tentativa', 'id')[:limite]
+    )
+    if not emails:
+        return 0, 0
+
+    conexao = conexao or get_connection(fail_silently=False)
+    try:
+        conexao.open()
+    except Exception as erro:
+        # Servidor fora do ar: o lote inteiro volta para a fila
+        for email in emails:
+            _registrar_falha(email, erro, agora)
+        return 0, len(emails)
+
+    enviados = []
+    falhas = 0
+    try:
+        for indice, email in enumerate(emails):
+            mensagem = EmailMessage(
+                subject=email.assunto,
+                body=email.corpo,
+                from_email=email.remetente,
+                to=email.destinatarios,
+                connection=conexao,
+            )
+            try:
+                conexao.send_messages([mensagem])
+            except Exception as erro:
+                _registrar_falha(email, erro, agora)
+                falhas += 1
+                # A conexão pode ter ficado num estado inválido
+                try:
+                    conexao.close()
+                    conexao.open()
+                except Exception as erro:
+                    for restante in emails[indice + 1:]:
+                        _registrar_falha(restante, erro, agora)
+                    falhas += len(emails) - indice - 1
+                    break
+            else:
+                enviados.append(email.id)
+    finally:
+        conexao.close()
+        EmailPendente.objects.filter(id__in=enviados).update(status='enviado', enviado_em=timezone.now(), corpo='')
+
+    return len(enviados), falhas
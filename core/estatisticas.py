@@ -0,0 +1,141 @@
+"""
+Distribuição das notas e tendência por semestre, para os gráficos.
+
+Os resultados são calculados com consultas agrupadas e guardados no cache
+por disciplina/professor. A chave inclui versões compartilhadas (core/versoes.py):
+uma geral, trocada pelo recálculo completo dos agregados, e uma por
+disciplina ou professor, trocada por uma nova avaliação. Assim uma
+avaliação invalida apenas as entradas afetadas, em todos os processos (o
+cache do Django pode ser um por processo), e abrir um gráfico normalmente
+não toca nas avaliações.
+
+A tendência das disciplinas usa o período informado na avaliação; a dos
+professores, o semestre da data da avaliação.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, CharField, Count, F, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, ExtractYear
+
+from . import versoes
+from .models import AgregadoDisciplina, AgregadoProfessor, Avaliacao, AvaliacaoDisciplina
+
+
+NOTA_MAXIMA = 10
+
+TEMPO_CACHE = 60 * 60 * 24
+
+VERSAO = 'estatisticas'
+
+
+def _versao_disciplina(disciplina_id):
+    return f'{VERSAO}:disciplina:{disciplina_id}'
+
+
+def _versao_professor(professor_id):
+    # Uma versão para todas as entradas do professor (geral e por disciplina)
+    return f'{VERSAO}:professor:{professor_id}'
+
+
+def _chave_disciplina(disciplina_id):
+    versao = versoes.versao(_versao_disciplina(disciplina_id))
+    return f'estatisticas:{versoes.versao(VERSAO)}:disciplina:{disciplina_id}:{versao}'
+
+
+def _chave_professor(professor_id, disciplina_id=None):
+    versao = versoes.versao(_versao_professor(professor_id))
+    return f'estatisticas:{versoes.versao(VERSAO)}:professor:{professor_id}:{disciplina_id or "todas"}:{versao}'
+
+
+def invalidar_todas():
+    versoes.renovar(VERSAO)
+
+
+def invalidar_disciplina(disciplina_id):
+    transaction.on_commit(lambda: versoes.renovar(_versao_disciplina(disciplina_id)))
+
+
+def invalidar_professor(professor_id, disciplina_id):
+    transaction.on_commit(lambda: versoes.renovar(_versao_professor(professor_id)))
+
+
+def _histogramas(avaliacoes, criterios):
+    histogramas = {}
+    for criterio in criterios:
+        contagem = [0] * (NOTA_MAXIMA + 1)
+        linhas = (
+            avaliacoes.filter(**{f'{criterio}__isnull': False})
+            .values_list(criterio)
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for nota, total in linhas:
+            if 0 <= nota <= NOTA_MAXIMA:
+                contagem[nota] += total
+        histogramas[criterio] = contagem
+    return histogramas
+
+
+def _semestre(campo_data):
+    # Mesmo formato de periodo_atual(): "2025.1" (jan-jun) ou "2025.2" (jul-dez)
+    return Concat(
+        Cast(ExtractYear(campo_data), CharField()),
+        Case(When(**{f'{campo_data}__month__lte': 6}, then=Value('.1')), default=Value('.2')),
+        output_field=CharField(),
+    )
+
+
+def _tendencia(avaliacoes, criterios, semestre):
+    linhas = (
+        avaliacoes.annotate(semestre=semestre)
+        .values('semestre')
+        .annotate(total=Count('id'), **{criterio: Avg(criterio) for criterio in criterios})
+        .order_by('semestre')
+    )
+
+    return [
+        {
+            'periodo': linha['semestre'],
+            'total': linha['total'],
+            **{
+                criterio: round(linha[criterio], 2) if linha[criterio] is not None else None
+                for criterio in criterios
+            },
+        }
+        for linha in linhas
+    ]
+
+
+def estatisticas_disciplina(disciplina_id):
+    chave = _chave_disciplina(disciplina_id)
+    dados = cache.get(chave)
+    if dados is None:
+        avaliacoes = AvaliacaoDisciplina.objects.filter(disciplina_id=disciplina_id)
+        dados = {
+            'histogramas': _histogramas(avaliacoes, AgregadoDisciplina.CRITERIOS),
+            # Sem período preenchido ainda (ver preencher_periodos): semestre da data
+            'tendencia': _tendencia(
+                avaliacoes, AgregadoDisciplina.CRITERIOS, Coalesce(F('periodo'), _semestre('criado_em'))
+            ),
+        }
+        cache.set(chave, dados, TEMPO_CACHE)
+    return dados
+
+
+def estatisticas_professor(professor_id, disciplina_id=None):
+    chave = _chave_professor(professor_id, disciplina_id)
+    dados = cache.get(chave)
+    if dados is None:
+        avaliacoes = Avaliacao.objects.filter(professor_id=professor_id)
+        if disciplina_id:
+            avaliacoes = avaliacoes.filter(disciplina_id=disciplina_id)
+        dados = {
+            'histogramas': _histogramas(avaliacoes, AgregadoProfessor.CRITERIOS),
+            # Avaliações antigas não têm data
+            'tendencia': _tendencia(
+                avaliacoes.filter(criado_em__isnull=False), AgregadoProfessor.CRITERIOS, _semestre('criado_em')
+            ),
+        }
+        cache.set(chave, dados, TEMPO_CACHE)
+    return dados
@@ -0,0 +1,91 @@
+"""
+Exportação em streaming de avaliações e mensagens (CSV ou NDJSON).
+
+As linhas são lidas do banco com .iterator() e escritas uma a uma na
+resposta, opcionalmente comprimidas com gzip durante o envio. A memória
+usada não cresce com o número de linhas exportadas.
+"""
+
+import csv
+import json
+import zlib
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+
+TAMANHO_LOTE = 2000
+
+FORMATOS = ('csv', 'ndjson')
+
+
+class _Eco:
+    # "Arquivo" que só devolve o que foi escrito, para usar com csv.writer
+    def write(self, valor):
+        return valor
+
+
+def _linhas_csv(colunas, valores):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(colunas)
+    for linha in valores:
+        yield escritor.writerow(linha)
+
+
+def _linhas_ndjson(colunas, valores):
+    for linha in valores:
+        yield json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=str) + '\n'
+
+
+def _comprimir(pedacos):
+    compressor = zlib.compressobj(wbits=31)  # 31 = formato gzip
+    for pedaco in pedacos:
+        dados = compressor.compress(pedaco.encode('utf-8'))
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def _resolver(valores, posicao, modelo, campo):
+    # Troca o id na `posicao` pelo `campo` do modelo, com uma consulta por lote
+    while True:
+        lote = list(islice(valores, TAMANHO_LOTE))
+        if not lote:
+            return
+        ids = {linha[posicao] for linha in lote}
+        nomes = dict(modelo.objects.filter(pk__in=ids).values_list('pk', campo))
+        for linha in lote:
+            yield (*linha[:posicao], nomes.get(linha[posicao]), *linha[posicao + 1:])
+
+
+def resposta_exportacao(queryset, colunas, nome_arquivo, formato='csv', comprimir=False, entre_bancos=None):
+    """
+    Monta uma StreamingHttpResponse com as `colunas` (nomes de campos do
+    queryset, podendo atravessar relações) de cada linha do queryset.
+
+    Relações que ficam em outro banco (mensagens em shards) não têm JOIN:
+    `entre_bancos` mapeia a coluna para (campo do id, modelo, campo do modelo).
+    """
+    entre_bancos = entre_bancos or {}
+    consulta = [entre_bancos[coluna][0] if coluna in entre_bancos else coluna for coluna in colunas]
+    valores = queryset.values_list(*consulta).iterator(chunk_size=TAMANHO_LOTE)
+    for coluna, (_, modelo, campo) in entre_bancos.items():
+        valores = _resolver(valores, colunas.index(coluna), modelo, campo)
+
+    if formato == 'ndjson':
+        pedacos = _linhas_ndjson(colunas, valores)
+        content_type = 'application/x-ndjson; charset=utf-8'
+    else:
+        formato = 'csv'
+        pedacos = _linhas_csv(colunas, valores)
+        content_type = 'text/csv; charset=utf-8'
+
+    nome_arquivo = f'{nome_arquivo}.{formato}'
+    if comprimir:
+        pedacos = _comprimir(pedacos)
+        content_type = 'application/gzip'
+        nome_arquivo += '.gz'
+
+    resposta = StreamingHttpResponse(pedacos, content_type=content_type)
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
@@ -0,0 +1,144 @@
+"""
+Exclusão em segundo plano de usuários e canais com histórico grande.
+
+Pedir a exclusão só desativa o objeto (is_active/ativo = False), o que o
+esconde na hora, e registra um Expurgo. O comando `expurgar_removidos`
+apaga depois as linhas dependentes em lotes pequenos, cada lote na sua
+própria transação, então o lock de escrita do banco nunca fica preso por
+muito tempo e o progresso fica salvo no próprio Expurgo.
+"""
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import shards
+from .agregados import recalcular_agregado_disciplina
+from .models import AvaliacaoDisciplina, Canal, CustomUser, Expurgo
+from .painel import invalidar_estatisticas_painel
+
+
+TAMANHO_LOTE = getattr(settings, 'EXPURGO_TAMANHO_LOTE', 500)
+
+MODELOS = {
+    'usuario': CustomUser,
+    'canal': Canal,
+}
+
+
+def _agendar(tipo, objeto, descricao, solicitante):
+    with transaction.atomic():
+        expurgo, criado = Expurgo.objects.get_or_create(
+            tipo=tipo,
+            objeto_id=objeto.pk,
+            defaults={'descricao': descricao, 'solicitado_por': solicitante},
+        )
+        if not criado and expurgo.status in ('concluido', 'erro'):
+            # IDs podem ser reaproveitados pelo banco; recomeça do zero
+            expurgo.descricao = descricao
+            expurgo.solicitado_por = solicitante
+            expurgo.status = 'pendente'
+            expurgo.total = expurgo.removidos = 0
+            expurgo.erro = ''
+            expurgo.concluido_em = None
+            expurgo.save()
+    return expurgo
+
+
+def agendar_exclusao_usuario(usuario, solicitante=None):
+    # Usuário inativo não autentica e a sessão dele deixa de valer
+    CustomUser.objects.filter(pk=usuario.pk).update(is_active=False)
+    return _agendar('usuario', usuario, usuario.username, solicitante)
+
+
+def agendar_exclusao_canal(canal, solicitante=None):
+    Canal.objects.filter(pk=canal.pk).update(ativo=False)
+    return _agendar('canal', canal, canal.nome, solicitante)
+
+
+def _dependencias(modelo):
+    # Relações reversas que o coletor do Django processaria no delete()
+    for relacao in modelo._meta.related_objects:
+        if relacao.many_to_many or relacao.on_delete not in (models.CASCADE, models.SET_NULL):
+            continue
+        yield relacao.related_model, relacao.field.name, relacao.on_delete
+
+
+def _em_lotes(queryset, tamanho_lote):
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:tamanho_lote])
+        if not ids:
+            return
+        yield ids
+
+
+def executar_expurgo(expurgo, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """
+    Remove as dependências do objeto em lotes de `tamanho_lote` e, no fim,
+    o próprio objeto. `progresso(expurgo)` é chamado após cada lote.
+    """
+    modelo = MODELOS[expurgo.tipo]
+    # Mensagens, reações e timeline podem estar em qualquer shard
+    dependencias = [
+        (relacionado, campo, on_delete, banco,
+         relacionado.objects.using(banco).filter(**{campo: expurgo.objeto_id}))
+        for relacionado, campo, on_delete in _dependencias(modelo)
+        for banco in shards.bancos_do_modelo(relacionado)
+    ]
+
+    # Os agregados de disciplinas não passam pelo delete() das avaliações
+    disciplinas = set()
+    if expurgo.tipo == 'usuario':
+        disciplinas = set(
+            AvaliacaoDisciplina.objects.filter(usuario_id=expurgo.objeto_id)
+            .values_list('disciplina_id', flat=True).distinct()
+        )
+
+    expurgo.status = 'executando'
+    expurgo.total = sum(queryset.count() for *_, queryset in dependencias) + 1
+    expurgo.removidos = 0
+    expurgo.save(update_fields=['status', 'total', 'removidos', 'updated_at'])
+
+    for relacionado, campo, on_delete, banco, queryset in dependencias:
+        for ids in _em_lotes(queryset, tamanho_lote):
+            with transaction.atomic(using=banco):
+                lote = relacionado.objects.using(banco).filter(pk__in=ids)
+                if on_delete is models.SET_NULL:
+                    lote.update(**{campo: None})
+                else:
+                    lote.delete()
+            expurgo.removidos += len(ids)
+            expurgo.save(update_fields=['removidos', 'updated_at'])
+            if progresso:
+                progresso(expurgo)
+
+    with transaction.atomic():
+        modelo.objects.filter(pk=expurgo.objeto_id).delete()
+        expurgo.removidos = expurgo.total
+        expurgo.status = 'concluido'
+        expurgo.concluido_em = timezone.now()
+        expurgo.save(update_fields=['removidos', 'status', 'concluido_em', 'updated_at'])
+
+    for disciplina_id in disciplinas:
+        recalcular_agregado_disciplina(disciplina_id)
+
+    invalidar_estatisticas_painel()
+
+    if progresso:
+        progresso(expurgo)
+    return expurgo
+
+
+def executar_pendentes(tamanho_lote=TAMANHO_LOTE, progresso=None):
+    # 'executando' também entra: retoma expurgos interrompidos no meio
+    executados = 0
+    for expurgo in Expurgo.objects.filter(status__in=('pendente', 'executando')).order_by('id'):
+        try:
+            executar_expurgo(expurgo, tamanho_lote, progresso)
+        except Exception as erro:
+            expurgo.status = 'erro'
+            expurgo.erro = str(erro)
+            expurgo.save(update_fields=['status', 'erro', 'updated_at'])
+        else:
+            executados += 1
+    return executados
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import CustomUser, Canal, Cargo, Evento
+from .models import CustomUser, Canal, Cargo, Evento, AvaliacaoDisciplina, periodo_atual
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -568,4 +568,97 @@ class EditarEventoForm(forms.ModelForm):
             if horario_fim <= horario_inicio:
                 raise forms.ValidationError("O horário de fim deve ser posterior ao horário de início.")
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class ImportarCatalogoForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo CSV',
+        help_text='Colunas: codigo, nome, professor (o professor é opcional)'
+    )
+    
+    delimitador = forms.ChoiceField(
+        choices=[(',', 'Vírgula (,)'), (';', 'Ponto e vírgula (;)')],
+        initial=',',
+        label='Delimitador'
+    )
+
+
+class AvaliacaoDisciplinaForm(forms.ModelForm):
+    contribuicao = forms.IntegerField(min_value=0, max_value=10, label='Contribuição à formação')
+    equilibrio = forms.IntegerField(min_value=0, max_value=10, label='Equilíbrio tarefas × créditos')
+    aplicacao = forms.IntegerField(min_value=0, max_value=10, label='Aplicação prática')
+    material = forms.IntegerField(min_value=0, max_value=10, label='Material didático')
+    distribuicao = forms.IntegerField(min_value=0, max_value=10, label='Distribuição das avaliações')
+    
+    comentario = forms.CharField(
+        required=False,
+        label='Comentário (opcional)',
+        widget=forms.Textarea(attrs={
+            'class': 'comentario-input',
+            'rows': 2
+        })
+    )
+    
+    class Meta:
+        model = AvaliacaoDisciplina
+        fields = ('contribuicao', 'equilibrio', 'aplicacao', 'material', 'distribuicao', 'comentario')
+
+
+class AvaliacaoLoteForm(AvaliacaoDisciplinaForm):
+    disciplina_codigo = forms.CharField(
+        max_length=20,
+        label='Código da disciplina',
+        widget=forms.TextInput(attrs={
+            'class': 'search-input',
+            'placeholder': 'Ex: MAT1001'
+        })
+    )
+    
+    field_order = ['disciplina_codigo']
+    
+    def clean_disciplina_codigo(self):
+        from .catalogo import disciplina_por_codigo
+        
+        codigo = self.cleaned_data.get('disciplina_codigo')
+        disciplina = disciplina_por_codigo(codigo)
+        if disciplina is None:
+            raise forms.ValidationError("Disciplina não encontrada.")
+        self.instance.disciplina = disciplina
+        return disciplina.codigo
+
+
+class BaseAvaliacaoLoteFormSet(forms.BaseFormSet):
+    def __init__(self, *args, usuario=None, **kwargs):
+        self.usuario = usuario
+        super().__init__(*args, **kwargs)
+    
+    def clean(self):
+        if any(self.errors):
+            return
+        
+        disciplinas_ids = [form.instance.disciplina.id for form in self.forms if form.has_changed()]
+        if len(disciplinas_ids) != len(set(disciplinas_ids)):
+            raise forms.ValidationError("Cada disciplina só pode aparecer uma vez no lote.")
+        
+        # Uma consulta para o lote inteiro
+        ja_avaliadas = AvaliacaoDisciplina.objects.filter(
+            usuario=self.usuario,
+            periodo=periodo_atual(),
+            disciplina_id__in=disciplinas_ids
+        ).values_list('disciplina__codigo', flat=True)
+        if ja_avaliadas:
+            raise forms.ValidationError(
+                f"Você já avaliou neste período: {', '.join(sorted(ja_avaliadas))}."
+            )
+
+
+AvaliacaoLoteFormSet = forms.formset_factory(
+    AvaliacaoLoteForm,
+    formset=BaseAvaliacaoLoteFormSet,
+    extra=0,
+    min_num=1,
+    validate_min=True,
+    max_num=10,
+    validate_max=True,
+)
@@ -0,0 +1,120 @@
+"""
+Importação em lote do catálogo (disciplinas, professores e vínculos).
+
+O CSV é lido em streaming e processado em lotes: cada lote faz um upsert
+de disciplinas, um de professores e um insert dos vínculos, então a
+memória usada não depende do tamanho do arquivo.
+
+Formato esperado (com cabeçalho):
+
+    codigo,nome,professor
+    MAT1001,Cálculo I,Maria Silva
+    MAT1001,Cálculo I,João Souza
+    FIS1001,Física I,
+
+A coluna `professor` pode ficar vazia.
+"""
+
+import csv
+from itertools import islice
+from time import perf_counter
+
+from django.db import transaction
+
+from .catalogo import invalidar_catalogo
+from .models import Disciplinas, Professores, normalizar_codigo, normalizar_texto
+
+
+COLUNAS = ('codigo', 'nome', 'professor')
+
+
+class ErroImportacao(Exception):
+    pass
+
+
+def _importar_lote(linhas):
+    disciplinas = {}
+    professores = set()
+    vinculos = set()
+
+    for linha in linhas:
+        codigo = (linha.get('codigo') or '').strip()
+        nome = (linha.get('nome') or '').strip()
+        professor = (linha.get('professor') or '').strip()
+        codigo_normalizado = normalizar_codigo(codigo)
+        if not codigo_normalizado or not nome:
+            continue
+
+        disciplinas[codigo_normalizado] = Disciplinas(
+            codigo=codigo,
+            nome=nome,
+            codigo_normalizado=codigo_normalizado,
+            nome_normalizado=normalizar_texto(nome),
+        )
+        if professor:
+            professores.add(professor)
+            vinculos.add((professor, codigo_normalizado))
+
+    with transaction.atomic():
+        Disciplinas.objects.bulk_create(
+            disciplinas.values(),
+            update_conflicts=True,
+            unique_fields=['codigo_normalizado'],
+            update_fields=['codigo', 'nome', 'nome_normalizado'],
+        )
+        Professores.objects.bulk_create(
+            [Professores(nome=nome) for nome in professores],
+            update_conflicts=True,
+            unique_fields=['nome'],
+            update_fields=['nome'],
+        )
+
+        if vinculos:
+            disciplinas_ids = dict(
+                Disciplinas.objects.filter(
+                    codigo_normalizado__in=disciplinas.keys()
+                ).values_list('codigo_normalizado', 'id')
+            )
+            professores_ids = dict(
+                Professores.objects.filter(nome__in=professores).values_list('nome', 'id')
+            )
+            Vinculo = Professores.disciplinas.through
+            Vinculo.objects.bulk_create(
+                [
+                    Vinculo(professores_id=professores_ids[professor], disciplinas_id=disciplinas_ids[codigo])
+                    for professor, codigo in vinculos
+                ],
+                ignore_conflicts=True,
+            )
+
+    return len(disciplinas), len(professores), len(vinculos)
+
+
+def importar_catalogo(arquivo, tamanho_lote=1000, delimitador=','):
+    """
+    Importa um CSV a partir de um arquivo de texto já aberto. Devolve um
+    dicionário com os totais processados e a taxa em linhas por segundo.
+    """
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    faltando = set(COLUNAS[:2]) - set(leitor.fieldnames or [])
+    if faltando:
+        raise ErroImportacao(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+
+    resultado = {'linhas': 0, 'disciplinas': 0, 'professores': 0, 'vinculos': 0}
+    inicio = perf_counter()
+
+    while True:
+        lote = list(islice(leitor, tamanho_lote))
+        if not lote:
+            break
+        disciplinas, professores, vinculos = _importar_lote(lote)
+        resultado['linhas'] += len(lote)
+        resultado['disciplinas'] += disciplinas
+        resultado['professores'] += professores
+        resultado['vinculos'] += vinculos
+
+    invalidar_catalogo()
+
+    resultado['segundos'] = perf_counter() - inicio
+    resultado['linhas_por_segundo'] = resultado['linhas'] / resultado['segundos'] if resultado['segundos'] else 0
+    return resultado
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.timeline import MAX_ENTRADAS, TAMANHO_LOTE, aparar_timelines
+
+
+class Command(BaseCommand):
+    help = f'Remove as entradas de timeline além das {MAX_ENTRADAS} mais recentes de cada usuário, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Entradas apagadas por transação')
+
+    def handle(self, *args, **options):
+        for banco, removidas in aparar_timelines(options['lote']).items():
+            self.stdout.write(f'{banco}: {removidas} entrada(s) removida(s).')
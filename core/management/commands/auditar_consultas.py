@@ -0,0 +1,166 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+
+from core import shards
+from core.models import Canal, CustomUser, Disciplinas, Evento, Mensagem, Professores
+from core.views import LISTAS_PAINEL
+
+
+# Rotas que alteram dados mesmo num GET
+SEM_AUDITORIA = {
+    'toggle_cargo', 'remover_pesquisa', 'limpar_pesquisas', 'enviar_mensagem',
+    'aceitar_chat_request', 'recusar_chat_request', 'aceitar_cargo_request',
+    'recusar_cargo_request', 'moderar_solicitacoes', 'deletar_usuario',
+    'deletar_canal', 'deletar_cargo', 'excluir_evento',
+}
+
+# Parâmetros de busca usados para exercitar as consultas de cada rota
+PARAMETROS = {
+    'busca_usuarios': {'q': 'a'},
+    'admin_panel_lista': {'q': 'a'},
+}
+
+
+def _valores(nome):
+    # Valores existentes no banco para os argumentos das URLs
+    if nome == 'canal_id':
+        canal = Canal.objects.filter(ativo=True, tipo='publico').order_by('id').first()
+        return [canal.id] if canal else []
+    if nome == 'lista':
+        return list(LISTAS_PAINEL)
+    if nome == 'codigo':
+        return list(Disciplinas.objects.order_by('id').values_list('codigo', flat=True)[:1])
+    modelos = {'professor_id': Professores, 'evento_id': Evento}
+    if nome in modelos:
+        return list(modelos[nome].objects.order_by('id').values_list('id', flat=True)[:1])
+    return []
+
+
+def _rotas():
+    vistas = set()
+    for padrao in get_resolver().url_patterns:
+        callback = getattr(padrao, 'callback', None)
+        if callback is None or callback.__module__ != 'core.views' or padrao.name in SEM_AUDITORIA:
+            continue
+        # Aliases da mesma view com os mesmos argumentos fixos só contam uma vez
+        chave = (callback, tuple(sorted(padrao.default_args.items())))
+        if chave in vistas:
+            continue
+        vistas.add(chave)
+
+        argumentos = list(padrao.pattern.converters)
+        if not argumentos:
+            yield padrao.name, {}
+            continue
+        # Só há rotas com um argumento
+        for valor in _valores(argumentos[0]):
+            yield padrao.name, {argumentos[0]: valor}
+
+
+def _problemas(plano, tabelas):
+    for *_, detalhe in plano:
+        partes = detalhe.split()
+        if partes[0] == 'SCAN' and 'USING' not in partes:
+            # Versões antigas do SQLite escrevem "SCAN TABLE x"
+            tabela = partes[2] if partes[1] == 'TABLE' else partes[1]
+            # Subconsultas e CTEs também aparecem como SCAN; só tabelas contam
+            if tabela in tabelas:
+                yield tabela, f'varredura completa: {detalhe}'
+        elif 'TEMP B-TREE' in detalhe:
+            yield None, f'B-tree temporário: {detalhe}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa cada view de core.views (GET) no banco atual, roda EXPLAIN QUERY PLAN '
+        'nas consultas e aponta varreduras completas e B-trees temporários'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Username usado nas requisições (padrão: primeiro superusuário)')
+        parser.add_argument('--views', nargs='*', help='Nomes das rotas a auditar (padrão: todas)')
+        parser.add_argument('--host', default='localhost', help='Precisa estar em ALLOWED_HOSTS')
+        parser.add_argument('--planos', action='store_true', help='Mostra o plano de todas as consultas')
+
+    def _auditar(self, cliente, nome, kwargs, bancos):
+        url = reverse(nome, kwargs=kwargs)
+        with ExitStack() as pilha:
+            capturas = {banco: pilha.enter_context(CaptureQueriesContext(connections[banco])) for banco in bancos}
+            # Tudo que a view gravar é desfeito no fim
+            for banco in bancos:
+                pilha.enter_context(transaction.atomic(using=banco))
+            try:
+                resposta = cliente.get(url, PARAMETROS.get(nome, {}))
+                if resposta.streaming:
+                    for _ in resposta.streaming_content:
+                        pass
+                status = resposta.status_code
+            finally:
+                for banco in bancos:
+                    transaction.set_rollback(True, using=banco)
+
+        consultas = []
+        for banco, captura in capturas.items():
+            vistas = set()
+            tabelas = set(connections[banco].introspection.table_names())
+            with connections[banco].cursor() as cursor:
+                for consulta in captura.captured_queries:
+                    sql = consulta['sql']
+                    if sql in vistas or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                        continue
+                    vistas.add(sql)
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plano = cursor.fetchall()
+                    consultas.append((banco, sql, plano, list(_problemas(plano, tabelas))))
+        total = sum(len(captura) for captura in capturas.values())
+
+        return url, status, total, consultas
+
+    def handle(self, *args, **options):
+        if options['usuario']:
+            usuario = CustomUser.objects.filter(username=options['usuario']).first()
+        else:
+            usuario = CustomUser.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        if usuario is None:
+            raise CommandError('Usuário não encontrado; use --usuario ou crie um superusuário.')
+
+        cliente = Client(SERVER_NAME=options['host'])
+        cliente.force_login(usuario)
+        bancos = shards.bancos_do_modelo(Mensagem)
+
+        por_tabela = {}
+        for nome, kwargs in _rotas():
+            if options['views'] and nome not in options['views']:
+                continue
+            try:
+                url, status, total, consultas = self._auditar(cliente, nome, kwargs, bancos)
+            except Exception as erro:
+                self.stdout.write(self.style.ERROR(f'{nome}: erro {type(erro).__name__}: {erro}'))
+                continue
+
+            com_problema = [consulta for consulta in consultas if consulta[3]]
+            estilo = self.style.WARNING if com_problema else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f'{nome} {url} [{status}]: {total} consulta(s), {len(com_problema)} com problema'
+            ))
+
+            for banco, sql, plano, problemas in consultas:
+                if not problemas and not options['planos']:
+                    continue
+                self.stdout.write(f'  [{banco}] {sql[:300]}')
+                for *_, detalhe in plano:
+                    self.stdout.write(f'      {detalhe}')
+                for tabela, problema in problemas:
+                    self.stdout.write(self.style.WARNING(f'    ! {problema}'))
+                    if tabela:
+                        por_tabela.setdefault(tabela, set()).add(nome)
+
+        if por_tabela:
+            self.stdout.write('\nTabelas lidas por inteiro:')
+            for tabela, nomes in sorted(por_tabela.items()):
+                self.stdout.write(f"  {tabela}: {', '.join(sorted(nomes))}")
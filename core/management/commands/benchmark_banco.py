@@ -0,0 +1,101 @@
+import copy
+import os
+import tempfile
+import threading
+from time import perf_counter
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+
+
+def _perfis():
+    padrao = {'ENGINE': 'django.db.backends.sqlite3'}
+    producao = {**padrao, **copy.deepcopy(settings.SQLITE_PRODUCAO)}
+    return {'padrao': padrao, 'producao': producao}
+
+
+class Command(BaseCommand):
+    help = 'Compara leituras e escritas concorrentes no SQLite com o perfil padrão e o de produção'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leitores', type=int, default=8)
+        parser.add_argument('--escritores', type=int, default=2)
+        parser.add_argument('--segundos', type=float, default=5)
+        parser.add_argument('--linhas', type=int, default=20_000, help='Linhas iniciais da tabela')
+
+    def _preparar(self, conexoes, linhas):
+        with conexoes['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE mensagem (id INTEGER PRIMARY KEY, canal INTEGER, conteudo TEXT)')
+            cursor.execute('CREATE INDEX mensagem_canal ON mensagem (canal, id)')
+            cursor.executemany(
+                'INSERT INTO mensagem (canal, conteudo) VALUES (%s, %s)',
+                [(i % 50, f'mensagem {i}') for i in range(linhas)],
+            )
+        conexoes['default'].close()
+
+    def _executar(self, conexoes, persistente, operacao, fim, latencias, erros):
+        rng = np.random.default_rng(threading.get_ident() % 2**32)
+        conexao = conexoes['default']
+        while perf_counter() < fim:
+            canal = int(rng.integers(50))
+            inicio = perf_counter()
+            try:
+                with conexao.cursor() as cursor:
+                    if operacao == 'leitura':
+                        cursor.execute(
+                            'SELECT id, conteudo FROM mensagem WHERE canal = %s ORDER BY id DESC LIMIT 50',
+                            [canal],
+                        )
+                        cursor.fetchall()
+                    else:
+                        cursor.execute('INSERT INTO mensagem (canal, conteudo) VALUES (%s, %s)', [canal, 'nova'])
+            except OperationalError:
+                erros.append(operacao)
+                conexao.close()
+            else:
+                latencias.append(perf_counter() - inicio)
+            if not persistente:
+                # Sem CONN_MAX_AGE o Django fecha a conexão ao fim de cada requisição
+                conexao.close()
+        conexao.close()
+
+    def _rodar(self, nome, perfil, options):
+        with tempfile.TemporaryDirectory() as pasta:
+            conexoes = ConnectionHandler({'default': {**perfil, 'NAME': os.path.join(pasta, 'bench.sqlite3')}})
+            self._preparar(conexoes, options['linhas'])
+
+            persistente = bool(perfil.get('CONN_MAX_AGE'))
+            resultados = {'leitura': [], 'escrita': []}
+            erros = []
+            fim = perf_counter() + options['segundos']
+            threads = [
+                threading.Thread(
+                    target=self._executar,
+                    args=(conexoes, persistente, operacao, fim, resultados[operacao], erros),
+                )
+                for operacao, quantidade in (('leitura', options['leitores']), ('escrita', options['escritores']))
+                for _ in range(quantidade)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(f'Perfil {nome}:')
+        for operacao, latencias in resultados.items():
+            if not latencias:
+                self.stdout.write(f'  {operacao}: nenhuma concluída, {erros.count(operacao)} erro(s)')
+                continue
+            latencias = np.array(latencias) * 1000
+            self.stdout.write(
+                f"  {operacao}: {len(latencias) / options['segundos']:.0f} ops/s, "
+                f"p50 {np.percentile(latencias, 50):.2f} ms, p99 {np.percentile(latencias, 99):.2f} ms, "
+                f"{erros.count(operacao)} erro(s)"
+            )
+
+    def handle(self, *args, **options):
+        for nome, perfil in _perfis().items():
+            self._rodar(nome, perfil, options)
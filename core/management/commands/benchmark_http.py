@@ -0,0 +1,223 @@
+import http.client
+import json
+import subprocess
+import threading
+from contextlib import ExitStack
+from datetime import datetime
+from importlib import import_module
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.management.commands.auditar_consultas import PARAMETROS, _rotas
+from core.models import CustomUser
+from core.sintetico import GeradorDados
+
+
+ROTAS_PADRAO = ['dashboard', 'chat', 'busca_usuarios', 'avaliacao_professores', 'listar_eventos']
+
+CABECALHO_CONSULTAS = 'X-Consultas'
+
+
+class RequisicaoSilenciosa(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _contando_consultas(aplicacao):
+    # Conta as consultas de cada requisição em todos os bancos e devolve no cabeçalho
+    def wsgi(environ, start_response):
+        total = [0]
+
+        def contar(execute, sql, params, many, context):
+            total[0] += 1
+            return execute(sql, params, many, context)
+
+        def iniciar(status, cabecalhos, exc_info=None):
+            return start_response(status, cabecalhos + [(CABECALHO_CONSULTAS, str(total[0]))], exc_info)
+
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(contar))
+            return aplicacao(environ, iniciar)
+    return wsgi
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Sobe o app num servidor local com várias threads e mede vazão, latência (p50/p95/p99) '
+        'e consultas por requisição de cada rota, com usuários virtuais autenticados concorrentes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', nargs='*', help=f"Rotas a medir (padrão: {', '.join(ROTAS_PADRAO)})")
+        parser.add_argument('--todas', action='store_true', help='Mede todas as rotas GET de core.views')
+        parser.add_argument('--usuarios', type=int, default=10, help='Usuários virtuais simultâneos')
+        parser.add_argument('--requisicoes', type=int, default=20, help='Requisições de cada usuário por rota')
+        parser.add_argument('--aquecimento', type=int, default=3, help='Requisições não medidas por rota')
+        parser.add_argument('--url', help='Mede um servidor já rodando (ex.: http://127.0.0.1:8000) em vez de subir um')
+        parser.add_argument('--host', default='localhost', help='Cabeçalho Host; precisa estar em ALLOWED_HOSTS')
+        parser.add_argument('--gerar', type=float, metavar='ESCALA', help='Antes de medir, gera dados sintéticos nessa escala')
+        parser.add_argument('--saida', help='Grava o resultado em JSON')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+
+    def _sessoes(self, quantidade):
+        # Os usuários em mais canais têm os dashboards mais pesados
+        usuarios = list(
+            CustomUser.objects.filter(is_active=True)
+            .annotate(canais=Count('membros_canal')).order_by('-canais', 'id')[:quantidade]
+        )
+        if not usuarios:
+            raise CommandError('Não há usuários no banco; use --gerar ou rode gerar_dados antes.')
+        sessoes = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            sessoes.append(cliente.cookies[settings.SESSION_COOKIE_NAME].value)
+        # Mais usuários virtuais que usuários no banco: as sessões se repetem
+        return [sessoes[i % len(sessoes)] for i in range(quantidade)]
+
+    def _usuario_virtual(self, endereco, caminho, sessao, quantidade, host, resultados):
+        conexao = http.client.HTTPConnection(*endereco, timeout=60)
+        cabecalhos = {'Host': host, 'Cookie': f'{settings.SESSION_COOKIE_NAME}={sessao}'}
+        for _ in range(quantidade):
+            inicio = perf_counter()
+            try:
+                conexao.request('GET', caminho, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+            except (OSError, http.client.HTTPException):
+                conexao.close()
+                resultados.append((perf_counter() - inicio, None, None))
+                continue
+            consultas = resposta.getheader(CABECALHO_CONSULTAS)
+            resultados.append((perf_counter() - inicio, resposta.status, int(consultas) if consultas else None))
+        conexao.close()
+
+    def _medir(self, endereco, caminho, sessoes, options):
+        # Aquecimento: caches, conexões e compilação de templates fora da medição
+        self._usuario_virtual(endereco, caminho, sessoes[0], options['aquecimento'], options['host'], [])
+
+        resultados = []
+        threads = [
+            threading.Thread(
+                target=self._usuario_virtual,
+                args=(endereco, caminho, sessao, options['requisicoes'], options['host'], resultados),
+            )
+            for sessao in sessoes
+        ]
+        inicio = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = perf_counter() - inicio
+
+        latencias = np.array([latencia for latencia, _, _ in resultados]) * 1000
+        consultas = [total for _, _, total in resultados if total is not None]
+        status = {}
+        for _, codigo, _ in resultados:
+            status[str(codigo or 'erro')] = status.get(str(codigo or 'erro'), 0) + 1
+        return {
+            'url': caminho,
+            'requisicoes': len(resultados),
+            'por_segundo': round(len(resultados) / duracao, 1),
+            'p50_ms': round(float(np.percentile(latencias, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencias, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencias, 99)), 2),
+            'max_ms': round(float(latencias.max()), 2),
+            'consultas': round(float(np.mean(consultas)), 1) if consultas else None,
+            'status': status,
+        }
+
+    def _comparar(self, anterior, resultados):
+        self.stdout.write(f"\nComparação com {anterior.get('commit') or 'execução anterior'} ({anterior.get('data')}):")
+        for nome, atual in resultados.items():
+            antes = anterior.get('rotas', {}).get(nome)
+            if not antes:
+                continue
+            variacao = (atual['p95_ms'] - antes['p95_ms']) / antes['p95_ms'] * 100 if antes['p95_ms'] else 0
+            estilo = self.style.ERROR if variacao > 10 else self.style.SUCCESS if variacao < -10 else str
+            self.stdout.write(estilo(
+                f"  {nome}: p95 {antes['p95_ms']:.1f} -> {atual['p95_ms']:.1f} ms ({variacao:+.0f}%), "
+                f"{antes['por_segundo']:.0f} -> {atual['por_segundo']:.0f} req/s, "
+                f"consultas {antes['consultas']} -> {atual['consultas']}"
+            ))
+
+    def handle(self, *args, **options):
+        if options['gerar']:
+            if CustomUser.objects.filter(username__startswith='carga').exists():
+                self.stdout.write('Dados sintéticos com o prefixo "carga" já existem; pulando a geração.')
+            else:
+                GeradorDados(escala=options['gerar'], prefixo='carga').executar()
+
+        nomes = options['views'] or ROTAS_PADRAO
+        rotas = [(nome, kwargs) for nome, kwargs in _rotas() if options['todas'] or nome in nomes]
+        if not rotas:
+            raise CommandError('Nenhuma rota encontrada com esses nomes.')
+        sessoes = self._sessoes(options['usuarios'])
+
+        servidor = None
+        if options['url']:
+            partes = urlsplit(options['url'])
+            endereco = (partes.hostname, partes.port or 80)
+        else:
+            servidor = ThreadedWSGIServer(('127.0.0.1', 0), RequisicaoSilenciosa, allow_reuse_address=False)
+            servidor.set_app(_contando_consultas(get_internal_wsgi_application()))
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            endereco = servidor.server_address[:2]
+
+        resultados = {}
+        try:
+            for nome, kwargs in rotas:
+                caminho = reverse(nome, kwargs=kwargs)
+                if nome in PARAMETROS:
+                    caminho += '?' + urlencode(PARAMETROS[nome])
+                resultado = self._medir(endereco, caminho, sessoes, options)
+                resultados[nome] = resultado
+                estilo = self.style.WARNING if set(resultado['status']) - {'200'} else self.style.SUCCESS
+                self.stdout.write(estilo(
+                    f"{nome} {caminho}: {resultado['por_segundo']:.0f} req/s, p50 {resultado['p50_ms']:.1f} ms, "
+                    f"p95 {resultado['p95_ms']:.1f} ms, p99 {resultado['p99_ms']:.1f} ms, "
+                    f"{resultado['consultas']} consultas/req, status {resultado['status']}"
+                ))
+        finally:
+            if servidor:
+                servidor.shutdown()
+                servidor.server_close()
+            SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+            for sessao in set(sessoes):
+                SessionStore(session_key=sessao).delete()
+
+        relatorio = {
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'usuarios': options['usuarios'],
+            'requisicoes': options['requisicoes'],
+            'servidor': options['url'] or 'local',
+            'rotas': resultados,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"\nResultado gravado em {options['saida']}")
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                self._comparar(json.load(arquivo), resultados)
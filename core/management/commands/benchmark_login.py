@@ -0,0 +1,113 @@
+import asyncio
+import secrets
+from time import perf_counter
+from urllib.parse import urlencode
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from app.asgi import application
+from core.models import CustomUser
+
+
+SENHA = 'benchmark-senha'
+
+
+async def _login(caminho, host, username, ip):
+    # Requisição ASGI direta na aplicação, sem servidor HTTP no meio
+    csrf = secrets.token_hex(16)
+    corpo = urlencode({'username': username, 'password': SENHA, 'csrfmiddlewaretoken': csrf}).encode()
+    escopo = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': caminho,
+        'raw_path': caminho.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', host.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(corpo)).encode()),
+            (b'cookie', f'csrftoken={csrf}'.encode()),
+        ],
+        'client': (ip, 50000),
+        'server': ('localhost', 80),
+    }
+    entradas = [{'type': 'http.request', 'body': corpo, 'more_body': False}]
+    status = {}
+
+    async def receber():
+        if entradas:
+            return entradas.pop(0)
+        # O Django encerra a requisição se o cliente "desconectar" antes da resposta
+        await asyncio.Event().wait()
+
+    async def enviar(mensagem):
+        if mensagem['type'] == 'http.response.start':
+            status['codigo'] = mensagem['status']
+
+    inicio = perf_counter()
+    await application(escopo, receber, enviar)
+    return status.get('codigo'), perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = 'Mede vazão e latência do login assíncrono sob uma rajada de logins simultâneos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--usuarios', type=int, default=50)
+        parser.add_argument('--ips', type=int, default=50, help='Endereços de origem distintos')
+        parser.add_argument('--host', default='localhost', help='Precisa estar em ALLOWED_HOSTS')
+
+    async def _rajada(self, host, usernames, ips, total):
+        caminho = reverse('logando')
+        tarefas = [
+            _login(caminho, host, usernames[i % len(usernames)], ips[i % len(ips)])
+            for i in range(total)
+        ]
+        inicio = perf_counter()
+        resultados = await asyncio.gather(*tarefas)
+        return resultados, perf_counter() - inicio
+
+    def handle(self, *args, **options):
+        prefixo = f'bench-{secrets.token_hex(3)}'
+        codificada = make_password(SENHA)
+        usuarios = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'{prefixo}-{i}',
+                email=f'{prefixo}-{i}@exemplo.com',
+                matricula=f'{prefixo}-{i}',
+                fullname='Benchmark',
+                password=codificada,
+            )
+            for i in range(options['usuarios'])
+        ])
+        ips = [f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}' for i in range(options['ips'])]
+
+        try:
+            resultados, duracao = asyncio.run(
+                self._rajada(options['host'], [usuario.username for usuario in usuarios], ips, options['logins'])
+            )
+        finally:
+            CustomUser.objects.filter(username__startswith=prefixo).delete()
+
+        codigos = {}
+        for codigo, _ in resultados:
+            codigos[codigo] = codigos.get(codigo, 0) + 1
+        latencias = np.array([latencia for _, latencia in resultados]) * 1000
+        sucesso = codigos.get(302, 0)
+
+        self.stdout.write(
+            f"{options['logins']} logins em {duracao:.2f}s ({sucesso / duracao:.1f} logins/s com sucesso); "
+            f"respostas: {dict(sorted(codigos.items()))}"
+        )
+        self.stdout.write(
+            f"latência p50 {np.percentile(latencias, 50):.0f} ms, "
+            f"p95 {np.percentile(latencias, 95):.0f} ms, p99 {np.percentile(latencias, 99):.0f} ms"
+        )
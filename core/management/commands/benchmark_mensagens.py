@@ -0,0 +1,64 @@
+import threading
+from time import perf_counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.commit_em_grupo import criar_mensagem
+from core.models import Canal, CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Compara a gravação de mensagens concorrentes com e sem group commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--mensagens', type=int, default=200, help='Mensagens por thread')
+
+    def _postar(self, canal, autor, quantidade, em_grupo, latencias, erros):
+        for i in range(quantidade):
+            inicio = perf_counter()
+            try:
+                criar_mensagem(canal, autor, f'mensagem {i}', em_grupo=em_grupo)
+            except Exception:
+                erros.append(1)
+            else:
+                latencias.append(perf_counter() - inicio)
+        connection.close()
+
+    def _rodar(self, canal, autor, em_grupo, options):
+        latencias, erros = [], []
+        threads = [
+            threading.Thread(
+                target=self._postar,
+                args=(canal, autor, options['mensagens'], em_grupo, latencias, erros),
+            )
+            for _ in range(options['threads'])
+        ]
+        inicio = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = perf_counter() - inicio
+
+        latencias = np.array(latencias or [0]) * 1000
+        self.stdout.write(
+            f"{'group commit' if em_grupo else 'um commit por mensagem'}: "
+            f"{len(latencias) / duracao:.0f} mensagens/s, p50 {np.percentile(latencias, 50):.1f} ms, "
+            f"p99 {np.percentile(latencias, 99):.1f} ms, {len(erros)} erro(s)"
+        )
+
+    def handle(self, *args, **options):
+        autor = CustomUser.objects.create(
+            username='benchmark-mensagens', email='benchmark-mensagens@exemplo.com',
+            matricula='benchmark-mensagens', fullname='Benchmark',
+        )
+        canal = Canal.objects.create(nome='Benchmark de mensagens', tipo='publico', criado_por=autor)
+        try:
+            for em_grupo in (False, True):
+                self._rodar(canal, autor, em_grupo, options)
+        finally:
+            canal.delete()
+            autor.delete()
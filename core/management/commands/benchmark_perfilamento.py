@@ -0,0 +1,87 @@
+from time import perf_counter
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.management.commands.auditar_consultas import PARAMETROS, _rotas
+from core.models import CustomUser
+
+
+MIDDLEWARE = 'core.perfilamento.PerfilamentoMiddleware'
+
+LIMITE_OVERHEAD = 2.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo do PerfilamentoMiddleware fora da amostragem do cProfile, alternando '
+        'requisição a requisição entre um cliente com e outro sem o middleware'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', nargs='*', default=['dashboard', 'chat', 'listar_eventos', 'avaliacao_professores'])
+        parser.add_argument('--requisicoes', type=int, default=300, help='Requisições por rota em cada cliente')
+        parser.add_argument('--host', default='localhost', help='Precisa estar em ALLOWED_HOSTS')
+
+    def _cliente(self, usuario, host, url, **configuracoes):
+        # O handler do cliente monta a cadeia de middlewares na primeira
+        # requisição e a mantém depois que as configurações voltam ao normal
+        with override_settings(**configuracoes):
+            cliente = Client(SERVER_NAME=host)
+            cliente.force_login(usuario)
+            cliente.get(url)
+        return cliente
+
+    def handle(self, *args, **options):
+        if MIDDLEWARE not in settings.MIDDLEWARE:
+            raise CommandError(f'{MIDDLEWARE} não está em MIDDLEWARE.')
+        usuario = (
+            CustomUser.objects.filter(is_active=True)
+            .annotate(canais=Count('membros_canal')).order_by('-canais', 'id').first()
+        )
+        if usuario is None:
+            raise CommandError('Não há usuários no banco; rode gerar_dados antes.')
+        urls = [(nome, reverse(nome, kwargs=kwargs)) for nome, kwargs in _rotas() if nome in options['views']]
+        if not urls:
+            raise CommandError('Nenhuma rota encontrada com esses nomes.')
+
+        clientes = {
+            'sem': self._cliente(
+                usuario, options['host'], urls[0][1],
+                MIDDLEWARE=[middleware for middleware in settings.MIDDLEWARE if middleware != MIDDLEWARE],
+            ),
+            # Amostragem zero: o caminho de toda requisição que não cai no cProfile
+            'com': self._cliente(usuario, options['host'], urls[0][1], PERFILAMENTO_AMOSTRAGEM=0),
+        }
+
+        pior = 0
+        for nome, url in urls:
+            parametros = PARAMETROS.get(nome, {})
+            tempos = {chave: [] for chave in clientes}
+            for cliente in clientes.values():
+                cliente.get(url, parametros)
+            # Alterna os clientes (e quem vai primeiro) para a variação da
+            # máquina afetar os dois igualmente
+            for i in range(options['requisicoes']):
+                ordem = list(clientes.items()) if i % 2 else list(clientes.items())[::-1]
+                for chave, cliente in ordem:
+                    inicio = perf_counter()
+                    cliente.get(url, parametros)
+                    tempos[chave].append(perf_counter() - inicio)
+
+            sem = np.median(tempos['sem']) * 1000
+            com = np.median(tempos['com']) * 1000
+            overhead = (com - sem) / sem * 100
+            pior = max(pior, overhead)
+            estilo = self.style.ERROR if overhead > LIMITE_OVERHEAD else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f'{nome}: mediana {sem:.2f} ms sem, {com:.2f} ms com perfilamento ({overhead:+.2f}%)'
+            ))
+
+        resumo = f'Maior overhead: {pior:+.2f}% (limite {LIMITE_OVERHEAD:.0f}%)'
+        self.stdout.write(self.style.ERROR(resumo) if pior > LIMITE_OVERHEAD else self.style.SUCCESS(resumo))
@@ -0,0 +1,34 @@
+from time import perf_counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.ranking import calcular_estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo do cálculo vetorizado do ranking com avaliações sintéticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--avaliacoes', type=int, default=1_000_000)
+        parser.add_argument('--itens', type=int, default=5_000)
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        # Distribuição enviesada: poucos itens concentram muitas avaliações
+        ids = rng.zipf(1.3, options['avaliacoes']) % options['itens']
+        notas = rng.integers(0, 11, size=(options['avaliacoes'], 5)).mean(axis=1)
+
+        tempos = []
+        for _ in range(options['repeticoes']):
+            inicio = perf_counter()
+            calcular_estatisticas(ids, notas)
+            tempos.append(perf_counter() - inicio)
+
+        self.stdout.write(
+            f"{options['avaliacoes']} avaliações, {len(np.unique(ids))} itens: "
+            f"melhor {min(tempos) * 1000:.1f} ms, mediana {np.median(tempos) * 1000:.1f} ms"
+        )
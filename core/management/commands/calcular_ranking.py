@@ -0,0 +1,19 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from core.ranking import calcular_ranking_disciplinas, calcular_ranking_professores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o ranking de disciplinas e professores (médias bayesianas)'
+
+    def handle(self, *args, **options):
+        inicio = perf_counter()
+        total = calcular_ranking_disciplinas()
+        self.stdout.write(f'{total} disciplina(s) no ranking.')
+
+        total = calcular_ranking_professores()
+        self.stdout.write(f'{total} professor(es) no ranking.')
+
+        self.stdout.write(self.style.SUCCESS(f'Ranking calculado em {perf_counter() - inicio:.2f}s.'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.emails import TAMANHO_LOTE, enviar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Envia os e-mails da caixa de saída em lotes, reaproveitando a conexão SMTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='E-mails enviados por conexão')
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=0,
+            help='Segundos entre verificações; 0 esvazia a fila uma vez e sai',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Esvazia o que já venceu antes de dormir
+            while True:
+                enviados, falhas = enviar_pendentes(options['lote'])
+                if enviados or falhas:
+                    self.stdout.write(f'{enviados} enviado(s), {falhas} falha(s).')
+                if enviados + falhas < options['lote']:
+                    break
+
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
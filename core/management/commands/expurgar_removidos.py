@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.expurgo import TAMANHO_LOTE, executar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Apaga em lotes o histórico de usuários e canais com exclusão agendada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Linhas apagadas por transação')
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=0,
+            help='Segundos entre verificações; 0 executa uma vez e sai',
+        )
+
+    def _progresso(self, expurgo):
+        self.stdout.write(
+            f'{expurgo.get_tipo_display()} "{expurgo.descricao}": '
+            f'{expurgo.removidos}/{expurgo.total} ({expurgo.progresso}%)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = executar_pendentes(options['lote'], self._progresso)
+            if total:
+                self.stdout.write(self.style.SUCCESS(f'{total} exclusão(ões) concluída(s).'))
+
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
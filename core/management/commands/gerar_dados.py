@@ -0,0 +1,52 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sintetico import QUANTIDADES, TAMANHO_LOTE, ErroGeracao, GeradorDados
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos com distribuição enviesada (usuários, canais, mensagens, '
+        'reações, avaliações...) para testes de carga; a mesma semente gera os mesmos dados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1, help='Multiplica todas as quantidades (10 passa de 10 milhões de linhas)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefixo', default='sint', help='Prefixo dos usernames e nomes gerados')
+        parser.add_argument('--assimetria', type=float, default=1.1, help='Expoente da lei de potência da popularidade')
+        parser.add_argument('--dias', type=int, default=365, help='Período coberto pelas datas')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE)
+        parser.add_argument('--senha', default='senha123', help='Senha de todos os usuários gerados')
+        for nome in QUANTIDADES:
+            parser.add_argument(f"--{nome.replace('_', '-')}", dest=nome, type=int, help='Quantidade exata (ignora --escala)')
+
+    def _progresso(self, nome, total, segundos):
+        taxa = f', {total / segundos:,.0f} linhas/s' if total and segundos else ''
+        self.stdout.write(f'  {nome}: {total} em {segundos:.1f}s{taxa}')
+
+    def handle(self, *args, **options):
+        gerador = GeradorDados(
+            quantidades={nome: options[nome] for nome in QUANTIDADES if options[nome] is not None},
+            escala=options['escala'],
+            seed=options['seed'],
+            prefixo=options['prefixo'],
+            assimetria=options['assimetria'],
+            dias=options['dias'],
+            tamanho_lote=options['lote'],
+            senha=options['senha'],
+            progresso=self._progresso,
+        )
+
+        inicio = perf_counter()
+        try:
+            gerados = gerador.executar()
+        except ErroGeracao as erro:
+            raise CommandError(str(erro))
+        segundos = perf_counter() - inicio
+
+        total = sum(gerados.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} linhas em {segundos:.1f}s ({total / segundos:,.0f} linhas/s)'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacao import ErroImportacao, importar_catalogo
+
+
+class Command(BaseCommand):
+    help = 'Importa disciplinas, professores e seus vínculos de um CSV (codigo,nome,professor)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument('--delimitador', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], encoding=options['encoding'], newline='') as arquivo:
+                resultado = importar_catalogo(
+                    arquivo,
+                    tamanho_lote=options['lote'],
+                    delimitador=options['delimitador'],
+                )
+        except (OSError, ErroImportacao) as erro:
+            raise CommandError(str(erro))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['linhas']} linha(s) em {resultado['segundos']:.2f}s "
+            f"({resultado['linhas_por_segundo']:.0f} linhas/s): "
+            f"{resultado['disciplinas']} disciplina(s), {resultado['professores']} professor(es), "
+            f"{resultado['vinculos']} vínculo(s) processados."
+        ))
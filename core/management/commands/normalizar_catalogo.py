@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.catalogo import normalizar_catalogo
+from core.models import Disciplinas
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche código e nome normalizados das disciplinas antigas e lista os códigos '
+        'que normalizam para o mesmo valor'
+    )
+
+    def handle(self, *args, **options):
+        preenchidas, conflitos = normalizar_catalogo()
+        self.stdout.write(f'{preenchidas} disciplina(s) normalizada(s).')
+        if not conflitos:
+            return
+
+        nomes = Disciplinas.objects.in_bulk([disciplina_id for ids in conflitos.values() for disciplina_id in ids])
+        self.stdout.write(self.style.WARNING(
+            f'{len(conflitos)} código(s) repetido(s); só a primeira disciplina de cada um '
+            'é encontrada pelo código. Junte ou corrija as outras e rode o comando de novo:'
+        ))
+        for codigo, ids in sorted(conflitos.items()):
+            disciplinas = '; '.join(f'#{disciplina_id} {nomes[disciplina_id]}' for disciplina_id in ids)
+            self.stdout.write(f'  {codigo}: {disciplinas}')
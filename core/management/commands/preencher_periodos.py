@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.agregados import preencher_periodos
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche o período das avaliações de disciplina antigas pela data de criação e remove '
+        'as repetidas do mesmo aluno, disciplina e período (fica a mais recente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Só mostra o que seria feito, sem gravar')
+
+    def handle(self, *args, **options):
+        pendentes, removidas = preencher_periodos(simular=options['simular'])
+        verbo = 'seria(m)' if options['simular'] else 'foi(ram)'
+        self.stdout.write(f'{len(pendentes)} avaliação(ões) sem período; {len(removidas)} repetida(s) {verbo} removida(s).')
+        if removidas and options['simular']:
+            self.stdout.write('Ids: ' + ', '.join(map(str, removidas)))
@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Cargo
+from core.provisionamento import ErroProvisionamento, provisionar_usuarios
+
+
+class Command(BaseCommand):
+    help = 'Cadastra em lote os usuários de uma turma a partir de um CSV (matricula,fullname,email)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--saida', required=True, help='CSV onde as senhas iniciais serão gravadas')
+        parser.add_argument('--cargo', help='Nome do cargo atribuído a todos os usuários criados')
+        parser.add_argument('--lote', type=int, default=500)
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--delimitador', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        cargo = None
+        if options['cargo']:
+            try:
+                cargo = Cargo.objects.get(nome=options['cargo'])
+            except Cargo.DoesNotExist:
+                raise CommandError(f"Cargo \"{options['cargo']}\" não existe.")
+
+        try:
+            with open(options['arquivo'], encoding=options['encoding'], newline='') as arquivo, \
+                    open(options['saida'], 'w', encoding='utf-8', newline='') as saida:
+                resultado = provisionar_usuarios(
+                    arquivo,
+                    saida=saida,
+                    cargo=cargo,
+                    tamanho_lote=options['lote'],
+                    processos=options['processos'],
+                    delimitador=options['delimitador'],
+                )
+        except (OSError, ErroProvisionamento) as erro:
+            raise CommandError(str(erro))
+
+        for rejeitado in resultado['rejeitados']:
+            self.stderr.write(rejeitado)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['criados']} usuário(s) criado(s) de {resultado['linhas']} linha(s) "
+            f"em {resultado['segundos']:.2f}s ({resultado['usuarios_por_segundo']:.0f} usuários/s, "
+            f"{options['processos']} processo(s)); {len(resultado['rejeitados'])} rejeitada(s)."
+        ))
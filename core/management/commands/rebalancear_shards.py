@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.shards import SHARDS, TAMANHO_LOTE, mover_canal, planejar_rebalanceamento
+
+
+class Command(BaseCommand):
+    help = 'Leva as mensagens de cada canal para o seu shard e equilibra o volume entre os shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=0.1,
+            help='Diferença aceitável entre o shard mais cheio e o mais vazio (fração)',
+        )
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Mensagens copiadas por transação')
+        parser.add_argument('--simular', action='store_true', help='Só mostra o plano, sem mover nada')
+
+    def _progresso(self, canal_id, origem, destino, copiadas):
+        self.stdout.write(f'  canal {canal_id}: {copiadas} mensagem(ns) de {origem} para {destino}')
+
+    def handle(self, *args, **options):
+        if not SHARDS:
+            raise CommandError('Nenhum shard configurado (defina DJANGO_MENSAGENS_SHARDS).')
+
+        movimentos, carga = planejar_rebalanceamento(options['tolerancia'])
+        for banco, total in carga.items():
+            self.stdout.write(f'{banco}: {total} mensagem(ns) após o rebalanceamento')
+
+        if not movimentos:
+            self.stdout.write(self.style.SUCCESS('Shards já equilibrados.'))
+            return
+
+        for canal_id, origens, destino in movimentos:
+            self.stdout.write(f"Canal {canal_id}: {', '.join(origens)} -> {destino}")
+        if options['simular']:
+            return
+
+        movidas = 0
+        for canal_id, origens, destino in movimentos:
+            movidas += mover_canal(canal_id, origens, destino, options['lote'], self._progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(movimentos)} canal(is) movido(s), {movidas} mensagem(ns) copiada(s).'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.agregados import recalcular_agregados_disciplinas, recalcular_agregados_professores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero os agregados de avaliações a partir das avaliações salvas'
+
+    def handle(self, *args, **options):
+        total = recalcular_agregados_disciplinas()
+        self.stdout.write(self.style.SUCCESS(f'{total} disciplina(s) recalculada(s).'))
+
+        total = recalcular_agregados_professores()
+        self.stdout.write(self.style.SUCCESS(f'{total} par(es) professor/disciplina recalculado(s).'))
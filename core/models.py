@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+import re
+import unicodedata
 
 
 class CustomUser(AbstractUser):
@@ -173,16 +175,20 @@ class MembroCanal(models.Model):
 
 
 class Mensagem(models.Model):
+    # Sem constraint no banco: com shards (core/shards.py) a mensagem fica
+    # num banco diferente do canal e do autor
     canal = models.ForeignKey(
         Canal,
         on_delete=models.CASCADE,
         related_name='mensagens',
+        db_constraint=False,
         verbose_name="Canal"
     )
     autor = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
         related_name='mensagens',
+        db_constraint=False,
         verbose_name="Autor"
     )
     conteudo = models.TextField(verbose_name="Conteúdo")
@@ -208,6 +214,10 @@ class Mensagem(models.Model):
         verbose_name = "Mensagem"
         verbose_name_plural = "Mensagens"
         ordering = ['created_at']
+        indexes = [
+            # Histórico do chat, não lidas e última mensagem do dashboard
+            models.Index(fields=['canal', 'created_at'], name='mensagem_canal_criada_idx'),
+        ]
     
     def __str__(self):
         return f"{self.autor.username} em {self.canal.nome} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
@@ -216,6 +226,9 @@ class Mensagem(models.Model):
         # Verifica se o usuário pode enviar mensagem no canal
         if not self.canal.usuario_pode_acessar(self.autor):
             raise ValidationError("Você não tem permissão para enviar mensagens neste canal.")
+        from .shards import atribuir_id
+        if atribuir_id(self):
+            kwargs['force_insert'] = True
         super().save(*args, **kwargs)
 
 
@@ -230,6 +243,7 @@ class Reacao(models.Model):
         CustomUser,
         on_delete=models.CASCADE,
         related_name='reacoes',
+        db_constraint=False,
         verbose_name="Usuário"
     )
     emoji = models.CharField(max_length=10, verbose_name="Emoji")
@@ -275,6 +289,9 @@ class Notificacao(models.Model):
         verbose_name = "Notificação"
         verbose_name_plural = "Notificações"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['usuario', 'lida'], name='notificacao_usuario_lida_idx'),
+        ]
     
     def __str__(self):
         return f"{self.titulo} - {self.usuario.username}"
@@ -334,6 +351,15 @@ class Evento(models.Model):
         verbose_name = 'Evento'
         verbose_name_plural = 'Eventos'
         ordering = ['data', 'horario_inicio']
+        indexes = [
+            # Parcial: no SQLite filter(ativo=True) vira WHERE "ativo", que não
+            # usa uma coluna ativo no índice. Já devolve na ordem padrão.
+            models.Index(
+                fields=['data', 'horario_inicio'],
+                condition=models.Q(ativo=True),
+                name='evento_ativo_data_idx'
+            ),
+        ]
 
 
 class Seguidor(models.Model):
@@ -351,17 +377,43 @@ class Seguidor(models.Model):
 
 
 class PesquisaRecente(models.Model):
+    # Quantidade de pesquisas guardadas por usuário
+    MAX_POR_USUARIO = 20
+    
     usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='pesquisas')
     usuario_pesquisado = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='foi_pesquisado_por')
-    data_pesquisa = models.DateTimeField(auto_now_add=True)
+    data_pesquisa = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.usuario.username} pesquisou {self.usuario_pesquisado.username}"
     
+    @classmethod
+    def registrar(cls, usuario, usuario_pesquisado):
+        with transaction.atomic():
+            # Upsert: pesquisa repetida só atualiza a data
+            cls.objects.bulk_create(
+                [cls(usuario=usuario, usuario_pesquisado=usuario_pesquisado, data_pesquisa=timezone.now())],
+                update_conflicts=True,
+                unique_fields=['usuario', 'usuario_pesquisado'],
+                update_fields=['data_pesquisa'],
+            )
+            
+            # Remove as mais antigas além do limite
+            manter = list(
+                cls.objects.filter(usuario=usuario)
+                .order_by('-data_pesquisa', '-id')
+                .values_list('id', flat=True)[:cls.MAX_POR_USUARIO]
+            )
+            cls.objects.filter(usuario=usuario).exclude(id__in=manter).delete()
+    
     class Meta:
         verbose_name = 'Pesquisa Recente'
         verbose_name_plural = 'Pesquisas Recentes'
         ordering = ['-data_pesquisa']
+        unique_together = ['usuario', 'usuario_pesquisado']
+        indexes = [
+            models.Index(fields=['usuario', '-data_pesquisa'], name='pesquisa_usuario_data_idx'),
+        ]
 
 
 class ChatRequest(models.Model):
@@ -421,6 +473,9 @@ class ChatRequest(models.Model):
         verbose_name = "Solicitação de Chat"
         verbose_name_plural = "Solicitações de Chat"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='chatrequest_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome} - {self.get_status_display()} ({self.solicitado_por.username})"
@@ -470,20 +525,76 @@ class CargoRequest(models.Model):
         verbose_name = "Solicitação de Cargo"
         verbose_name_plural = "Solicitações de Cargo"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='cargorequest_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome} - {self.get_status_display()} ({self.solicitado_por.username})"
 
+def normalizar_texto(texto):
+    # Minúsculas e sem acentos: "Cálculo I" -> "calculo i"
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def normalizar_codigo(codigo):
+    # Só letras e números, em maiúsculas: "mat-1001" -> "MAT1001"
+    return re.sub(r'[^0-9A-Z]', '', normalizar_texto(codigo).upper())
+
+
 class Disciplinas(models.Model):
     nome = models.CharField(max_length=200)
     codigo = models.CharField(max_length=20)
 
+    # Preenchidos no save() e usados pelo catálogo em core/catalogo.py. Nulo
+    # nas disciplinas anteriores ao campo até rodar `normalizar_catalogo`
+    # (nulos não conflitam no índice único)
+    codigo_normalizado = models.CharField(max_length=20, unique=True, null=True, editable=False)
+    nome_normalizado = models.CharField(max_length=200, db_index=True, editable=False)
+
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
 
+    def clean(self):
+        # O campo não é editável, então o formulário não valida a unicidade
+        repetida = Disciplinas.objects.filter(
+            codigo_normalizado=normalizar_codigo(self.codigo)
+        ).exclude(pk=self.pk).first()
+        if repetida:
+            raise ValidationError({'codigo': f'O código equivale ao de "{repetida}".'})
+
+    def save(self, *args, **kwargs):
+        self.codigo_normalizado = normalizar_codigo(self.codigo)
+        self.nome_normalizado = normalizar_texto(self.nome)
+        super().save(*args, **kwargs)
+
+        from .catalogo import invalidar_catalogo
+        invalidar_catalogo()
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+
+        from .catalogo import invalidar_catalogo
+        invalidar_catalogo()
+        return resultado
+
+
+def periodo_de(data):
+    # Semestre letivo: "2025.1" (jan-jun) ou "2025.2" (jul-dez)
+    return f"{data.year}.{1 if data.month <= 6 else 2}"
+
+
+def periodo_atual():
+    return periodo_de(timezone.localdate())
+
 
 class AvaliacaoDisciplina(models.Model):
     disciplina = models.ForeignKey(Disciplinas, on_delete=models.CASCADE)
+    # Sem default: nas avaliações anteriores ao campo ele fica nulo (nulos não
+    # conflitam na restrição) até `preencher_periodos` calcular pelo criado_em.
+    # Quem usa bulk_create precisa preencher; o save() preenche sozinho.
+    periodo = models.CharField(max_length=6, null=True, blank=True, verbose_name="Período")
 
     contribuicao = models.IntegerField()
     equilibrio = models.IntegerField()
@@ -496,11 +607,59 @@ class AvaliacaoDisciplina(models.Model):
     usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True)
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'disciplina', 'periodo'],
+                name='uma_avaliacao_por_periodo',
+            ),
+        ]
+
     def __str__(self):
         return f"Avaliação de {self.disciplina.codigo} por {self.usuario}"
 
+    def save(self, *args, **kwargs):
+        if not self.periodo:
+            self.periodo = periodo_de(timezone.localtime(self.criado_em)) if self.criado_em else periodo_atual()
+        super().save(*args, **kwargs)
+
+class AgregadoDisciplina(models.Model):
+    CRITERIOS = ('contribuicao', 'equilibrio', 'aplicacao', 'material', 'distribuicao')
+    
+    disciplina = models.OneToOneField(
+        Disciplinas,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='agregado'
+    )
+    total = models.PositiveIntegerField(default=0)
+    
+    soma_contribuicao = models.BigIntegerField(default=0)
+    soma_equilibrio = models.BigIntegerField(default=0)
+    soma_aplicacao = models.BigIntegerField(default=0)
+    soma_material = models.BigIntegerField(default=0)
+    soma_distribuicao = models.BigIntegerField(default=0)
+    
+    atualizado_em = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Agregado de Disciplina'
+        verbose_name_plural = 'Agregados de Disciplinas'
+    
+    def __str__(self):
+        return f"{self.disciplina_id} ({self.total} avaliações)"
+    
+    def medias(self):
+        if not self.total:
+            return {criterio: 0 for criterio in self.CRITERIOS}
+        return {
+            criterio: round(getattr(self, f'soma_{criterio}') / self.total, 2)
+            for criterio in self.CRITERIOS
+        }
+
+
 class Professores(models.Model):
-    nome = models.CharField(max_length=100)
+    nome = models.CharField(max_length=100, unique=True)
     disciplinas = models.ManyToManyField(Disciplinas, related_name='professores')
 
     def __str__(self):
@@ -516,4 +675,286 @@ class Avaliacao(models.Model):
     relacionamento = models.IntegerField(null=True, blank=True)
     compatibilidade = models.IntegerField(null=True, blank=True)
     clareza = models.IntegerField(null=True, blank=True)
-    comentario = models.TextField(null=True, blank=True)
\ No newline at end of file
+    comentario = models.TextField(null=True, blank=True)
+    # Nulo nas avaliações anteriores à existência do campo
+    criado_em = models.DateTimeField(auto_now_add=True, null=True)
+
+    def save(self, *args, **kwargs):
+        from .agregados import recalcular_agregado_professor, registrar_avaliacao_professor
+
+        nova = self._state.adding
+        anterior = None
+        if not nova:
+            anterior = Avaliacao.objects.filter(pk=self.pk).values('professor_id', 'disciplina_id').first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if nova:
+                registrar_avaliacao_professor(self)
+            else:
+                # Edição: recalcula o par atual (e o antigo, se mudou)
+                recalcular_agregado_professor(self.professor_id, self.disciplina_id)
+                if anterior and (anterior['professor_id'], anterior['disciplina_id']) != (self.professor_id, self.disciplina_id):
+                    recalcular_agregado_professor(anterior['professor_id'], anterior['disciplina_id'])
+
+    def delete(self, *args, **kwargs):
+        from .agregados import recalcular_agregado_professor
+
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            recalcular_agregado_professor(self.professor_id, self.disciplina_id)
+        return resultado
+
+
+class AgregadoProfessor(models.Model):
+    CRITERIOS = ('dominio', 'metodos', 'relacionamento', 'compatibilidade', 'clareza')
+
+    professor = models.ForeignKey(Professores, on_delete=models.CASCADE, related_name='agregados')
+    disciplina = models.ForeignKey(Disciplinas, on_delete=models.CASCADE, related_name='agregados_professores')
+
+    # Os critérios aceitam nulo, então cada um tem sua própria contagem
+    total_dominio = models.PositiveIntegerField(default=0)
+    soma_dominio = models.BigIntegerField(default=0)
+    total_metodos = models.PositiveIntegerField(default=0)
+    soma_metodos = models.BigIntegerField(default=0)
+    total_relacionamento = models.PositiveIntegerField(default=0)
+    soma_relacionamento = models.BigIntegerField(default=0)
+    total_compatibilidade = models.PositiveIntegerField(default=0)
+    soma_compatibilidade = models.BigIntegerField(default=0)
+    total_clareza = models.PositiveIntegerField(default=0)
+    soma_clareza = models.BigIntegerField(default=0)
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Agregado de Professor'
+        verbose_name_plural = 'Agregados de Professores'
+        unique_together = ('professor', 'disciplina')
+
+    def __str__(self):
+        return f"{self.professor_id} em {self.disciplina_id}"
+
+    def medias(self):
+        medias = {}
+        for criterio in self.CRITERIOS:
+            total = getattr(self, f'total_{criterio}')
+            medias[criterio] = round(getattr(self, f'soma_{criterio}') / total, 2) if total else 0
+        return medias
+
+class EntradaTimeline(models.Model):
+    usuario = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_constraint=False,
+        verbose_name="Usuário"
+    )
+    mensagem = models.ForeignKey(
+        Mensagem,
+        on_delete=models.CASCADE,
+        related_name='entradas_timeline',
+        verbose_name="Mensagem"
+    )
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Entrada da Timeline"
+        verbose_name_plural = "Entradas da Timeline"
+        unique_together = ('usuario', 'mensagem')
+        ordering = ['-mensagem']
+        indexes = [
+            models.Index(fields=['usuario', '-mensagem'], name='timeline_usuario_msg_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario.username} <- mensagem {self.mensagem_id}"
+
+
+class PosicaoRanking(models.Model):
+    TIPO_CHOICES = [
+        ('disciplina', 'Disciplina'),
+        ('professor', 'Professor'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    disciplina = models.ForeignKey(Disciplinas, on_delete=models.CASCADE, null=True, blank=True)
+    professor = models.ForeignKey(Professores, on_delete=models.CASCADE, null=True, blank=True)
+
+    posicao = models.PositiveIntegerField()
+    total = models.PositiveIntegerField(verbose_name="Avaliações")
+    media = models.FloatField(verbose_name="Média simples")
+    media_bayesiana = models.FloatField(verbose_name="Média bayesiana")
+    ic_inferior = models.FloatField(verbose_name="IC 95% inferior")
+    ic_superior = models.FloatField(verbose_name="IC 95% superior")
+    percentil = models.FloatField()
+    calculado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Posição no Ranking'
+        verbose_name_plural = 'Ranking'
+        ordering = ['tipo', 'posicao']
+        indexes = [
+            models.Index(fields=['tipo', 'posicao'], name='ranking_tipo_posicao_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.posicao}º {self.disciplina or self.professor} ({self.media_bayesiana:.2f})"
+
+
+class Expurgo(models.Model):
+    """Exclusão agendada de um usuário ou canal, executada em lotes por core/expurgo.py."""
+
+    TIPO_CHOICES = [
+        ('usuario', 'Usuário'),
+        ('canal', 'Canal'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, verbose_name="Tipo")
+    objeto_id = models.PositiveIntegerField(verbose_name="ID do objeto")
+    descricao = models.CharField(max_length=200, verbose_name="Descrição")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pendente',
+        verbose_name="Status"
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name="Registros a remover")
+    removidos = models.PositiveIntegerField(default=0, verbose_name="Registros removidos")
+    erro = models.TextField(blank=True, verbose_name="Erro")
+    solicitado_por = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='expurgos_solicitados',
+        verbose_name="Solicitado por"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído em")
+
+    class Meta:
+        verbose_name = "Exclusão agendada"
+        verbose_name_plural = "Exclusões agendadas"
+        ordering = ['-created_at']
+        unique_together = ('tipo', 'objeto_id')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.descricao} - {self.get_status_display()}"
+
+    @property
+    def progresso(self):
+        if self.status == 'concluido':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, round(100 * self.removidos / self.total))
+
+
+class EmailPendente(models.Model):
+    """Caixa de saída de e-mails, enviada em lotes por core/emails.py."""
+
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    assunto = models.CharField(max_length=300, verbose_name="Assunto")
+    corpo = models.TextField(verbose_name="Corpo")
+    remetente = models.CharField(max_length=254, verbose_name="Remetente")
+    destinatarios = models.JSONField(default=list, verbose_name="Destinatários")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pendente',
+        verbose_name="Status"
+    )
+    tentativas = models.PositiveIntegerField(default=0, verbose_name="Tentativas")
+    proxima_tentativa = models.DateTimeField(default=timezone.now, verbose_name="Próxima tentativa")
+    ultimo_erro = models.TextField(blank=True, verbose_name="Último erro")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    enviado_em = models.DateTimeField(null=True, blank=True, verbose_name="Enviado em")
+
+    class Meta:
+        verbose_name = "E-mail pendente"
+        verbose_name_plural = "Caixa de saída"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='email_status_proxima_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} -> {', '.join(self.destinatarios)} ({self.get_status_display()})"
+
+
+class ShardCanal(models.Model):
+    """Shard de mensagens escolhido para o canal pelo rebalanceamento (core/shards.py)."""
+
+    canal = models.OneToOneField(
+        Canal,
+        on_delete=models.CASCADE,
+        related_name='shard',
+        verbose_name="Canal"
+    )
+    banco = models.CharField(max_length=50, verbose_name="Banco")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Shard do canal"
+        verbose_name_plural = "Shards dos canais"
+
+    def __str__(self):
+        return f"{self.canal_id} -> {self.banco}"
+
+
+class ProcessoGeradorId(models.Model):
+    """Número reservado por um processo para gerar ids de mensagens (core/shards.py)."""
+
+    pid = models.PositiveIntegerField(verbose_name="PID")
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Processo gerador de ids"
+        verbose_name_plural = "Processos geradores de ids"
+
+    def __str__(self):
+        return f"{self.id} (pid {self.pid})"
+
+
+class VersaoCompartilhada(models.Model):
+    """Versão de um cache local dos processos (core/versoes.py)."""
+
+    chave = models.CharField(max_length=50, primary_key=True, verbose_name="Chave")
+    versao = models.CharField(max_length=32, verbose_name="Versão")
+
+    class Meta:
+        verbose_name = "Versão compartilhada"
+        verbose_name_plural = "Versões compartilhadas"
+
+    def __str__(self):
+        return f"{self.chave}: {self.versao}"
+
+
+class BaldeFichas(models.Model):
+    """Balde de fichas das tentativas de login (core/autenticacao.py)."""
+
+    chave = models.CharField(max_length=200, primary_key=True, verbose_name="Chave")
+    fichas = models.FloatField(verbose_name="Fichas")
+    # Instantes em segundos (time.time())
+    visto_em = models.FloatField(verbose_name="Visto em")
+    cheio_em = models.FloatField(db_index=True, verbose_name="Cheio em")
+
+    class Meta:
+        verbose_name = "Balde de fichas"
+        verbose_name_plural = "Baldes de fichas"
+
+    def __str__(self):
+        return f"{self.chave}: {self.fichas:.1f}"
@@ -0,0 +1,124 @@
+"""
+Aprovação e recusa em lote de solicitações de chat e de cargo.
+
+Cada operação roda em uma transação: os canais, cargos, membros e vínculos
+M2M são criados com bulk_create e o status das solicitações é atualizado
+com um único UPDATE.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Canal, Cargo, CargoRequest, ChatRequest, MembroCanal
+from .painel import invalidar_estatisticas_painel
+
+
+def aprovar_chat_requests(ids, aprovador):
+    with transaction.atomic():
+        solicitacoes = list(ChatRequest.objects.select_for_update().filter(id__in=ids, status='pendente').order_by('id'))
+        if not solicitacoes:
+            return 0
+
+        ids = [solicitacao.id for solicitacao in solicitacoes]
+        cargos_por_solicitacao = {}
+        vinculos = ChatRequest.cargos_permitidos.through.objects.filter(
+            chatrequest_id__in=ids
+        ).values_list('chatrequest_id', 'cargo_id')
+        for solicitacao_id, cargo_id in vinculos:
+            cargos_por_solicitacao.setdefault(solicitacao_id, []).append(cargo_id)
+
+        canais = Canal.objects.bulk_create([
+            Canal(
+                nome=solicitacao.nome,
+                descricao=solicitacao.descricao,
+                tipo=solicitacao.tipo,
+                avatar=solicitacao.avatar,
+                cor_avatar=solicitacao.cor_avatar,
+                criado_por_id=solicitacao.solicitado_por_id,
+                ativo=True,
+            )
+            for solicitacao in solicitacoes
+        ])
+
+        CanalCargo = Canal.cargos_permitidos.through
+        CanalCargo.objects.bulk_create([
+            CanalCargo(canal_id=canal.id, cargo_id=cargo_id)
+            for solicitacao, canal in zip(solicitacoes, canais)
+            for cargo_id in cargos_por_solicitacao.get(solicitacao.id, [])
+        ])
+
+        # O solicitante vira admin do canal criado
+        MembroCanal.objects.bulk_create([
+            MembroCanal(usuario_id=solicitacao.solicitado_por_id, canal_id=canal.id, papel='admin')
+            for solicitacao, canal in zip(solicitacoes, canais)
+        ])
+
+        ChatRequest.objects.filter(id__in=ids).update(
+            status='aprovado',
+            aprovado_por=aprovador,
+            updated_at=timezone.now(),
+        )
+
+    invalidar_estatisticas_painel()
+    return len(solicitacoes)
+
+
+def recusar_chat_requests(ids, aprovador, motivo=''):
+    return ChatRequest.objects.filter(id__in=ids, status='pendente').update(
+        status='recusado',
+        aprovado_por=aprovador,
+        motivo_recusa=motivo,
+        updated_at=timezone.now(),
+    )
+
+
+def aprovar_cargo_requests(ids, aprovador):
+    """
+    Devolve (aprovadas, ignoradas). Solicitações cujo nome já existe como
+    cargo (ou repetido no próprio lote) continuam pendentes.
+    """
+    with transaction.atomic():
+        solicitacoes = list(CargoRequest.objects.select_for_update().filter(id__in=ids, status='pendente').order_by('id'))
+        if not solicitacoes:
+            return 0, 0
+
+        existentes = set(
+            Cargo.objects.filter(
+                nome__in=[solicitacao.nome for solicitacao in solicitacoes]
+            ).values_list('nome', flat=True)
+        )
+
+        aprovadas = []
+        for solicitacao in solicitacoes:
+            if solicitacao.nome in existentes:
+                continue
+            existentes.add(solicitacao.nome)
+            aprovadas.append(solicitacao)
+
+        Cargo.objects.bulk_create([
+            Cargo(
+                nome=solicitacao.nome,
+                descricao=solicitacao.descricao,
+                cor=solicitacao.cor,
+                criado_por_id=solicitacao.solicitado_por_id,
+            )
+            for solicitacao in aprovadas
+        ])
+
+        CargoRequest.objects.filter(id__in=[solicitacao.id for solicitacao in aprovadas]).update(
+            status='aprovado',
+            aprovado_por=aprovador,
+            updated_at=timezone.now(),
+        )
+
+    invalidar_estatisticas_painel()
+    return len(aprovadas), len(solicitacoes) - len(aprovadas)
+
+
+def recusar_cargo_requests(ids, aprovador, motivo=''):
+    return CargoRequest.objects.filter(id__in=ids, status='pendente').update(
+        status='recusado',
+        aprovado_por=aprovador,
+        motivo_recusa=motivo,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,123 @@
+"""
+Dados do painel de administração.
+
+As estatísticas ficam no cache por alguns segundos e as listas de usuários,
+canais e cargos são paginadas por cursor (keyset), então o painel não faz
+COUNT(*) a cada acesso nem OFFSET em tabelas grandes.
+"""
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+
+from .models import Canal, Cargo, CustomUser, Expurgo
+
+
+CACHE_ESTATISTICAS = 'painel:estatisticas'
+
+TEMPO_CACHE = 30
+
+TAMANHO_PAGINA = 50
+
+
+def estatisticas_painel():
+    estatisticas = cache.get(CACHE_ESTATISTICAS)
+    if estatisticas is None:
+        estatisticas = {
+            'total_usuarios': CustomUser.objects.count(),
+            'total_canais': Canal.objects.count(),
+            'total_cargos': Cargo.objects.count(),
+        }
+        cache.set(CACHE_ESTATISTICAS, estatisticas, TEMPO_CACHE)
+    return estatisticas
+
+
+def invalidar_estatisticas_painel():
+    cache.delete(CACHE_ESTATISTICAS)
+
+
+def _aguardando_expurgo(tipo):
+    # Objetos com exclusão agendada somem do painel antes do expurgo terminar
+    return Expurgo.objects.filter(tipo=tipo).exclude(status='concluido').values('objeto_id')
+
+
+def _paginar(queryset, campo, apos, limite):
+    # Keyset: `campo` é único; "-campo" pagina em ordem decrescente
+    decrescente = campo.startswith('-')
+    nome = campo.lstrip('-')
+
+    try:
+        apos = queryset.model._meta.get_field(nome).to_python(apos or None)
+    except ValidationError:
+        apos = None
+
+    if apos is not None:
+        lookup = 'lt' if decrescente else 'gt'
+        queryset = queryset.filter(**{f'{nome}__{lookup}': apos})
+
+    itens = list(queryset.order_by(campo)[:limite + 1])
+    proximo = getattr(itens[limite - 1], nome) if len(itens) > limite else None
+    return itens[:limite], proximo
+
+
+def listar_usuarios(q='', apos=None, limite=TAMANHO_PAGINA):
+    usuarios = CustomUser.objects.exclude(id__in=_aguardando_expurgo('usuario'))
+    if q:
+        usuarios = usuarios.filter(
+            Q(username__icontains=q) |
+            Q(fullname__icontains=q) |
+            Q(email__icontains=q) |
+            Q(matricula__icontains=q)
+        )
+    return _paginar(usuarios, '-id', apos, limite)
+
+
+def listar_canais(q='', apos=None, limite=TAMANHO_PAGINA):
+    canais = Canal.objects.exclude(id__in=_aguardando_expurgo('canal')).select_related('criado_por').annotate(
+        total_membros=Count('canal_membros')
+    )
+    if q:
+        canais = canais.filter(nome__icontains=q)
+    return _paginar(canais, '-id', apos, limite)
+
+
+def listar_cargos(q='', apos=None, limite=TAMANHO_PAGINA):
+    cargos = Cargo.objects.select_related('criado_por')
+    if q:
+        cargos = cargos.filter(nome__icontains=q)
+    return _paginar(cargos, 'nome', apos, limite)
+
+
+def usuario_json(usuario):
+    return {
+        'id': usuario.id,
+        'username': usuario.username,
+        'fullname': usuario.fullname,
+        'email': usuario.email,
+        'matricula': usuario.matricula,
+        'is_staff': usuario.is_staff,
+        'created_at': usuario.created_at.isoformat(),
+    }
+
+
+def canal_json(canal):
+    return {
+        'id': canal.id,
+        'nome': canal.nome,
+        'tipo': canal.tipo,
+        'ativo': canal.ativo,
+        'criado_por': canal.criado_por.username if canal.criado_por else None,
+        'total_membros': canal.total_membros,
+        'created_at': canal.created_at.isoformat(),
+    }
+
+
+def cargo_json(cargo):
+    return {
+        'id': cargo.id,
+        'nome': cargo.nome,
+        'descricao': cargo.descricao,
+        'cor': cargo.cor,
+        'criado_por': cargo.criado_por.username if cargo.criado_por else None,
+        'created_at': cargo.created_at.isoformat(),
+    }
@@ -0,0 +1,256 @@
+"""
+Perfilamento de cada requisição: SQL, templates e Python.
+
+PerfilamentoMiddleware (primeiro em MIDDLEWARE) mede o tempo total, conta e
+cronometra as consultas em todos os bancos com connection.execute_wrapper e
+soma o tempo de renderização dos templates carregados pelo backend
+TemplatesMedidos (TEMPLATES em app/settings.py). O SQL disparado de dentro
+de um template conta só como SQL; o resto do tempo é Python.
+
+Os números saem no cabeçalho Server-Timing (aparece na aba de rede do
+navegador) e numa linha JSON no logger "core.perfilamento": INFO para
+todas as requisições, WARNING para as acima de PERFILAMENTO_LIMITE_MS.
+
+Uma fração PERFILAMENTO_AMOSTRAGEM das requisições roda sob cProfile; das
+sorteadas, as que passarem do limite são gravadas em PERFILAMENTO_DIR como
+.prof (abra com pstats ou snakeviz) e um .txt com as funções mais caras.
+
+Numa StreamingHttpResponse o corpo é gerado depois que a view retorna. A
+medição continua enquanto o servidor consome o iterador (ConteudoMedido) e
+a linha JSON sai no fim, com "streaming": true (iteradores assíncronos não
+são medidos; a linha sai quando a view retorna). O Server-Timing não vai
+nessas respostas, porque os cabeçalhos saem antes do corpo. O cProfile
+cobre só a view.
+
+Sob ASGI o middleware roda como corrotina, sem adaptador no meio da cadeia.
+A medição das consultas e o cProfile são ligados na thread em que rodam as
+views síncronas e o ORM; o que roda no event loop (views assíncronas
+nativas) conta no tempo total, mas não aparece no .prof.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger(__name__)
+
+_metricas = ContextVar('perfilamento', default=None)
+
+
+class Metricas:
+    __slots__ = ('consultas', 'sql', 'template')
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        metricas = _metricas.get()
+        if metricas is None:
+            return super().render(context, request)
+        inicio = perf_counter()
+        sql_antes = metricas.sql
+        try:
+            return super().render(context, request)
+        finally:
+            # Consultas feitas por querysets preguiçosos no template ficam no SQL
+            metricas.template += perf_counter() - inicio - (metricas.sql - sql_antes)
+
+
+class TemplatesMedidos(DjangoTemplates):
+    def from_string(self, template_code):
+        return TemplateMedido(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TemplateMedido(super().get_template(template_name).template, self)
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    metricas = _metricas.get()
+    if metricas is None:
+        return execute(sql, params, many, context)
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metricas.sql += perf_counter() - inicio
+        metricas.consultas += 1
+
+
+@contextmanager
+def _medindo_consultas():
+    with ExitStack() as pilha:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(_medir_consulta))
+        yield
+
+
+_FIM = object()
+
+
+class ConteudoMedido:
+    """
+    Corpo de uma StreamingHttpResponse medido enquanto é consumido. Chama
+    `concluir` no fim da iteração ou no close(), se o cliente desistir antes.
+    """
+
+    def __init__(self, conteudo, metricas, concluir):
+        self.conteudo = conteudo
+        self.metricas = metricas
+        self.concluir = concluir
+        self.concluido = False
+
+    def __iter__(self):
+        iterador = iter(self.conteudo)
+        while True:
+            # Sob ASGI cada pedaço pode vir de outra thread ou contexto
+            token = _metricas.set(self.metricas)
+            try:
+                with _medindo_consultas():
+                    pedaco = next(iterador, _FIM)
+            finally:
+                _metricas.reset(token)
+            if pedaco is _FIM:
+                break
+            yield pedaco
+        self.close()
+
+    def close(self):
+        if not self.concluido:
+            self.concluido = True
+            self.concluir()
+
+
+class PerfilamentoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILAMENTO_ATIVO', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.limite = getattr(settings, 'PERFILAMENTO_LIMITE_MS', 500) / 1000
+        self.amostragem = getattr(settings, 'PERFILAMENTO_AMOSTRAGEM', 0.01)
+        self.diretorio = Path(getattr(settings, 'PERFILAMENTO_DIR', settings.BASE_DIR / 'perfis'))
+        self.server_timing = getattr(settings, 'PERFILAMENTO_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metricas = Metricas()
+        token = _metricas.set(metricas)
+        perfil, medicao = self._ligar()
+        inicio = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total = perf_counter() - inicio
+            medicao.close()
+            _metricas.reset(token)
+        return self._concluir(request, response, metricas, perfil, inicio, total)
+
+    async def __acall__(self, request):
+        metricas = Metricas()
+        token = _metricas.set(metricas)
+        # As views síncronas e o ORM rodam numa thread à parte, a mesma durante
+        # toda a requisição: as conexões medidas e o cProfile são os de lá
+        perfil, medicao = await sync_to_async(self._ligar)()
+        inicio = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            total = perf_counter() - inicio
+            await sync_to_async(medicao.close)()
+            _metricas.reset(token)
+        return self._concluir(request, response, metricas, perfil, inicio, total)
+
+    def _ligar(self):
+        """Liga a medição das consultas e, se sorteado, o cProfile na thread atual."""
+        medicao = ExitStack()
+        medicao.enter_context(_medindo_consultas())
+        perfil = None
+        if self.amostragem and random.random() < self.amostragem:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Já há outro profiler ativo nesta thread
+                perfil = None
+            else:
+                medicao.callback(perfil.disable)
+        return perfil, medicao
+
+    def _concluir(self, request, response, metricas, perfil, inicio, total):
+        arquivo = self._gravar_perfil(perfil, request, total) if perfil and total >= self.limite else None
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = ConteudoMedido(
+                response.streaming_content, metricas,
+                lambda: self._registrar(request, response, metricas, perf_counter() - inicio, arquivo),
+            )
+            return response
+
+        python = max(total - metricas.sql - metricas.template, 0)
+        if self.server_timing and not response.streaming:
+            response['Server-Timing'] = ', '.join([
+                f'sql;dur={metricas.sql * 1000:.1f};desc="{metricas.consultas} consultas"',
+                f'template;dur={metricas.template * 1000:.1f}',
+                f'python;dur={python * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        self._registrar(request, response, metricas, total, arquivo)
+        return response
+
+    def _registrar(self, request, response, metricas, total, arquivo):
+        nivel = logging.WARNING if total >= self.limite else logging.INFO
+        if logger.isEnabledFor(nivel):
+            python = max(total - metricas.sql - metricas.template, 0)
+            rota = request.resolver_match.view_name if request.resolver_match else None
+            logger.log(nivel, json.dumps({
+                'metodo': request.method,
+                'caminho': request.path,
+                'rota': rota,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'sql_ms': round(metricas.sql * 1000, 1),
+                'consultas': metricas.consultas,
+                'template_ms': round(metricas.template * 1000, 1),
+                'python_ms': round(python * 1000, 1),
+                'perfil': str(arquivo) if arquivo else None,
+                'streaming': response.streaming,
+            }, ensure_ascii=False))
+
+    def _gravar_perfil(self, perfil, request, total):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        rota = request.resolver_match.url_name if request.resolver_match else 'sem-rota'
+        nome = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{request.method}_{rota}_{total * 1000:.0f}ms"
+        arquivo = self.diretorio / f'{nome}.prof'
+        perfil.dump_stats(arquivo)
+
+        # Resumo legível sem precisar abrir o .prof
+        resumo = io.StringIO()
+        resumo.write(f'{request.method} {request.get_full_path()} em {total * 1000:.0f} ms\n\n')
+        pstats.Stats(perfil, stream=resumo).sort_stats('cumulative').print_stats(40)
+        (self.diretorio / f'{nome}.txt').write_text(resumo.getvalue(), encoding='utf-8')
+        return arquivo
@@ -0,0 +1,173 @@
+"""
+Cadastro em lote de usuários de uma nova turma.
+
+O CSV é lido em streaming e processado em lotes. Em cada lote a unicidade
+de matrícula, e-mail e username é conferida com uma consulta por campo
+(`__in`), as senhas iniciais são geradas e passam pelo hash em um pool de
+processos (o hash é o gargalo e escala com os núcleos) e os usuários e seus
+cargos iniciais são gravados com bulk_create.
+
+Formato esperado (com cabeçalho):
+
+    matricula,fullname,email
+    2026100001,Ana Souza,ana.souza@exemplo.com
+
+O username é a matrícula. As senhas geradas são escritas, lote a lote, em
+um CSV de saída (matricula,username,email,senha) para serem repassadas aos
+alunos.
+"""
+
+import csv
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import CustomUser, UsuarioCargo
+
+
+COLUNAS = ('matricula', 'fullname', 'email')
+
+TAMANHO_SENHA = 12
+
+
+class ErroProvisionamento(Exception):
+    pass
+
+
+def iniciar_processo():
+    # Com "spawn" o processo filho não herda o Django já configurado
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    django.setup()
+
+
+def _hash_senha(senha):
+    return make_password(senha)
+
+
+def _validar(linha, numero):
+    matricula = (linha.get('matricula') or '').strip()
+    fullname = (linha.get('fullname') or '').strip()
+    email = CustomUser.objects.normalize_email((linha.get('email') or '').strip()).lower()
+
+    if not matricula or not fullname or not email:
+        return None, f'linha {numero}: matrícula, nome e e-mail são obrigatórios'
+    if len(matricula) > CustomUser._meta.get_field('matricula').max_length:
+        return None, f'linha {numero}: matrícula longa demais'
+    if len(fullname) > CustomUser._meta.get_field('fullname').max_length:
+        return None, f'linha {numero}: nome longo demais'
+    if '@' not in email:
+        return None, f'linha {numero}: e-mail inválido'
+
+    return {'matricula': matricula, 'fullname': fullname, 'email': email, 'username': matricula.lower()}, None
+
+
+def _provisionar_lote(linhas, vistos, cargo, executor, processos, senha_padrao):
+    candidatos = []
+    rejeitados = []
+
+    for numero, linha in linhas:
+        dados, erro = _validar(linha, numero)
+        if erro:
+            rejeitados.append(erro)
+            continue
+        repetido = next((campo for campo in ('matricula', 'email', 'username') if dados[campo] in vistos[campo]), None)
+        if repetido:
+            rejeitados.append(f'linha {numero}: {repetido} repetido no arquivo')
+            continue
+        for campo in vistos:
+            vistos[campo].add(dados[campo])
+        candidatos.append((numero, dados))
+
+    # Uma consulta por campo único para o lote inteiro
+    existentes = {
+        campo: set(
+            CustomUser.objects.filter(
+                **{f'{campo}__in': [dados[campo] for _, dados in candidatos]}
+            ).values_list(campo, flat=True)
+        )
+        for campo in ('matricula', 'email', 'username')
+    }
+
+    novos = []
+    for numero, dados in candidatos:
+        repetido = next((campo for campo in existentes if dados[campo] in existentes[campo]), None)
+        if repetido:
+            rejeitados.append(f'linha {numero}: {repetido} já cadastrado')
+            continue
+        novos.append(dados)
+
+    senhas = [senha_padrao or secrets.token_urlsafe(TAMANHO_SENHA) for _ in novos]
+    if executor:
+        hashes = list(executor.map(_hash_senha, senhas, chunksize=max(1, len(senhas) // (processos * 4))))
+    else:
+        hashes = [_hash_senha(senha) for senha in senhas]
+
+    with transaction.atomic():
+        usuarios = CustomUser.objects.bulk_create([
+            CustomUser(password=hash_senha, **dados)
+            for dados, hash_senha in zip(novos, hashes)
+        ])
+        if cargo:
+            UsuarioCargo.objects.bulk_create([
+                UsuarioCargo(usuario_id=usuario.id, cargo=cargo)
+                for usuario in usuarios
+            ])
+
+    criados = [
+        (dados['matricula'], dados['username'], dados['email'], senha)
+        for dados, senha in zip(novos, senhas)
+    ]
+    return criados, rejeitados
+
+
+def provisionar_usuarios(arquivo, saida=None, cargo=None, tamanho_lote=500, processos=None,
+                         delimitador=',', senha_padrao=None):
+    """
+    Cadastra os usuários de um CSV já aberto. `cargo` (opcional) é atribuído
+    a todos e as credenciais vão para o arquivo `saida`, se informado.
+    Devolve um dicionário com os totais, as linhas rejeitadas e a taxa em
+    usuários por segundo.
+    """
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    faltando = set(COLUNAS) - set(leitor.fieldnames or [])
+    if faltando:
+        raise ErroProvisionamento(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+
+    processos = processos if processos is not None else os.cpu_count() or 1
+    linhas = enumerate(leitor, start=2)  # linha 1 é o cabeçalho
+    vistos = {'matricula': set(), 'email': set(), 'username': set()}
+    resultado = {'linhas': 0, 'criados': 0, 'rejeitados': []}
+    inicio = perf_counter()
+
+    escritor = None
+    if saida is not None:
+        escritor = csv.writer(saida)
+        escritor.writerow(('matricula', 'username', 'email', 'senha'))
+
+    executor = ProcessPoolExecutor(max_workers=processos, initializer=iniciar_processo) if processos > 1 else None
+    try:
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+            criados, rejeitados = _provisionar_lote(lote, vistos, cargo, executor, processos, senha_padrao)
+            if escritor:
+                escritor.writerows(criados)
+            resultado['linhas'] += len(lote)
+            resultado['criados'] += len(criados)
+            resultado['rejeitados'].extend(rejeitados)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    resultado['segundos'] = perf_counter() - inicio
+    resultado['usuarios_por_segundo'] = (
+        resultado['criados'] / resultado['segundos'] if resultado['segundos'] else 0
+    )
+    return resultado
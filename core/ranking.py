@@ -0,0 +1,121 @@
+"""
+Ranking de disciplinas e professores com médias bayesianas.
+
+Todas as avaliações são carregadas em arrays NumPy e as estatísticas de
+todos os itens são calculadas de uma vez, sem agregação linha a linha no ORM.
+A média de cada item é "puxada" para a média global proporcionalmente a
+quão poucas avaliações ele tem, para que itens com 1 ou 2 notas não
+dominem o topo.
+"""
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AgregadoDisciplina, AgregadoProfessor, Avaliacao, AvaliacaoDisciplina, PosicaoRanking
+
+
+Z_95 = 1.959964
+
+
+def calcular_estatisticas(ids, notas, peso_prior=None):
+    """
+    `ids` é o item de cada avaliação e `notas` a nota (já combinada) de cada
+    avaliação. Devolve um dicionário de arrays alinhados por item.
+    """
+    itens, grupo = np.unique(ids, return_inverse=True)
+    total = np.bincount(grupo)
+    soma = np.bincount(grupo, weights=notas)
+    soma_quadrados = np.bincount(grupo, weights=notas * notas)
+
+    media_global = notas.mean()
+    variancia_global = notas.var()
+    if peso_prior is None:
+        # Peso do prior: número típico de avaliações por item
+        peso_prior = float(np.median(total))
+
+    media = soma / total
+    media_bayesiana = (peso_prior * media_global + soma) / (peso_prior + total)
+
+    # Variância dentro do item, com o prior global para itens com poucas notas
+    variancia_item = np.maximum(soma_quadrados / total - media * media, 0)
+    variancia = (peso_prior * variancia_global + total * variancia_item) / (peso_prior + total)
+    erro = np.sqrt(variancia / (peso_prior + total))
+
+    ordem = np.argsort(-media_bayesiana, kind='stable')
+    posicao = np.empty_like(ordem)
+    posicao[ordem] = np.arange(1, len(ordem) + 1)
+    if len(itens) > 1:
+        percentil = 100.0 * (len(itens) - posicao) / (len(itens) - 1)
+    else:
+        percentil = np.full(len(itens), 100.0)
+
+    return {
+        'itens': itens,
+        'total': total,
+        'media': media,
+        'media_bayesiana': media_bayesiana,
+        'ic_inferior': media_bayesiana - Z_95 * erro,
+        'ic_superior': media_bayesiana + Z_95 * erro,
+        'percentil': percentil,
+        'posicao': posicao,
+    }
+
+
+def _carregar(queryset, campos):
+    linhas = np.array(list(queryset.values_list(*campos).iterator(chunk_size=10000)), dtype=float)
+    if not len(linhas):
+        return None, None
+
+    # Nota da avaliação = média dos critérios preenchidos (nulos viram NaN)
+    criterios = linhas[:, 1:]
+    preenchidas = ~np.all(np.isnan(criterios), axis=1)
+    notas = np.nanmean(criterios[preenchidas], axis=1)
+    return linhas[preenchidas, 0].astype(np.int64), notas
+
+
+def _salvar(tipo, campo, estatisticas):
+    agora = timezone.now()
+    posicoes = [
+        PosicaoRanking(
+            tipo=tipo,
+            posicao=int(estatisticas['posicao'][i]),
+            total=int(estatisticas['total'][i]),
+            media=float(estatisticas['media'][i]),
+            media_bayesiana=float(estatisticas['media_bayesiana'][i]),
+            ic_inferior=float(estatisticas['ic_inferior'][i]),
+            ic_superior=float(estatisticas['ic_superior'][i]),
+            percentil=float(estatisticas['percentil'][i]),
+            calculado_em=agora,
+            **{f'{campo}_id': int(item)},
+        )
+        for i, item in enumerate(estatisticas['itens'])
+    ]
+
+    with transaction.atomic():
+        PosicaoRanking.objects.filter(tipo=tipo).delete()
+        PosicaoRanking.objects.bulk_create(posicoes, batch_size=1000)
+
+    return len(posicoes)
+
+
+def calcular_ranking_disciplinas():
+    ids, notas = _carregar(
+        AvaliacaoDisciplina.objects.all(),
+        ('disciplina_id',) + AgregadoDisciplina.CRITERIOS
+    )
+    if ids is None:
+        PosicaoRanking.objects.filter(tipo='disciplina').delete()
+        return 0
+    return _salvar('disciplina', 'disciplina', calcular_estatisticas(ids, notas))
+
+
+def calcular_ranking_professores():
+    ids, notas = _carregar(
+        Avaliacao.objects.all(),
+        ('professor_id',) + AgregadoProfessor.CRITERIOS
+    )
+    if ids is None:
+        PosicaoRanking.objects.filter(tipo='professor').delete()
+        return 0
+    return _salvar('professor', 'professor', calcular_estatisticas(ids, notas))
@@ -0,0 +1,344 @@
+"""
+Mensagens distribuídas em vários bancos SQLite (shards) por canal.
+
+Com MENSAGENS_SHARDS preenchido (ver app/settings.py), Mensagem, Reacao e
+EntradaTimeline de um canal ficam no shard do canal: o registrado em
+ShardCanal pelo rebalanceamento ou, se não houver, MENSAGENS_SHARDS[canal_id
+% N]. O resto do esquema continua no banco default.
+
+O roteador resolve sozinho os acessos que partem de um canal ou de uma
+mensagem (canal.mensagens, mensagem.reacoes, mensagem.autor); por isso crie
+mensagens e reações por esses caminhos ou com instancia.save(), nunca com
+Mensagem.objects.create(), que não sabe o canal e grava no default.
+
+Consultas que cruzam canais (dashboard, timeline) usam as funções deste
+módulo, que consultam cada shard e juntam o resultado. Como vários bancos
+recebem mensagens, os ids são gerados aqui (tempo + processo + sequência),
+únicos entre os shards e crescentes no tempo. O número do processo é
+reservado no banco default (ProcessoGeradorId), um por processo vivo.
+
+A alocação dos canais (ShardCanal) fica num cache do processo, invalidado
+pela versão compartilhada 'shards' (core/versoes.py) quando um canal muda
+de shard.
+
+Ao ativar ou mudar a quantidade de shards, rode `migrate --database <shard>`
+para cada shard e depois `rebalancear_shards`, que leva o histórico para o
+lugar certo e equilibra o volume entre os bancos.
+"""
+
+import operator
+import os
+import threading
+import time
+from functools import reduce
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from . import versoes
+from .models import Canal, EntradaTimeline, Mensagem, ProcessoGeradorId, Reacao, ShardCanal
+
+
+SHARDS = list(getattr(settings, 'MENSAGENS_SHARDS', []))
+
+TAMANHO_LOTE = getattr(settings, 'SHARDS_TAMANHO_LOTE', 1000)
+
+MODELOS = {'mensagem', 'reacao', 'entradatimeline'}
+
+VERSAO = 'shards'
+
+# Ids: milissegundos desde 2024-01-01 | 10 bits do processo | 12 bits de sequência
+EPOCA_MS = 1704067200000
+
+MAX_PROCESSOS = 1 << 10
+
+_lock_id = threading.Lock()
+_ultimo_ms = 0
+_sequencia = 0
+_processo = {'pid': None, 'numero': None}
+
+_alocacao = {'versao': None, 'canais': {}}
+
+
+def _numero_processo():
+    """
+    Número do processo nos ids. Vem do id (AUTOINCREMENT, nunca reusado) de
+    uma linha de ProcessoGeradorId, então dois processos só repetem o número
+    se um deles continuar vivo depois de MAX_PROCESSOS reservas mais novas.
+    Os 10 bits do pid repetiam bem antes disso.
+    """
+    pid = os.getpid()
+    # Depois de um fork o filho reserva o seu
+    if _processo['pid'] == pid:
+        return _processo['numero']
+
+    reserva = ProcessoGeradorId.objects.create(pid=pid)
+    numero = reserva.id % MAX_PROCESSOS
+    ProcessoGeradorId.objects.filter(id__lte=reserva.id - MAX_PROCESSOS).delete()
+    if transaction.get_connection().in_atomic_block:
+        # Num rollback a reserva sumiria e outro processo poderia receber o
+        # mesmo número; até o commit ele vale só para esta chamada
+        transaction.on_commit(lambda: _processo.update(pid=pid, numero=numero))
+    else:
+        _processo.update(pid=pid, numero=numero)
+    return numero
+
+
+def novo_id():
+    global _ultimo_ms, _sequencia
+    with _lock_id:
+        processo = _numero_processo()
+        agora = int(time.time() * 1000)
+        if agora <= _ultimo_ms:
+            agora = _ultimo_ms
+            _sequencia = (_sequencia + 1) & 0xFFF
+            if _sequencia == 0:
+                # 4096 ids no mesmo milissegundo: usa o próximo
+                agora += 1
+        else:
+            _sequencia = 0
+        _ultimo_ms = agora
+        return ((agora - EPOCA_MS) << 22) | (processo << 12) | _sequencia
+
+
+def atribuir_id(mensagem):
+    # Chamado antes de inserir; devolve True quando o id foi gerado aqui
+    if not SHARDS or mensagem.pk is not None:
+        return False
+    mensagem.pk = novo_id()
+    return True
+
+
+def alocacao():
+    global _alocacao
+    versao = versoes.versao(VERSAO)
+    if _alocacao['versao'] != versao:
+        _alocacao = {'versao': versao, 'canais': dict(ShardCanal.objects.values_list('canal_id', 'banco'))}
+    return _alocacao['canais']
+
+
+def banco_do_canal(canal_id):
+    if not SHARDS:
+        return DEFAULT_DB_ALIAS
+    banco = alocacao().get(canal_id)
+    if banco not in SHARDS:
+        banco = SHARDS[canal_id % len(SHARDS)]
+    return banco
+
+
+def bancos():
+    """Bancos onde há mensagens para ler."""
+    return SHARDS or [DEFAULT_DB_ALIAS]
+
+
+def bancos_do_modelo(modelo):
+    """Todos os bancos que podem ter linhas do modelo, inclusive o default."""
+    if modelo._meta.model_name in MODELOS:
+        return list(dict.fromkeys([DEFAULT_DB_ALIAS, *SHARDS]))
+    return [DEFAULT_DB_ALIAS]
+
+
+def relacionados(queryset, *campos):
+    # JOIN entre bancos não existe: com shards os relacionados vêm numa
+    # consulta separada ao default
+    if SHARDS:
+        return queryset.prefetch_related(*campos)
+    return queryset.select_related(*campos)
+
+
+class RoteadorMensagens:
+    def _banco(self, model, instancia):
+        if model._meta.model_name not in MODELOS:
+            # Ex.: mensagem.autor lido a partir de uma mensagem de um shard
+            if instancia is not None and instancia._meta.model_name in MODELOS:
+                return DEFAULT_DB_ALIAS
+            return None
+
+        if instancia is None:
+            return None
+        if isinstance(instancia, Canal):
+            return banco_do_canal(instancia.pk)
+        if instancia._meta.model_name in MODELOS and instancia._state.db:
+            return instancia._state.db
+        if isinstance(instancia, Mensagem) and instancia.canal_id:
+            return banco_do_canal(instancia.canal_id)
+        # Reação ou entrada da timeline ainda não salva: vai com a mensagem
+        mensagem = instancia._state.fields_cache.get('mensagem')
+        if mensagem is not None:
+            return self._banco(Mensagem, mensagem)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not SHARDS:
+            return None
+        return self._banco(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        if not SHARDS:
+            return None
+        return self._banco(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if SHARDS and (obj1._meta.model_name in MODELOS or obj2._meta.model_name in MODELOS):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O default mantém todas as tabelas (histórico anterior aos shards e
+        # o admin); os shards só as de mensagens
+        if db in SHARDS:
+            return app_label == 'core' and model_name in MODELOS
+        return None
+
+
+def ultimas_mensagens(canais_ids):
+    """Última mensagem de cada canal: {canal_id: Mensagem}, uma consulta por shard."""
+    por_banco = {}
+    for canal_id in canais_ids:
+        por_banco.setdefault(banco_do_canal(canal_id), []).append(canal_id)
+
+    ultimas = {}
+    for banco, ids in por_banco.items():
+        consulta = Mensagem.objects.using(banco).filter(canal_id__in=ids).annotate(
+            posicao=Window(
+                RowNumber(),
+                partition_by=F('canal_id'),
+                order_by=[F('created_at').desc(), F('id').desc()]
+            )
+        ).filter(posicao=1)
+        ultimas.update((mensagem.canal_id, mensagem) for mensagem in consulta)
+    return ultimas
+
+
+def mensagens_nao_lidas(leituras):
+    """
+    {canal_id: mensagens depois da última leitura} a partir de {canal_id:
+    ultima_leitura}; None conta todas. Uma consulta por shard.
+    """
+    por_banco = {}
+    for canal_id, ultima_leitura in leituras.items():
+        condicao = Q(canal_id=canal_id)
+        if ultima_leitura:
+            condicao &= Q(created_at__gt=ultima_leitura)
+        por_banco.setdefault(banco_do_canal(canal_id), []).append(condicao)
+
+    contagens = dict.fromkeys(leituras, 0)
+    for banco, condicoes in por_banco.items():
+        consulta = (
+            Mensagem.objects.using(banco).filter(reduce(operator.or_, condicoes))
+            .order_by().values_list('canal_id').annotate(total=Count('id'))
+        )
+        contagens.update(consulta)
+    return contagens
+
+
+def localizar_canais():
+    """{canal_id: {banco: mensagens}} em todos os bancos, inclusive o default."""
+    locais = {}
+    for banco in bancos_do_modelo(Mensagem):
+        contagens = (
+            Mensagem.objects.using(banco).order_by()
+            .values_list('canal_id').annotate(total=Count('id'))
+        )
+        for canal_id, total in contagens:
+            locais.setdefault(canal_id, {})[banco] = total
+    return locais
+
+
+def planejar_rebalanceamento(tolerancia=0.1):
+    """
+    Devolve ([(canal_id, origens, destino)], carga final por shard).
+
+    Canais fora do seu shard (no default, num shard removido ou divididos
+    entre bancos) vão para o shard atual. Depois, enquanto a diferença entre
+    o shard mais cheio e o mais vazio passar de `tolerancia`, o canal do mais
+    cheio com tamanho mais próximo de metade da diferença muda de shard.
+    """
+    locais = localizar_canais()
+    tamanhos = {canal_id: sum(por_banco.values()) for canal_id, por_banco in locais.items()}
+    destinos = {canal_id: banco_do_canal(canal_id) for canal_id in locais}
+    carga = dict.fromkeys(SHARDS, 0)
+    for canal_id, banco in destinos.items():
+        carga[banco] += tamanhos[canal_id]
+
+    while len(carga) > 1:
+        cheio = max(carga, key=carga.get)
+        vazio = min(carga, key=carga.get)
+        diferenca = carga[cheio] - carga[vazio]
+        if diferenca <= tolerancia * carga[cheio]:
+            break
+        # Só mover canais menores que a diferença reduz o desequilíbrio
+        candidatos = [
+            canal_id for canal_id, banco in destinos.items()
+            if banco == cheio and 0 < tamanhos[canal_id] < diferenca
+        ]
+        if not candidatos:
+            break
+        canal_id = min(candidatos, key=lambda c: abs(tamanhos[c] - diferenca / 2))
+        destinos[canal_id] = vazio
+        carga[cheio] -= tamanhos[canal_id]
+        carga[vazio] += tamanhos[canal_id]
+
+    movimentos = [
+        (canal_id, [banco for banco in locais[canal_id] if banco != destino], destino)
+        for canal_id, destino in destinos.items()
+        if set(locais[canal_id]) != {destino}
+    ]
+    return movimentos, carga
+
+
+def _copiar(canal_id, origem, destino, tamanho_lote, progresso):
+    # Ids das mensagens são globais e preservados; reações e entradas da
+    # timeline ganham ids novos no destino
+    ultimo = 0
+    copiadas = []
+    while True:
+        lote = list(
+            Mensagem.objects.using(origem)
+            .filter(canal_id=canal_id, id__gt=ultimo).order_by('id')[:tamanho_lote]
+        )
+        if not lote:
+            return copiadas
+        ids = [mensagem.id for mensagem in lote]
+        reacoes = list(Reacao.objects.using(origem).filter(mensagem_id__in=ids))
+        entradas = list(EntradaTimeline.objects.using(origem).filter(mensagem_id__in=ids))
+        for objeto in reacoes + entradas:
+            objeto.pk = None
+
+        # ignore_conflicts: retomar um movimento interrompido não duplica nada
+        with transaction.atomic(using=destino):
+            Mensagem.objects.using(destino).bulk_create(lote, ignore_conflicts=True)
+            Reacao.objects.using(destino).bulk_create(reacoes, ignore_conflicts=True)
+            EntradaTimeline.objects.using(destino).bulk_create(entradas, ignore_conflicts=True)
+
+        copiadas.extend(ids)
+        ultimo = ids[-1]
+        if progresso:
+            progresso(canal_id, origem, destino, len(copiadas))
+
+
+def mover_canal(canal_id, origens, destino, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """
+    Passa as mensagens do canal para `destino`. A alocação muda antes da
+    cópia, então mensagens novas já vão para o destino; das origens só são
+    apagadas as mensagens copiadas, e o que chegar atrasado nelas (processos
+    que ainda não viram a nova versão, até VERSOES_INTERVALO segundos) fica
+    para a próxima execução.
+    """
+    ShardCanal.objects.update_or_create(canal_id=canal_id, defaults={'banco': destino})
+    versoes.renovar(VERSAO)
+
+    movidas = 0
+    for origem in origens:
+        copiadas = _copiar(canal_id, origem, destino, tamanho_lote, progresso)
+        # Apaga só depois de copiar tudo: apagar antes anularia responde_a
+        # das respostas ainda não copiadas
+        for inicio in range(0, len(copiadas), tamanho_lote):
+            with transaction.atomic(using=origem):
+                Mensagem.objects.using(origem).filter(
+                    id__in=copiadas[inicio:inicio + tamanho_lote]
+                ).delete()
+        movidas += len(copiadas)
+    return movidas
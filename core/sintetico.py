@@ -0,0 +1,635 @@
+"""
+Dados sintéticos em grande volume para testes de carga e de escala.
+
+Gera usuários, cargos, canais dos três tipos, membros, mensagens, reações,
+notificações, eventos, seguidores, disciplinas, professores e as duas
+avaliações com o viés de uma rede de verdade: poucos canais concentram a
+maior parte das mensagens e poucos usuários postam, reagem e são seguidos
+muito mais que o resto (lei de potência com expoente `assimetria`).
+
+Os sorteios são feitos em numpy, coluna por coluna, e saem iguais para a
+mesma semente. As tabelas pequenas vão com bulk_create; as grandes com
+executemany direto no cursor, com os valores já no formato do banco, porque
+o bulk_create passa cada campo pelo compilador do ORM e não passa de poucos
+milhares de linhas por segundo. Como os save() dos modelos não rodam,
+agregados, rankings e caches são recalculados no fim, e as timelines
+recebem o fan-out que distribuir_mensagem faria.
+"""
+
+from contextlib import contextmanager
+from datetime import time as horario, timedelta, timezone as fuso
+from time import perf_counter
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import agregados, ranking, shards
+from .catalogo import invalidar_catalogo
+from .models import (
+    Avaliacao, AvaliacaoDisciplina, Canal, Cargo, CustomUser, Disciplinas, EntradaTimeline, Evento,
+    MembroCanal, Mensagem, Notificacao, Professores, Reacao, Seguidor, UsuarioCargo,
+    normalizar_codigo, normalizar_texto
+)
+from .painel import invalidar_estatisticas_painel
+from .timeline import CACHE_AUTORES_POPULARES, LIMITE_FANOUT, MAX_ENTRADAS
+
+
+# Volume com escala 1 (cerca de 1,1 milhão de linhas); escala 10 passa de 10 milhões.
+# As timelines vêm a mais: até TIMELINE_MAX_ENTRADAS por usuário.
+QUANTIDADES = {
+    'usuarios': 10_000,
+    'cargos': 50,
+    'usuario_cargos': 15_000,
+    'canais': 1_000,
+    'membros': 100_000,
+    'mensagens': 500_000,
+    'reacoes': 200_000,
+    'notificacoes': 100_000,
+    'eventos': 2_000,
+    'seguidores': 100_000,
+    'disciplinas': 300,
+    'professores': 200,
+    'avaliacoes_disciplinas': 50_000,
+    'avaliacoes_professores': 50_000,
+}
+
+TAMANHO_LOTE = getattr(settings, 'SINTETICO_TAMANHO_LOTE', 5000)
+
+# Mensagens por rodada do fan-out das timelines (limita a memória)
+BLOCO_TIMELINE = 10_000
+
+EMOJIS = ['👍', '❤️', '😂', '🎉', '😮', '🔥', '👏', '😢']
+
+CORES = ['blue', 'green', 'red', 'purple', 'orange', 'pink']
+
+AVATARES = ['💬', '📚', '🎓', '🧪', '💻', '⚽', '🎵', '📢']
+
+PALAVRAS = (
+    'aula prova trabalho grupo professor lista exercício monitoria dúvida resumo '
+    'semestre nota entrega prazo laboratório projeto seminário biblioteca livro '
+    'matéria turma horário sala campus evento palestra estágio bolsa edital'
+).split()
+
+TIPOS_CANAL = ['publico', 'privado', 'restrito']
+
+PROPORCAO_TIPOS_CANAL = [0.6, 0.25, 0.15]
+
+PAPEIS = ['admin', 'moderador', 'membro']
+
+CRITERIOS_PROFESSOR = ('dominio', 'metodos', 'relacionamento', 'compatibilidade', 'clareza')
+
+CRITERIOS_DISCIPLINA = ('contribuicao', 'equilibrio', 'aplicacao', 'material', 'distribuicao')
+
+
+class ErroGeracao(Exception):
+    pass
+
+
+@contextmanager
+def _sem_auto_now(*modelos):
+    # As datas são espalhadas no passado; auto_now/auto_now_add as trocariam por agora
+    campos = [
+        campo for modelo in modelos for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    originais = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originais:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def _gravacao_rapida(bancos):
+    # Sem fsync a cada commit, só nesta conexão e só durante a geração
+    anteriores = {}
+    for banco in bancos:
+        # Dentro de uma transação (ex.: setUpTestData) o SQLite não deixa mudar
+        if connections[banco].in_atomic_block:
+            continue
+        with connections[banco].cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            anteriores[banco] = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous=OFF')
+    try:
+        yield
+    finally:
+        for banco, valor in anteriores.items():
+            with connections[banco].cursor() as cursor:
+                cursor.execute(f'PRAGMA synchronous={int(valor)}')
+
+
+def _pares_unicos(a, b, base):
+    # Índices da primeira ocorrência de cada par (a, b)
+    _, indices = np.unique(a.astype(np.int64) * base + b, return_index=True)
+    indices.sort()
+    return indices
+
+
+def _opcional(valores, vazios):
+    # Coluna com None onde `vazios` é verdadeiro
+    return [None if vazio else valor for valor, vazio in zip(valores, vazios.tolist())]
+
+
+class GeradorDados:
+    def __init__(self, quantidades=None, escala=1, seed=42, prefixo='sint', assimetria=1.1,
+                 dias=365, tamanho_lote=TAMANHO_LOTE, senha='senha123', progresso=None):
+        # Pelo menos uma linha de cada, mesmo em escalas bem pequenas
+        self.quantidades = {nome: max(1, round(total * escala)) for nome, total in QUANTIDADES.items()}
+        self.quantidades.update(quantidades or {})
+        self.rng = np.random.default_rng(seed)
+        self.prefixo = prefixo
+        self.assimetria = assimetria
+        self.segundos = dias * 24 * 3600
+        self.tamanho_lote = tamanho_lote
+        self.senha = senha
+        self.progresso = progresso
+        self.agora = timezone.now()
+        self.gerados = {}
+
+    # Sorteios
+
+    def _popularidade(self, n):
+        # Lei de potência com a ordem embaralhada: o mais popular não é o primeiro id
+        pesos = 1 / np.arange(1, n + 1) ** self.assimetria
+        pesos = pesos[self.rng.permutation(n)]
+        acumulado = np.cumsum(pesos)
+        return acumulado / acumulado[-1]
+
+    def _sortear(self, acumulado, total):
+        indices = np.searchsorted(acumulado, self.rng.random(total), side='right')
+        return np.minimum(indices, len(acumulado) - 1)
+
+    def _atras(self, total, recentes=1.0):
+        # Segundos antes de agora; recentes > 1 concentra perto de agora
+        return self.rng.random(total) ** recentes * self.segundos
+
+    def _quando(self, segundos_atras):
+        return self.agora - timedelta(seconds=float(segundos_atras))
+
+    def _instantes(self, segundos_atras):
+        # Como o backend do SQLite grava datetimes: UTC, sem fuso, com espaço
+        agora = np.datetime64(self.agora.astimezone(fuso.utc).replace(tzinfo=None), 'us')
+        valores = agora - (np.asarray(segundos_atras) * 1e6).astype('timedelta64[us]')
+        return np.char.replace(np.datetime_as_string(valores, unit='us'), 'T', ' ').tolist()
+
+    def _texto(self, minimo, maximo):
+        tamanho = int(self.rng.integers(minimo, maximo + 1))
+        return ' '.join(PALAVRAS[i] for i in self.rng.integers(0, len(PALAVRAS), tamanho))
+
+    def _textos(self, total, minimo, maximo):
+        # Sorteados de um conjunto fixo de frases: montar uma por linha é lento
+        frases = np.array([self._texto(minimo, maximo) for _ in range(1000)], dtype=object)
+        return frases[self.rng.integers(0, len(frases), total)].tolist()
+
+    # Gravação
+
+    def _gravar(self, nome, modelo, objetos, banco=DEFAULT_DB_ALIAS):
+        inicio = perf_counter()
+        objetos = list(objetos)
+        for posicao in range(0, len(objetos), self.tamanho_lote):
+            with transaction.atomic(using=banco):
+                modelo.objects.using(banco).bulk_create(objetos[posicao:posicao + self.tamanho_lote])
+        self._registrar(nome, len(objetos), perf_counter() - inicio)
+        return np.array([objeto.pk for objeto in objetos], dtype=np.int64)
+
+    def _gravar_colunas(self, nome, modelo, colunas, banco=DEFAULT_DB_ALIAS):
+        conexao = connections[banco]
+        # Campos não informados recebem o default do modelo, igual para todas as linhas
+        constantes = {
+            campo.attname: campo.get_db_prep_save(campo.get_default(), conexao)
+            for campo in modelo._meta.concrete_fields
+            if campo.attname not in colunas and not campo.primary_key
+        }
+        nomes = [*colunas, *constantes]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            conexao.ops.quote_name(modelo._meta.db_table),
+            ', '.join(conexao.ops.quote_name(modelo._meta.get_field(nome_campo).column) for nome_campo in nomes),
+            ', '.join(['%s'] * len(nomes)),
+        )
+        valores = [coluna.tolist() if isinstance(coluna, np.ndarray) else coluna for coluna in colunas.values()]
+        total = len(valores[0])
+        valores += [[valor] * total for valor in constantes.values()]
+        linhas = list(zip(*valores))
+
+        inicio = perf_counter()
+        for posicao in range(0, total, self.tamanho_lote):
+            with transaction.atomic(using=banco), conexao.cursor() as cursor:
+                cursor.executemany(sql, linhas[posicao:posicao + self.tamanho_lote])
+        self._registrar(nome, total, perf_counter() - inicio)
+
+    def _proximos_ids(self, modelo, total, banco=DEFAULT_DB_ALIAS):
+        ultimo = modelo.objects.using(banco).aggregate(ultimo=Max('pk'))['ultimo'] or 0
+        return np.arange(ultimo + 1, ultimo + 1 + total, dtype=np.int64)
+
+    def _registrar(self, nome, total, segundos):
+        self.gerados[nome] = self.gerados.get(nome, 0) + total
+        if self.progresso:
+            self.progresso(nome, total, segundos)
+
+    # Modelos
+
+    def _usuarios(self):
+        n = self.quantidades['usuarios']
+        self.usuarios = self._proximos_ids(CustomUser, n)
+        nomes = [f'{self.prefixo}{i}' for i in range(n)]
+        criados = self._instantes(self._atras(n))
+        self._gravar_colunas('usuarios', CustomUser, {
+            'id': self.usuarios,
+            'username': nomes,
+            'email': [f'{nome}@exemplo.com' for nome in nomes],
+            'matricula': nomes,
+            'fullname': [f'Usuário {self.prefixo} {i}' for i in range(n)],
+            # Um hash só: o PBKDF2 leva dezenas de milissegundos por senha
+            'password': [make_password(self.senha)] * n,
+            'date_joined': criados,
+            'created_at': criados,
+        })
+        # Usuários mais ativos: postam, reagem e são seguidos mais
+        self.atividade = self._popularidade(n)
+
+    def _cargos(self):
+        n = self.quantidades['cargos']
+        criadores = self.rng.integers(0, len(self.usuarios), n)
+        atras = self._atras(n)
+        self.cargos = self._gravar('cargos', Cargo, (
+            Cargo(
+                nome=f'Cargo {self.prefixo} {i}',
+                descricao=self._texto(3, 10),
+                criado_por_id=int(self.usuarios[criadores[i]]),
+                created_at=self._quando(atras[i]),
+            )
+            for i in range(n)
+        ))
+
+        total = self.quantidades['usuario_cargos']
+        usuarios = self.rng.integers(0, len(self.usuarios), total)
+        cargos = self._sortear(self._popularidade(n), total)
+        unicos = _pares_unicos(usuarios, cargos, n)
+        usuarios, cargos = usuarios[unicos], cargos[unicos]
+        ativos = self.rng.random(len(unicos)) < 0.95
+        self._gravar_colunas('usuario_cargos', UsuarioCargo, {
+            'usuario_id': self.usuarios[usuarios],
+            'cargo_id': self.cargos[cargos],
+            'ativo': ativos,
+            'atribuido_em': self._instantes(self._atras(len(unicos))),
+        })
+
+        # Quem pode entrar nos canais restritos de cada cargo
+        ordem = np.argsort(cargos[ativos], kind='stable')
+        fronteiras = np.searchsorted(cargos[ativos][ordem], np.arange(1, n))
+        self.portadores = np.split(usuarios[ativos][ordem], fronteiras)
+
+    def _canais(self):
+        n = self.quantidades['canais']
+        self.tipos = self.rng.choice(len(TIPOS_CANAL), n, p=PROPORCAO_TIPOS_CANAL)
+        self.criadores = self._sortear(self.atividade, n)
+        self.canais = self._gravar('canais', Canal, (
+            Canal(
+                nome=f'Canal {self.prefixo} {i}',
+                descricao=self._texto(5, 15),
+                tipo=TIPOS_CANAL[self.tipos[i]],
+                avatar=AVATARES[i % len(AVATARES)],
+                cor_avatar=CORES[i % len(CORES)],
+                criado_por_id=int(self.usuarios[self.criadores[i]]),
+                created_at=self._quando(self.segundos),
+                updated_at=self.agora,
+            )
+            for i in range(n)
+        ))
+        # Canais quentes recebem a maior parte das mensagens e dos membros
+        self.popularidade_canais = self._popularidade(n)
+
+        popularidade_cargos = self._popularidade(len(self.cargos))
+        self.cargos_do_canal = {
+            int(canal): np.unique(self._sortear(popularidade_cargos, int(self.rng.integers(1, 3))))
+            for canal in np.flatnonzero(self.tipos == 2)
+        }
+        Permitido = Canal.cargos_permitidos.through
+        self._gravar('canais_cargos', Permitido, (
+            Permitido(canal_id=int(self.canais[canal]), cargo_id=int(self.cargos[cargo]))
+            for canal, cargos in self.cargos_do_canal.items() for cargo in cargos
+        ))
+
+    def _membros(self):
+        n = len(self.canais)
+        tamanhos = self.rng.multinomial(self.quantidades['membros'], np.diff(self.popularidade_canais, prepend=0))
+
+        usuarios, papeis = [], []
+        for canal in range(n):
+            if self.tipos[canal] == 2:
+                # Restrito: só quem tem um dos cargos permitidos
+                candidatos = np.unique(np.concatenate([self.portadores[cargo] for cargo in self.cargos_do_canal[canal]]))
+                escolhidos = candidatos[self.rng.integers(0, len(candidatos), tamanhos[canal])] if len(candidatos) else candidatos
+            else:
+                escolhidos = self._sortear(self.atividade, tamanhos[canal])
+            # O criador é sempre membro, como admin
+            escolhidos = np.unique(np.append(escolhidos, self.criadores[canal]))
+            usuarios.append(escolhidos)
+            papeis.append(np.where(escolhidos == self.criadores[canal], 0, 2))
+
+        # Membros ordenados por canal: a fatia de cada canal serve para sortear autores
+        self.membros_usuarios = np.concatenate(usuarios)
+        self.membros_contagem = np.array([len(escolhidos) for escolhidos in usuarios])
+        self.membros_inicio = np.concatenate([[0], np.cumsum(self.membros_contagem)[:-1]])
+        total = len(self.membros_usuarios)
+
+        entradas = self._atras(total)
+        leituras = self.rng.random(total)
+        self._gravar_colunas('membros', MembroCanal, {
+            'usuario_id': self.usuarios[self.membros_usuarios],
+            'canal_id': np.repeat(self.canais, self.membros_contagem),
+            'papel': np.array(PAPEIS)[np.concatenate(papeis)],
+            'entrou_em': self._instantes(entradas),
+            # Parte dos membros nunca abriu o canal
+            'ultima_leitura': _opcional(self._instantes(entradas * leituras), leituras >= 0.8),
+        })
+
+    def _mensagens(self):
+        total = self.quantidades['mensagens']
+        canais = self._sortear(self.popularidade_canais, total)
+        # Em ordem cronológica, para os ids crescerem com created_at
+        atras = np.sort(self._atras(total, recentes=1.5))[::-1]
+
+        # Canais públicos: qualquer usuário (com viés); os outros: um dos membros
+        autores = self._sortear(self.atividade, total)
+        fechados = self.tipos[canais] != 0
+        posicao = (self.rng.random(fechados.sum()) * self.membros_contagem[canais[fechados]]).astype(np.int64)
+        autores[fechados] = self.membros_usuarios[self.membros_inicio[canais[fechados]] + posicao]
+
+        # Ids definidos aqui para as respostas apontarem para mensagens do mesmo lote
+        if shards.SHARDS:
+            ids = np.array([shards.novo_id() for _ in range(total)], dtype=np.int64)
+        else:
+            ids = self._proximos_ids(Mensagem, total)
+
+        # ~10% respondem à mensagem anterior do mesmo canal
+        ordem = np.argsort(canais, kind='stable')
+        anterior = np.full(total, -1)
+        mesmo_canal = canais[ordem][1:] == canais[ordem][:-1]
+        anterior[ordem[1:][mesmo_canal]] = ordem[:-1][mesmo_canal]
+        responde_a = np.where(self.rng.random(total) < 0.1, anterior, -1)
+
+        self.mensagens = ids
+        self.mensagens_atras = atras
+        self.mensagens_canais = canais
+        self.mensagens_autores = autores
+        self.mensagens_bancos = np.array([shards.banco_do_canal(int(canal)) for canal in self.canais])[canais]
+
+        instantes = np.array(self._instantes(atras), dtype=object)
+        conteudos = np.array(self._textos(total, 3, 30), dtype=object)
+        respostas = np.array(_opcional(ids[responde_a].tolist(), responde_a < 0), dtype=object)
+        for banco in np.unique(self.mensagens_bancos):
+            indices = np.flatnonzero(self.mensagens_bancos == banco)
+            self._gravar_colunas('mensagens', Mensagem, {
+                'id': ids[indices],
+                'canal_id': self.canais[canais[indices]],
+                'autor_id': self.usuarios[autores[indices]],
+                'conteudo': conteudos[indices],
+                'responde_a_id': respostas[indices],
+                'created_at': instantes[indices],
+                'updated_at': instantes[indices],
+            }, banco)
+
+    def _reacoes(self):
+        total = self.quantidades['reacoes']
+        # Mensagens recentes recebem mais reações
+        mensagens = (len(self.mensagens) * (1 - self.rng.random(total) ** 2)).astype(np.int64)
+        usuarios = self._sortear(self.atividade, total)
+        emojis = self._sortear(self._popularidade(len(EMOJIS)), total)
+        # Uma reação por (mensagem, usuário, emoji)
+        unicos = _pares_unicos(mensagens * len(self.usuarios) + usuarios, emojis, len(EMOJIS))
+        # Depois da mensagem e antes de agora
+        instantes = np.array(self._instantes(self.mensagens_atras[mensagens] * self.rng.random(total)), dtype=object)
+
+        for banco in np.unique(self.mensagens_bancos):
+            indices = unicos[self.mensagens_bancos[mensagens[unicos]] == banco]
+            self._gravar_colunas('reacoes', Reacao, {
+                'mensagem_id': self.mensagens[mensagens[indices]],
+                'usuario_id': self.usuarios[usuarios[indices]],
+                'emoji': np.array(EMOJIS, dtype=object)[emojis[indices]],
+                'created_at': instantes[indices],
+            }, banco)
+
+    def _notificacoes(self):
+        total = self.quantidades['notificacoes']
+        tipos = np.array([tipo for tipo, _ in Notificacao.TIPO_CHOICES])
+        atras = self._atras(total, recentes=2)
+        self._gravar_colunas('notificacoes', Notificacao, {
+            'usuario_id': self.usuarios[self._sortear(self.atividade, total)],
+            'tipo': tipos[self.rng.integers(0, len(tipos), total)],
+            'titulo': self._textos(total, 2, 6),
+            'mensagem': self._textos(total, 5, 20),
+            # As antigas quase sempre já foram lidas
+            'lida': (atras > self.segundos * 0.05) | (self.rng.random(total) < 0.3),
+            'created_at': self._instantes(atras),
+        })
+
+    def _eventos(self):
+        total = self.quantidades['eventos']
+        hoje = timezone.localdate()
+        dias = self.rng.integers(-180, 181, total)
+        inicios = self.rng.integers(7, 21, total)
+        duracoes = self.rng.integers(1, 4, total)
+        ativos = self.rng.random(total) < 0.95
+        self._gravar('eventos', Evento, (
+            Evento(
+                titulo=self._texto(2, 6).capitalize(),
+                descricao=self._texto(5, 25),
+                data=hoje + timedelta(days=int(dias[i])),
+                horario_inicio=horario(int(inicios[i])),
+                horario_fim=horario(min(int(inicios[i] + duracoes[i]), 23)),
+                cor=CORES[i % len(CORES)],
+                ativo=bool(ativos[i]),
+            )
+            for i in range(total)
+        ))
+
+    def _seguidores(self):
+        total = self.quantidades['seguidores']
+        n = len(self.usuarios)
+        # Qualquer um segue; os mais ativos são os mais seguidos
+        seguidores = self.rng.integers(0, n, total)
+        seguidos = self._sortear(self.atividade, total)
+        unicos = _pares_unicos(seguidores, seguidos, n)
+        unicos = unicos[seguidores[unicos] != seguidos[unicos]]
+        self.seguidores = seguidores[unicos]
+        self.seguidos = seguidos[unicos]
+        self._gravar_colunas('seguidores', Seguidor, {
+            'seguidor_id': self.usuarios[seguidores[unicos]],
+            'seguido_id': self.usuarios[seguidos[unicos]],
+            'data_inicio': self._instantes(self._atras(len(unicos))),
+        })
+
+    def _timelines(self):
+        # O fan-out de timeline.distribuir_mensagem: cada mensagem vai para
+        # os seguidores do autor que acessam o canal, até as MAX_ENTRADAS
+        # mais recentes de cada um
+        n = len(self.usuarios)
+        ordem = np.argsort(self.seguidos, kind='stable')
+        seguidores = self.seguidores[ordem]
+        inicio_seguidores = np.searchsorted(self.seguidos[ordem], np.arange(n))
+        contagem_seguidores = np.bincount(self.seguidos, minlength=n)
+        # Autores populares são mesclados na leitura, sem fan-out
+        com_fanout = contagem_seguidores <= LIMITE_FANOUT
+
+        # Acesso aos canais fechados como canal * n + usuário: membros dos
+        # privados e portadores dos cargos dos restritos
+        canais_membros = np.repeat(np.arange(len(self.canais)), self.membros_contagem)
+        privados = self.tipos[canais_membros] == 1
+        acessos = np.unique(np.concatenate([
+            canais_membros[privados] * n + self.membros_usuarios[privados],
+            *(canal * n + self.portadores[cargo] for canal, cargos in self.cargos_do_canal.items() for cargo in cargos),
+        ]).astype(np.int64))
+
+        recebidas = np.zeros(n, dtype=np.int64)
+        # Da mensagem mais nova para a mais antiga
+        for fim in range(len(self.mensagens), 0, -BLOCO_TIMELINE):
+            bloco = np.arange(max(fim - BLOCO_TIMELINE, 0), fim)[::-1]
+            bloco = bloco[com_fanout[self.mensagens_autores[bloco]]]
+            autores = self.mensagens_autores[bloco]
+            quantos = contagem_seguidores[autores]
+            mensagens = np.repeat(bloco, quantos)
+            deslocamento = np.arange(len(mensagens)) - np.repeat(np.cumsum(quantos) - quantos, quantos)
+            usuarios = seguidores[np.repeat(inicio_seguidores[autores], quantos) + deslocamento]
+
+            canais = self.mensagens_canais[mensagens]
+            permitidos = (self.tipos[canais] == 0) | np.isin(canais * n + usuarios, acessos)
+            mensagens, usuarios = mensagens[permitidos], usuarios[permitidos]
+
+            # Posição de cada entrada entre as do mesmo usuário no bloco
+            ordem = np.argsort(usuarios, kind='stable')
+            ordenados = usuarios[ordem]
+            posicao = np.empty_like(ordem)
+            posicao[ordem] = np.arange(len(ordem)) - np.searchsorted(ordenados, ordenados)
+            cabem = recebidas[usuarios] + posicao < MAX_ENTRADAS
+            mensagens, usuarios = mensagens[cabem], usuarios[cabem]
+            recebidas += np.bincount(usuarios, minlength=n)
+            if not len(mensagens):
+                continue
+
+            instantes = np.array(self._instantes(self.mensagens_atras[mensagens]), dtype=object)
+            bancos = self.mensagens_bancos[mensagens]
+            for banco in np.unique(bancos):
+                indices = np.flatnonzero(bancos == banco)
+                self._gravar_colunas('timelines', EntradaTimeline, {
+                    'usuario_id': self.usuarios[usuarios[indices]],
+                    'mensagem_id': self.mensagens[mensagens[indices]],
+                    'criado_em': instantes[indices],
+                }, banco)
+
+    def _disciplinas(self):
+        n = self.quantidades['disciplinas']
+        disciplinas = []
+        for i in range(n):
+            nome = f'Disciplina {self.prefixo} {i}'
+            codigo = f'{self.prefixo}{i}'.upper()
+            # save() não roda no bulk_create
+            disciplinas.append(Disciplinas(
+                nome=nome,
+                codigo=codigo,
+                codigo_normalizado=normalizar_codigo(codigo),
+                nome_normalizado=normalizar_texto(nome),
+            ))
+        self.disciplinas = self._gravar('disciplinas', Disciplinas, disciplinas)
+
+        m = self.quantidades['professores']
+        self.professores = self._gravar('professores', Professores, (
+            Professores(nome=f'Professor {self.prefixo} {i}') for i in range(m)
+        ))
+
+        # Cada professor dá de 1 a 4 disciplinas
+        professores = np.repeat(np.arange(m), self.rng.integers(1, 5, m))
+        disciplinas = self.rng.integers(0, n, len(professores))
+        unicos = _pares_unicos(professores, disciplinas, n)
+        self.lecionadas = (professores[unicos], disciplinas[unicos])
+        Lecionada = Professores.disciplinas.through
+        self._gravar('professores_disciplinas', Lecionada, (
+            Lecionada(professores_id=int(self.professores[p]), disciplinas_id=int(self.disciplinas[d]))
+            for p, d in zip(*self.lecionadas)
+        ))
+
+    def _notas(self, medias):
+        # Cada item tem sua qualidade média; as notas de 0 a 10 variam em volta dela
+        notas = self.rng.normal(medias[:, None], 1.5, (len(medias), 5))
+        return np.clip(np.rint(notas), 0, 10).astype(np.int64)
+
+    def _comentarios(self, total):
+        return _opcional(self._textos(total, 5, 30), self.rng.random(total) >= 0.2)
+
+    def _avaliacoes(self):
+        n = len(self.disciplinas)
+        total = self.quantidades['avaliacoes_disciplinas']
+        ano = timezone.localdate().year
+        periodos = np.array([f'{ano - k // 2}.{2 - k % 2}' for k in range(4)])
+        disciplinas = self._sortear(self._popularidade(n), total)
+        usuarios = self.rng.integers(0, len(self.usuarios), total)
+        periodo = self.rng.integers(0, len(periodos), total)
+        # Uma avaliação por usuário, disciplina e período
+        unicos = _pares_unicos(usuarios * n + disciplinas, periodo, len(periodos))
+        notas = self._notas(self.rng.normal(7, 1.5, n)[disciplinas[unicos]])
+        self._gravar_colunas('avaliacoes_disciplinas', AvaliacaoDisciplina, {
+            'disciplina_id': self.disciplinas[disciplinas[unicos]],
+            'usuario_id': self.usuarios[usuarios[unicos]],
+            'periodo': periodos[periodo[unicos]],
+            **{criterio: notas[:, i] for i, criterio in enumerate(CRITERIOS_DISCIPLINA)},
+            'comentario': self._comentarios(len(unicos)),
+            'criado_em': self._instantes(self._atras(len(unicos))),
+        })
+
+        professores, disciplinas = self.lecionadas
+        total = self.quantidades['avaliacoes_professores']
+        pares = self._sortear(self._popularidade(len(professores)), total)
+        notas = self._notas(self.rng.normal(7, 1.5, len(professores))[pares])
+        # Critérios opcionais às vezes ficam em branco
+        vazios = self.rng.random(notas.shape) < 0.05
+        self._gravar_colunas('avaliacoes_professores', Avaliacao, {
+            'professor_id': self.professores[professores[pares]],
+            'disciplina_id': self.disciplinas[disciplinas[pares]],
+            **{
+                criterio: _opcional(notas[:, i].tolist(), vazios[:, i])
+                for i, criterio in enumerate(CRITERIOS_PROFESSOR)
+            },
+            'comentario': self._comentarios(total),
+            'criado_em': self._instantes(self._atras(total)),
+        })
+
+    def _finalizar(self):
+        inicio = perf_counter()
+        agregados.recalcular_agregados_disciplinas()
+        agregados.recalcular_agregados_professores()
+        ranking.calcular_ranking_disciplinas()
+        ranking.calcular_ranking_professores()
+        invalidar_catalogo()
+        invalidar_estatisticas_painel()
+        cache.delete(CACHE_AUTORES_POPULARES)
+        if self.progresso:
+            self.progresso('agregados e rankings', 0, perf_counter() - inicio)
+
+    def executar(self):
+        if CustomUser.objects.filter(username__startswith=self.prefixo).exists():
+            raise ErroGeracao(f'Já existem usuários com o prefixo "{self.prefixo}"; use outro prefixo.')
+
+        with _sem_auto_now(Cargo, Canal), _gravacao_rapida(shards.bancos_do_modelo(Mensagem)):
+            self._usuarios()
+            self._cargos()
+            self._canais()
+            self._membros()
+            self._mensagens()
+            self._reacoes()
+            self._notificacoes()
+            self._eventos()
+            self._seguidores()
+            self._timelines()
+            self._disciplinas()
+            self._avaliacoes()
+        self._finalizar()
+        return self.gerados
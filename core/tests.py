@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import pstats
+import re
+import tempfile
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, time, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from time import perf_counter
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.utils import ConnectionHandler
+from django.db.models import Count, QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    agregados, autenticacao, catalogo, commit_em_grupo, emails, estatisticas, expurgo, moderacao, painel,
+    ranking, shards, timeline, versoes
+)
+from .perfilamento import PerfilamentoMiddleware
+from .management.commands.auditar_consultas import PARAMETROS, _problemas, _rotas
+
+from .models import (
+    AgregadoDisciplina, AgregadoProfessor, Avaliacao, AvaliacaoDisciplina, BaldeFichas, Canal, Cargo,
+    CargoRequest, ChatRequest, CustomUser, Disciplinas, EmailPendente, EntradaTimeline, Evento, Expurgo,
+    MembroCanal, Mensagem, Notificacao, Novidade, PesquisaRecente, PosicaoRanking, ProcessoGeradorId,
+    Professores, Reacao, Seguidor, ShardCanal, UsuarioCargo, VersaoCompartilhada, periodo_atual
+)
+from .importacao import ErroImportacao, importar_catalogo
+from .provisionamento import provisionar_usuarios
+from .sintetico import GeradorDados
+
+
+def popular(prefixo, admin_usuario):
+    # Cria uma linha (com relações) para cada modelo registrado no admin
+    usuario = CustomUser.objects.create_user(
+        f'{prefixo}-user', f'{prefixo}@exemplo.com', 'senha',
+        fullname=f'Usuário {prefixo}', matricula=f'{prefixo}-mat'
+    )
+    cargo = Cargo.objects.create(nome=f'Cargo {prefixo}', criado_por=usuario)
+    UsuarioCargo.objects.create(usuario=usuario, cargo=cargo)
+    canal = Canal.objects.create(nome=f'Canal {prefixo}', criado_por=usuario)
+    MembroCanal.objects.create(usuario=usuario, canal=canal)
+    mensagem = Mensagem.objects.create(canal=canal, autor=usuario, conteudo=f'Olá {prefixo}')
+    Reacao.objects.create(mensagem=mensagem, usuario=admin_usuario, emoji='👍')
+    Notificacao.objects.create(usuario=usuario, tipo='sistema', titulo='Aviso', mensagem='Teste')
+    Novidade.objects.create(fonte='Reitoria', titulo=f'Novidade {prefixo}', texto='Texto')
+    Evento.objects.create(
+        titulo=f'Evento {prefixo}', data=date(2026, 3, 1),
+        horario_inicio=time(10), horario_fim=time(12)
+    )
+    Seguidor.objects.create(seguidor=usuario, seguido=admin_usuario)
+    PesquisaRecente.objects.create(usuario=usuario, usuario_pesquisado=admin_usuario)
+    EntradaTimeline.objects.create(usuario=admin_usuario, mensagem=mensagem)
+    chat_request = ChatRequest.objects.create(nome=f'Pedido {prefixo}', solicitado_por=usuario)
+    chat_request.cargos_permitidos.add(cargo)
+    CargoRequest.objects.create(nome=f'Pedido {prefixo}', solicitado_por=usuario, aprovado_por=admin_usuario)
+    Expurgo.objects.create(tipo='canal', objeto_id=canal.id, descricao=canal.nome, solicitado_por=usuario)
+
+    disciplina = Disciplinas.objects.create(nome=f'Disciplina {prefixo}', codigo=f'{prefixo}101')
+    professor = Professores.objects.create(nome=f'Professor {prefixo}')
+    professor.disciplinas.add(disciplina)
+    AvaliacaoDisciplina.objects.create(
+        disciplina=disciplina, usuario=usuario, contribuicao=8, equilibrio=7,
+        aplicacao=9, material=6, distribuicao=8
+    )
+    AgregadoDisciplina.objects.create(disciplina=disciplina, total=1)
+    Avaliacao.objects.create(professor=professor, disciplina=disciplina, dominio=9, clareza=8)
+    PosicaoRanking.objects.create(
+        tipo='disciplina', disciplina=disciplina, posicao=1, total=1, media=7.6,
+        media_bayesiana=7.0, ic_inferior=6.0, ic_superior=8.0, percentil=100
+    )
+
+
+def criar_usuario(username, **campos):
+    return CustomUser.objects.create_user(
+        username, f'{username}@exemplo.com', 'senha',
+        fullname=username.title(), matricula=f'{username}-mat', **campos
+    )
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = criar_usuario('autor')
+        cls.leitor = criar_usuario('leitor')
+        cls.canal = Canal.objects.create(nome='Privado', tipo='privado', criado_por=cls.autor)
+        MembroCanal.objects.create(usuario=cls.autor, canal=cls.canal)
+        cls.membro_leitor = MembroCanal.objects.create(usuario=cls.leitor, canal=cls.canal)
+        Seguidor.objects.create(seguidor=cls.leitor, seguido=cls.autor)
+
+    def _postar(self, conteudo):
+        mensagem = self.canal.mensagens.create(autor=self.autor, conteudo=conteudo)
+        timeline.distribuir_mensagem(mensagem)
+        return mensagem
+
+    def test_fanout_e_leitura_respeitam_acesso_ao_canal(self):
+        mensagem = self._postar('primeira')
+        self.assertEqual(timeline.timeline_usuario(self.leitor)[0], [mensagem])
+
+        # A entrada já distribuída some quando o leitor sai do canal
+        self.membro_leitor.delete()
+        self.assertEqual(timeline.timeline_usuario(self.leitor)[0], [])
+        self.assertEqual(timeline.distribuir_mensagem(self.canal.mensagens.create(autor=self.autor, conteudo='x')), 0)
+
+    def test_postar_nao_apara_e_comando_mantem_as_mais_recentes(self):
+        with mock.patch.object(timeline, 'MAX_ENTRADAS', 3):
+            mensagens = [self._postar(f'm{i}') for i in range(5)]
+            self.assertEqual(EntradaTimeline.objects.filter(usuario=self.leitor).count(), 5)
+
+            self.assertEqual(timeline.aparar_timelines(tamanho_lote=1), {'default': 2})
+        restantes = EntradaTimeline.objects.filter(usuario=self.leitor).values_list('mensagem_id', flat=True)
+        self.assertEqual(sorted(restantes), [mensagem.id for mensagem in mensagens[2:]])
+
+    def test_fanout_so_para_seguidores_com_acesso(self):
+        de_fora = criar_usuario('de_fora')
+        Seguidor.objects.create(seguidor=de_fora, seguido=self.autor)
+        mensagem = self._postar('primeira')
+        self.assertEqual(timeline.timeline_usuario(self.leitor)[0], [mensagem])
+        self.assertFalse(EntradaTimeline.objects.filter(usuario=de_fora).exists())
+
+    def test_paginacao_por_cursor(self):
+        mensagens = [self._postar(f'm{i}') for i in range(5)]
+        pagina, proximo = timeline.timeline_usuario(self.leitor, limite=3)
+        self.assertEqual(pagina, mensagens[:1:-1])
+        pagina, proximo = timeline.timeline_usuario(self.leitor, antes=proximo, limite=3)
+        self.assertEqual(pagina, mensagens[1::-1])
+        self.assertIsNone(proximo)
+
+    def test_canais_inacessiveis_filtrados_por_subconsulta(self):
+        Canal.objects.bulk_create([
+            Canal(nome=f'Público {i}', tipo='publico', criado_por=self.autor) for i in range(30)
+        ])
+        outro = Canal.objects.create(nome='Outro privado', tipo='privado', criado_por=self.autor)
+        MembroCanal.objects.create(usuario=self.autor, canal=outro)
+        mensagem = self._postar('primeira')
+        EntradaTimeline.objects.create(
+            usuario=self.leitor, mensagem=outro.mensagens.create(autor=self.autor, conteudo='fora')
+        )
+        timeline.autores_populares()
+
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertEqual(timeline.timeline_usuario(self.leitor)[0], [mensagem])
+        # Só as entradas e as mensagens: os ids dos canais não são carregados
+        self.assertEqual(len(contexto.captured_queries), 2)
+        self.assertIn('NOT', contexto.captured_queries[0]['sql'])
+
+
+class PesquisaRecenteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = criar_usuario('quem')
+        cls.pesquisados = [criar_usuario(f'alvo{i}') for i in range(5)]
+
+    def test_repetir_pesquisa_so_atualiza_a_data(self):
+        PesquisaRecente.registrar(self.usuario, self.pesquisados[0])
+        primeira = PesquisaRecente.objects.get(usuario=self.usuario)
+        PesquisaRecente.registrar(self.usuario, self.pesquisados[0])
+
+        pesquisa = PesquisaRecente.objects.get(usuario=self.usuario)
+        self.assertEqual(pesquisa.usuario_pesquisado, self.pesquisados[0])
+        self.assertGreater(pesquisa.data_pesquisa, primeira.data_pesquisa)
+
+    def test_historico_limitado_mantem_as_mais_recentes(self):
+        with mock.patch.object(PesquisaRecente, 'MAX_POR_USUARIO', 3):
+            for pesquisado in self.pesquisados:
+                PesquisaRecente.registrar(self.usuario, pesquisado)
+            # Repetir uma antiga a traz de volta para o topo
+            PesquisaRecente.registrar(self.usuario, self.pesquisados[3])
+
+        restantes = PesquisaRecente.objects.filter(usuario=self.usuario).order_by('-data_pesquisa', '-id')
+        self.assertEqual(
+            [pesquisa.usuario_pesquisado for pesquisa in restantes],
+            [self.pesquisados[3], self.pesquisados[4], self.pesquisados[2]]
+        )
+
+
+def avaliacao_disciplina(disciplina, usuario, nota, **campos):
+    campos.setdefault('periodo', periodo_atual())
+    return AvaliacaoDisciplina(
+        disciplina=disciplina, usuario=usuario, contribuicao=nota, equilibrio=nota,
+        aplicacao=nota, material=nota, distribuicao=nota, **campos
+    )
+
+
+class AgregadoDisciplinaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_usuario = CustomUser.objects.create_superuser(
+            'admin', 'admin@exemplo.com', 'senha', fullname='Admin', matricula='0'
+        )
+        cls.alunos = [criar_usuario(f'aluno{i}') for i in range(3)]
+        cls.calculo = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        cls.fisica = Disciplinas.objects.create(nome='Física I', codigo='FIS101')
+
+    def setUp(self):
+        self.avaliacoes = [
+            avaliacao_disciplina(self.calculo, aluno, nota)
+            for aluno, nota in zip(self.alunos, [4, 6, 8])
+        ]
+        AvaliacaoDisciplina.objects.bulk_create(self.avaliacoes)
+        agregados.registrar_avaliacoes_disciplinas(self.avaliacoes)
+        self.client.force_login(self.admin_usuario)
+
+    def _agregado(self, disciplina):
+        return AgregadoDisciplina.objects.filter(disciplina=disciplina).first()
+
+    def test_registro_incremental_bate_com_recalculo(self):
+        avaliacao = avaliacao_disciplina(self.fisica, self.alunos[0], 9)
+        avaliacao.save()
+        agregados.registrar_avaliacao_disciplina(avaliacao)
+        incrementais = {agregado.pk: agregado.medias() for agregado in AgregadoDisciplina.objects.all()}
+        agregados.recalcular_agregados_disciplinas()
+        recalculados = {agregado.pk: agregado.medias() for agregado in AgregadoDisciplina.objects.all()}
+
+        self.assertEqual(incrementais, recalculados)
+        self.assertEqual(self._agregado(self.calculo).total, 3)
+        self.assertEqual(self._agregado(self.calculo).medias()['material'], 6)
+
+    def test_admin_recalcula_ao_editar_e_excluir(self):
+        avaliacao = self.avaliacoes[0]
+        url = reverse('admin:core_avaliacaodisciplina_change', args=[avaliacao.pk])
+        # Editar a nota e mudar de disciplina recalcula as duas
+        resposta = self.client.post(url, {
+            'disciplina': self.fisica.pk, 'periodo': avaliacao.periodo, 'usuario': avaliacao.usuario_id,
+            'contribuicao': 10, 'equilibrio': 10, 'aplicacao': 10, 'material': 10, 'distribuicao': 10,
+            'comentario': '',
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(self._agregado(self.calculo).total, 2)
+        self.assertEqual(self._agregado(self.fisica).medias()['material'], 10)
+
+        resposta = self.client.post(
+            reverse('admin:core_avaliacaodisciplina_delete', args=[self.avaliacoes[1].pk]), {'post': 'yes'}
+        )
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(self._agregado(self.calculo).medias()['material'], 8)
+
+        resposta = self.client.post(reverse('admin:core_avaliacaodisciplina_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [self.avaliacoes[2].pk, avaliacao.pk],
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertIsNone(self._agregado(self.calculo))
+        self.assertIsNone(self._agregado(self.fisica))
+
+
+class AgregadoProfessorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.calculo = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        cls.fisica = Disciplinas.objects.create(nome='Física I', codigo='FIS101')
+        cls.professor = Professores.objects.create(nome='Ana')
+
+    def _medias(self, disciplina):
+        agregado = AgregadoProfessor.objects.filter(professor=self.professor, disciplina=disciplina).first()
+        return agregado.medias() if agregado else None
+
+    def test_criterios_nulos_nao_entram_na_media(self):
+        Avaliacao.objects.create(professor=self.professor, disciplina=self.calculo, dominio=10, clareza=6)
+        Avaliacao.objects.create(professor=self.professor, disciplina=self.calculo, dominio=6)
+
+        medias = self._medias(self.calculo)
+        self.assertEqual((medias['dominio'], medias['clareza'], medias['metodos']), (8, 6, 0))
+
+    def test_editar_e_excluir_recalculam_os_pares(self):
+        avaliacao = Avaliacao.objects.create(professor=self.professor, disciplina=self.calculo, dominio=10)
+        Avaliacao.objects.create(professor=self.professor, disciplina=self.calculo, dominio=4)
+
+        avaliacao.disciplina = self.fisica
+        avaliacao.save()
+        self.assertEqual(self._medias(self.calculo)['dominio'], 4)
+        self.assertEqual(self._medias(self.fisica)['dominio'], 10)
+
+        avaliacao.delete()
+        self.assertIsNone(self._medias(self.fisica))
+
+        incrementais = {(a.professor_id, a.disciplina_id): a.medias() for a in AgregadoProfessor.objects.all()}
+        agregados.recalcular_agregados_professores()
+        self.assertEqual(
+            incrementais,
+            {(a.professor_id, a.disciplina_id): a.medias() for a in AgregadoProfessor.objects.all()}
+        )
+
+
+class RankingTests(TestCase):
+    def test_poucas_notas_puxadas_para_a_media_global(self):
+        # Item 1: uma nota 10; item 2: dez notas 8; item 3: dez notas 5
+        ids = np.array([1] + [2] * 10 + [3] * 10)
+        notas = np.array([10.0] + [8.0] * 10 + [5.0] * 10)
+        estatisticas = ranking.calcular_estatisticas(ids, notas)
+
+        media_global = notas.mean()
+        self.assertAlmostEqual(estatisticas['media_bayesiana'][0], (10 * media_global + 10) / 11)
+        self.assertEqual(list(estatisticas['posicao']), [2, 1, 3])
+        self.assertEqual(list(estatisticas['percentil']), [50.0, 100.0, 0.0])
+        self.assertTrue(np.all(estatisticas['ic_inferior'] < estatisticas['media_bayesiana']))
+
+    def test_ranking_de_professores_ignora_criterios_nulos(self):
+        disciplina = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        ana, bruno = Professores.objects.create(nome='Ana'), Professores.objects.create(nome='Bruno')
+        Avaliacao.objects.create(professor=ana, disciplina=disciplina, dominio=9, clareza=None)
+        Avaliacao.objects.create(professor=bruno, disciplina=disciplina, dominio=3, clareza=5)
+        # Sem nenhum critério: fica de fora
+        Avaliacao.objects.create(professor=bruno, disciplina=disciplina)
+
+        self.assertEqual(ranking.calcular_ranking_professores(), 2)
+        posicoes = PosicaoRanking.objects.filter(tipo='professor').order_by('posicao')
+        self.assertEqual([(p.professor, p.total, p.media) for p in posicoes], [(ana, 1, 9.0), (bruno, 1, 4.0)])
+
+
+class CatalogoTests(TestCase):
+    def test_invalidacao_de_outro_processo_chega_pelo_banco(self):
+        Disciplinas.objects.create(nome='Cálculo I', codigo='MAT-101')
+        self.assertEqual([d.codigo for d in catalogo.buscar_disciplinas('calculo')], ['MAT-101'])
+
+        # Outro processo (um import, outro worker) grava e incrementa a versão
+        Disciplinas.objects.bulk_create([
+            Disciplinas(nome='Cálculo II', codigo='MAT-102', codigo_normalizado='MAT102', nome_normalizado='calculo ii')
+        ])
+        VersaoCompartilhada.objects.filter(chave=catalogo.VERSAO).update(versao='outro-processo')
+        self.assertEqual(len(catalogo.buscar_disciplinas('calculo')), 1)
+        with mock.patch.object(versoes, 'INTERVALO', 0):
+            self.assertEqual(len(catalogo.buscar_disciplinas('calculo')), 2)
+            self.assertEqual(catalogo.disciplina_por_codigo('mat 102').nome, 'Cálculo II')
+
+    def test_normalizar_disciplinas_antigas_e_relatar_repetidas(self):
+        Disciplinas.objects.bulk_create([
+            Disciplinas(nome='Cálculo I', codigo='MAT-101'),
+            Disciplinas(nome='Calculo 1', codigo='mat 101'),
+            Disciplinas(nome='Física I', codigo='FIS101'),
+        ])
+        # Como ficam as linhas quando a coluna é criada
+        Disciplinas.objects.update(codigo_normalizado=None, nome_normalizado='')
+        catalogo.invalidar_catalogo()
+        primeira, repetida, fisica = Disciplinas.objects.order_by('id')
+        self.assertEqual(catalogo.disciplina_por_codigo('fis101'), fisica)
+
+        saida = StringIO()
+        call_command('normalizar_catalogo', stdout=saida)
+        self.assertIn('3 disciplina(s) normalizada(s)', saida.getvalue())
+        self.assertIn(f'MAT101: #{primeira.id} MAT-101 - Cálculo I; #{repetida.id} mat 101 - Calculo 1', saida.getvalue())
+        self.assertEqual(
+            list(Disciplinas.objects.order_by('id').values_list('codigo_normalizado', 'nome_normalizado')),
+            [('MAT101', 'calculo i'), (None, 'calculo 1'), ('FIS101', 'fisica i')]
+        )
+        self.assertEqual(catalogo.disciplina_por_codigo('MAT101'), primeira)
+
+        repetida.codigo = 'MAT 101'
+        with self.assertRaisesMessage(ValidationError, 'O código equivale ao de "MAT-101 - Cálculo I"'):
+            repetida.full_clean()
+
+    def test_busca_por_codigo_nome_e_palavras(self):
+        Disciplinas.objects.create(nome='Cálculo I', codigo='MAT-101')
+        Disciplinas.objects.create(nome='Cálculo II', codigo='MAT-102')
+        Disciplinas.objects.create(nome='Física I', codigo='FIS101')
+        self.assertEqual(catalogo.disciplina_por_codigo('mat 101').nome, 'Cálculo I')
+        self.assertEqual(catalogo.disciplina_por_codigo('fisica i').codigo, 'FIS101')
+        self.assertIsNone(catalogo.disciplina_por_codigo('MAT103'))
+        self.assertEqual([d.codigo for d in catalogo.buscar_disciplinas('calculo')], ['MAT-101', 'MAT-102'])
+        self.assertEqual([d.codigo for d in catalogo.buscar_disciplinas('fis')], ['FIS101'])
+        self.assertEqual(catalogo.buscar_disciplinas('  '), [])
+
+
+class ImportacaoCatalogoTests(TestCase):
+    CSV = (
+        'codigo,nome,professor\n'
+        'MAT-1001,Cálculo I,Maria Silva\n'
+        'MAT-1001,Cálculo I,João Souza\n'
+        'FIS1001,Física I,\n'
+        ',Sem código,Maria Silva\n'
+    )
+
+    def test_importa_em_lotes_e_reimportar_atualiza(self):
+        resultado = importar_catalogo(StringIO(self.CSV), tamanho_lote=2)
+        self.assertEqual(resultado['linhas'], 4)
+        self.assertEqual(Disciplinas.objects.count(), 2)
+        calculo = catalogo.disciplina_por_codigo('mat1001')
+        self.assertEqual(
+            sorted(calculo.professores.values_list('nome', flat=True)), ['João Souza', 'Maria Silva']
+        )
+
+        # Mesmo código normalizado: atualiza o nome em vez de duplicar
+        importar_catalogo(StringIO('codigo;nome;professor\nmat 1001;Cálculo Diferencial;Maria Silva\n'), delimitador=';')
+        self.assertEqual(Disciplinas.objects.count(), 2)
+        self.assertEqual(catalogo.disciplina_por_codigo('MAT1001').nome, 'Cálculo Diferencial')
+        self.assertEqual(Professores.objects.count(), 2)
+
+    def test_colunas_obrigatorias(self):
+        with self.assertRaisesMessage(ErroImportacao, 'nome'):
+            importar_catalogo(StringIO('codigo,professor\nMAT1,Ana\n'))
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = criar_usuario('staff', is_staff=True)
+        cls.aluno = criar_usuario('aluno')
+        disciplina = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        for dia, aluno in ((1, cls.aluno), (20, cls.staff)):
+            avaliacao = avaliacao_disciplina(disciplina, aluno, 7)
+            avaliacao.save()
+            AvaliacaoDisciplina.objects.filter(pk=avaliacao.pk).update(
+                criado_em=datetime(2025, 3, dia, 12, tzinfo=dt_timezone.utc)
+            )
+        cls.url = reverse('exportar_avaliacoes_disciplinas')
+
+    def _linhas(self, resposta):
+        conteudo = b''.join(resposta.streaming_content)
+        if resposta['Content-Type'] == 'application/gzip':
+            conteudo = gzip.decompress(conteudo)
+        return conteudo.decode().splitlines()
+
+    def test_filtra_por_periodo_e_comprime(self):
+        self.client.force_login(self.staff)
+        resposta = self.client.get(self.url, {'de': '2025-03-10', 'gzip': '1'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="avaliacoes_disciplinas.csv.gz"')
+        linhas = self._linhas(resposta)
+        self.assertEqual(len(linhas), 2)
+        self.assertIn(',staff,', linhas[1])
+
+        resposta = self.client.get(self.url, {'formato': 'ndjson', 'ate': '2025-03-10'})
+        self.assertEqual(len(self._linhas(resposta)), 1)
+
+    def test_data_invalida_nao_exporta_tudo(self):
+        self.client.force_login(self.staff)
+        resposta = self.client.get(self.url, {'de': '10/03/2025'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_professores_filtrados_por_inicio_e_fim(self):
+        professor = Professores.objects.create(nome='Ana')
+        disciplina = Disciplinas.objects.get()
+        for dia in (1, 15, 28):
+            avaliacao = Avaliacao.objects.create(professor=professor, disciplina=disciplina, dominio=dia % 10)
+            Avaliacao.objects.filter(pk=avaliacao.pk).update(criado_em=datetime(2025, 3, dia, 12, tzinfo=dt_timezone.utc))
+        self.client.force_login(self.staff)
+        url = reverse('exportar_avaliacoes_professores')
+
+        linhas = self._linhas(self.client.get(url, {'inicio': '2025-03-10', 'fim': '2025-03-20'}))
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('2025-03-15', linhas[1])
+        self.assertEqual(len(self._linhas(self.client.get(url, {'de': '2025-03-10'}))), 3)
+        self.assertEqual(self.client.get(url, {'fim': '20/03/2025'}).status_code, 400)
+
+    def test_somente_staff(self):
+        self.client.force_login(self.aluno)
+        self.assertRedirects(self.client.get(self.url), reverse('dashboard'), fetch_redirect_response=False)
+
+
+class EstatisticasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alunos = [criar_usuario(f'aluno{i}') for i in range(3)]
+        cls.disciplina = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        cls.professor = Professores.objects.create(nome='Ana')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tendencia_da_disciplina_usa_o_periodo_informado(self):
+        # Avaliações de 2024.2 feitas em 2025 (lote no começo do semestre seguinte)
+        AvaliacaoDisciplina.objects.bulk_create([
+            avaliacao_disciplina(self.disciplina, self.alunos[0], 4, periodo='2024.2'),
+            avaliacao_disciplina(self.disciplina, self.alunos[1], 8, periodo='2024.2'),
+            avaliacao_disciplina(self.disciplina, self.alunos[2], 10, periodo='2025.1'),
+        ])
+        dados = estatisticas.estatisticas_disciplina(self.disciplina.id)
+        self.assertEqual(
+            [(linha['periodo'], linha['total'], linha['material']) for linha in dados['tendencia']],
+            [('2024.2', 2, 6), ('2025.1', 1, 10)]
+        )
+        self.assertEqual(dados['histogramas']['material'][8], 1)
+
+    def test_tendencia_do_professor_por_semestre_da_data(self):
+        for mes, nota in ((3, 6), (6, 8), (7, 10)):
+            avaliacao = Avaliacao.objects.create(professor=self.professor, disciplina=self.disciplina, dominio=nota)
+            Avaliacao.objects.filter(pk=avaliacao.pk).update(criado_em=datetime(2025, mes, 15, tzinfo=dt_timezone.utc))
+        # Sem data (anterior ao campo): fica fora da tendência
+        antiga = Avaliacao.objects.create(professor=self.professor, disciplina=self.disciplina, dominio=1)
+        Avaliacao.objects.filter(pk=antiga.pk).update(criado_em=None)
+
+        tendencia = estatisticas.estatisticas_professor(self.professor.id)['tendencia']
+        self.assertEqual([(linha['periodo'], linha['dominio']) for linha in tendencia], [('2025.1', 7), ('2025.2', 10)])
+
+    def test_recalculo_completo_invalida_o_cache(self):
+        avaliacao = avaliacao_disciplina(self.disciplina, self.alunos[0], 5)
+        avaliacao.save()
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['tendencia'][0]['total'], 1)
+
+        # Mudança por fora do site (import, SQL), corrigida com recalcular_agregados
+        AvaliacaoDisciplina.objects.bulk_create([avaliacao_disciplina(self.disciplina, self.alunos[1], 9)])
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['tendencia'][0]['total'], 1)
+        call_command('recalcular_agregados', stdout=StringIO())
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['tendencia'][0]['total'], 2)
+
+    @mock.patch.object(versoes, 'INTERVALO', 60)
+    def test_avaliacao_em_outro_processo_invalida_pelo_banco(self):
+        avaliacao_disciplina(self.disciplina, self.alunos[0], 5).save()
+        Avaliacao.objects.create(professor=self.professor, disciplina=self.disciplina, dominio=5)
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']['material'][5], 1)
+        self.assertEqual(estatisticas.estatisticas_professor(self.professor.id)['histogramas']['dominio'][5], 1)
+
+        # Outro processo, com o próprio cache e as próprias versões lidas, grava e invalida
+        lidas = dict(versoes._lidas)
+        with mock.patch.object(estatisticas, 'cache', LocMemCache('outro-processo', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                avaliacao = avaliacao_disciplina(self.disciplina, self.alunos[1], 5)
+                avaliacao.save()
+                agregados.registrar_avaliacao_disciplina(avaliacao)
+                agregados.registrar_avaliacao_professor(
+                    Avaliacao.objects.create(professor=self.professor, disciplina=self.disciplina, dominio=5)
+                )
+        # De volta a este processo: as versões lidas antes valem até o intervalo
+        versoes._lidas.clear()
+        versoes._lidas.update(lidas)
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']['material'][5], 1)
+
+        # Passado o intervalo, a versão é relida do banco
+        versoes._lidas.clear()
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']['material'][5], 2)
+        self.assertEqual(estatisticas.estatisticas_professor(self.professor.id)['histogramas']['dominio'][5], 2)
+        self.assertEqual(
+            estatisticas.estatisticas_professor(self.professor.id, self.disciplina.id)['histogramas']['dominio'][5], 2
+        )
+
+    def test_histogramas_em_cache_ate_nova_avaliacao(self):
+        avaliacao_disciplina(self.disciplina, self.alunos[0], 5).save()
+        histogramas = estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']
+        self.assertEqual(histogramas['material'][5], 1)
+
+        nova = avaliacao_disciplina(self.disciplina, self.alunos[1], 9)
+        nova.save()
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']['material'][9], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            agregados.registrar_avaliacao_disciplina(nova)
+        self.assertEqual(estatisticas.estatisticas_disciplina(self.disciplina.id)['histogramas']['material'][9], 1)
+
+
+class PeriodoAvaliacaoTests(TestCase):
+    NOTAS = {'contribuicao': 8, 'equilibrio': 7, 'aplicacao': 9, 'material': 6, 'distribuicao': 8}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = criar_usuario('aluno')
+        cls.outro = criar_usuario('outro')
+        cls.calculo = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        cls.fisica = Disciplinas.objects.create(nome='Física I', codigo='FIS101')
+
+    def setUp(self):
+        self.client.force_login(self.aluno)
+
+    def test_uma_avaliacao_por_periodo(self):
+        url = reverse('avalie_disciplina', args=['MAT101'])
+        self.assertEqual(self.client.post(url, self.NOTAS).status_code, 302)
+        resposta = self.client.post(url, self.NOTAS, follow=True)
+        self.assertContains(resposta, 'Você já avaliou esta disciplina neste período.')
+
+        avaliacao = AvaliacaoDisciplina.objects.get()
+        self.assertEqual(avaliacao.periodo, periodo_atual())
+        self.assertEqual(AgregadoDisciplina.objects.get(disciplina=self.calculo).total, 1)
+
+    def test_envio_duplo_simultaneo_nao_gera_erro_500(self):
+        url = reverse('avalie_disciplina', args=['MAT101'])
+        self.client.post(url, self.NOTAS)
+        # A outra requisição grava entre o exists() e o save()
+        with mock.patch('django.db.models.query.QuerySet.exists', return_value=False):
+            resposta = self.client.post(url, self.NOTAS)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Você já avaliou esta disciplina neste período.')
+        self.assertEqual(AgregadoDisciplina.objects.get(disciplina=self.calculo).total, 1)
+
+    def test_lote_preenche_o_periodo_e_recusa_repetidas(self):
+        dados = {
+            'form-TOTAL_FORMS': 2, 'form-INITIAL_FORMS': 0, 'form-MIN_NUM_FORMS': 1, 'form-MAX_NUM_FORMS': 10,
+            'form-0-disciplina_codigo': 'mat-101', 'form-1-disciplina_codigo': 'FIS101',
+            **{f'form-{i}-{campo}': nota for i in range(2) for campo, nota in self.NOTAS.items()},
+        }
+        url = reverse('avaliar_disciplinas_lote')
+        self.assertEqual(self.client.post(url, dados).status_code, 302)
+        self.assertEqual(set(AvaliacaoDisciplina.objects.values_list('periodo', flat=True)), {periodo_atual()})
+
+        resposta = self.client.post(url, dados)
+        self.assertContains(resposta, 'Você já avaliou neste período: FIS101, MAT101.')
+        self.assertEqual(AvaliacaoDisciplina.objects.count(), 2)
+
+    def test_preencher_periodos_antigos_mantem_a_mais_recente(self):
+        datas = [datetime(2024, 3, 1), datetime(2024, 5, 1), datetime(2024, 9, 1), datetime(2024, 5, 2)]
+        avaliacoes = [
+            avaliacao_disciplina(self.calculo, self.aluno, 2, periodo=None),
+            avaliacao_disciplina(self.calculo, self.aluno, 6, periodo=None),
+            avaliacao_disciplina(self.calculo, self.aluno, 8, periodo=None),
+            avaliacao_disciplina(self.calculo, self.outro, 10, periodo=None),
+        ]
+        AvaliacaoDisciplina.objects.bulk_create(avaliacoes)
+        for avaliacao, data in zip(avaliacoes, datas):
+            AvaliacaoDisciplina.objects.filter(pk=avaliacao.pk).update(criado_em=data.replace(tzinfo=dt_timezone.utc))
+        agregados.recalcular_agregados_disciplinas()
+
+        saida = StringIO()
+        call_command('preencher_periodos', '--simular', stdout=saida)
+        self.assertIn(f'4 avaliação(ões) sem período; 1 repetida(s) seria(m) removida(s).\nIds: {avaliacoes[0].pk}', saida.getvalue())
+        self.assertEqual(AvaliacaoDisciplina.objects.count(), 4)
+
+        call_command('preencher_periodos', stdout=StringIO())
+        self.assertEqual(
+            list(AvaliacaoDisciplina.objects.order_by('id').values_list('id', 'periodo')),
+            [(avaliacoes[1].pk, '2024.1'), (avaliacoes[2].pk, '2024.2'), (avaliacoes[3].pk, '2024.1')]
+        )
+        self.assertEqual(AgregadoDisciplina.objects.get(disciplina=self.calculo).total, 3)
+
+
+class PainelAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = criar_usuario('staff', is_staff=True)
+        cls.usuarios = [criar_usuario(f'aluno{i}') for i in range(5)]
+        Expurgo.objects.create(tipo='usuario', objeto_id=cls.usuarios[2].id, descricao='aluno2')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def test_lista_paginada_por_cursor_sem_removidos(self):
+        url = reverse('admin_panel_lista', args=['usuarios'])
+        vistos, apos = [], None
+        while True:
+            dados = self.client.get(url, {'limite': 2, **({'apos': apos} if apos else {})}).json()
+            vistos.extend(usuario['username'] for usuario in dados['resultados'])
+            apos = dados['proximo']
+            if apos is None:
+                break
+        self.assertEqual(vistos, ['aluno4', 'aluno3', 'aluno1', 'aluno0', 'staff'])
+
+        dados = self.client.get(url, {'q': 'ALUNO1', 'apos': 'lixo'}).json()
+        self.assertEqual([usuario['username'] for usuario in dados['resultados']], ['aluno1'])
+
+    def test_estatisticas_em_cache_ate_invalidar(self):
+        self.assertEqual(painel.estatisticas_painel()['total_usuarios'], 6)
+        criar_usuario('novo')
+        self.assertEqual(painel.estatisticas_painel()['total_usuarios'], 6)
+        painel.invalidar_estatisticas_painel()
+        self.assertEqual(painel.estatisticas_painel()['total_usuarios'], 7)
+
+    def test_lista_somente_staff(self):
+        self.client.force_login(self.usuarios[0])
+        self.assertEqual(self.client.get(reverse('admin_panel_lista', args=['canais'])).status_code, 403)
+
+
+class ModeracaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = criar_usuario('staff', is_staff=True)
+        cls.aluno = criar_usuario('aluno')
+        cls.monitor = Cargo.objects.create(nome='Monitor', criado_por=cls.staff)
+
+    def test_aprovar_chats_em_lote(self):
+        pedidos = [
+            ChatRequest.objects.create(nome=f'Canal {i}', tipo='restrito', solicitado_por=self.aluno)
+            for i in range(3)
+        ]
+        pedidos[0].cargos_permitidos.add(self.monitor)
+        ChatRequest.objects.filter(pk=pedidos[2].pk).update(status='recusado')
+
+        ids = [pedido.id for pedido in pedidos]
+        self.assertEqual(moderacao.aprovar_chat_requests(ids, self.staff), 2)
+        # Aprovar de novo não recria os canais
+        self.assertEqual(moderacao.aprovar_chat_requests(ids, self.staff), 0)
+
+        canal = Canal.objects.get(nome='Canal 0')
+        self.assertEqual(list(canal.cargos_permitidos.all()), [self.monitor])
+        self.assertEqual(MembroCanal.objects.get(canal=canal).papel, 'admin')
+        self.assertFalse(Canal.objects.filter(nome='Canal 2').exists())
+
+    def test_cargo_com_nome_existente_continua_pendente(self):
+        pedidos = [
+            CargoRequest.objects.create(nome=nome, solicitado_por=self.aluno)
+            for nome in ('Monitor', 'Tutor', 'Tutor')
+        ]
+        aprovadas, ignoradas = moderacao.aprovar_cargo_requests([pedido.id for pedido in pedidos], self.staff)
+        self.assertEqual((aprovadas, ignoradas), (1, 2))
+        self.assertEqual(
+            list(CargoRequest.objects.order_by('id').values_list('status', flat=True)),
+            ['pendente', 'aprovado', 'pendente']
+        )
+
+        recusadas = moderacao.recusar_cargo_requests([pedidos[0].id], self.staff, 'Já existe')
+        self.assertEqual(recusadas, 1)
+        self.assertEqual(CargoRequest.objects.get(pk=pedidos[0].pk).motivo_recusa, 'Já existe')
+
+
+class ExpurgoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = criar_usuario('staff', is_staff=True)
+        cls.aluno = criar_usuario('aluno')
+        cls.canal = Canal.objects.create(nome='Geral', criado_por=cls.aluno)
+        MembroCanal.objects.create(usuario=cls.aluno, canal=cls.canal)
+        MembroCanal.objects.create(usuario=cls.staff, canal=cls.canal)
+        for i in range(5):
+            cls.canal.mensagens.create(autor=cls.aluno, conteudo=f'm{i}')
+        cls.canal.mensagens.create(autor=cls.staff, conteudo='do staff')
+        cls.disciplina = Disciplinas.objects.create(nome='Cálculo I', codigo='MAT101')
+        avaliacoes = [
+            avaliacao_disciplina(cls.disciplina, cls.aluno, 2), avaliacao_disciplina(cls.disciplina, cls.staff, 8)
+        ]
+        AvaliacaoDisciplina.objects.bulk_create(avaliacoes)
+        agregados.registrar_avaliacoes_disciplinas(avaliacoes)
+
+    def test_usuario_some_na_hora_e_historico_sai_em_lotes(self):
+        expurgo.agendar_exclusao_usuario(self.aluno, self.staff)
+        self.assertFalse(CustomUser.objects.get(pk=self.aluno.pk).is_active)
+        self.assertNotIn('aluno', [usuario.username for usuario in painel.listar_usuarios()[0]])
+
+        progresso = []
+        self.assertEqual(expurgo.executar_pendentes(tamanho_lote=2, progresso=progresso.append), 1)
+        registro = Expurgo.objects.get(tipo='usuario', objeto_id=self.aluno.pk)
+        self.assertEqual((registro.status, registro.removidos), ('concluido', registro.total))
+        self.assertGreater(len(progresso), 3)
+
+        self.assertFalse(CustomUser.objects.filter(pk=self.aluno.pk).exists())
+        self.assertEqual(list(Mensagem.objects.values_list('conteudo', flat=True)), ['do staff'])
+        # Canal criado por ele fica, sem criador
+        self.assertIsNone(Canal.objects.get(pk=self.canal.pk).criado_por)
+        agregado = AgregadoDisciplina.objects.get(disciplina=self.disciplina)
+        self.assertEqual((agregado.total, agregado.medias()['material']), (1, 8))
+
+    def test_canal_removido_apaga_mensagens(self):
+        expurgo.agendar_exclusao_canal(self.canal, self.staff)
+        self.assertFalse(Canal.objects.get(pk=self.canal.pk).ativo)
+        expurgo.executar_pendentes()
+        self.assertFalse(Canal.objects.filter(pk=self.canal.pk).exists())
+        self.assertFalse(Mensagem.objects.exists())
+        self.assertTrue(CustomUser.objects.filter(pk=self.aluno.pk).exists())
+
+
+class ProvisionamentoTests(TestCase):
+    def test_cadastra_turma_e_rejeita_repetidos(self):
+        existente = criar_usuario('2026000')
+        calouro = Cargo.objects.create(nome='Calouro', criado_por=existente)
+        arquivo = StringIO(
+            'matricula,fullname,email\n'
+            '2026001,Ana Souza,Ana@Exemplo.com\n'
+            '2026002,Bruno Lima,bruno@exemplo.com\n'
+            '2026002,Bruno Lima,outro@exemplo.com\n'
+            '2026003,Carla Dias,2026000@exemplo.com\n'
+            '2026004,,dani@exemplo.com\n'
+        )
+        saida = StringIO()
+        resultado = provisionar_usuarios(arquivo, saida=saida, cargo=calouro, tamanho_lote=2, processos=1)
+
+        self.assertEqual((resultado['linhas'], resultado['criados']), (5, 2))
+        self.assertEqual(resultado['rejeitados'], [
+            'linha 4: matricula repetido no arquivo',
+            'linha 5: email já cadastrado',
+            'linha 6: matrícula, nome e e-mail são obrigatórios',
+        ])
+        credenciais = list(csv.DictReader(StringIO(saida.getvalue())))
+        self.assertEqual([linha['username'] for linha in credenciais], ['2026001', '2026002'])
+        ana = CustomUser.objects.get(username='2026001')
+        self.assertEqual(ana.email, 'ana@exemplo.com')
+        self.assertTrue(ana.check_password(credenciais[0]['senha']))
+        self.assertEqual(list(ana.usuario_cargos.values_list('cargo__nome', flat=True)), ['Calouro'])
+
+
+class EmailFilaTests(TestCase):
+    def test_envia_e_apaga_o_corpo(self):
+        email = emails.enfileirar_email('Código', 'Seu código é 123456', ['ana@exemplo.com'])
+        self.assertEqual(emails.enviar_pendentes(), (1, 0))
+        self.assertEqual(mail.outbox[0].body, 'Seu código é 123456')
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.corpo), ('enviado', ''))
+        self.assertIsNotNone(email.enviado_em)
+
+    def test_falha_reagenda_e_desiste_sem_guardar_o_corpo(self):
+        email = emails.enfileirar_email('Código', 'Seu código é 123456', ['ana@exemplo.com'])
+        conexao = mock.Mock()
+        conexao.open.side_effect = OSError('fora do ar')
+        self.assertEqual(emails.enviar_pendentes(conexao=conexao), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), ('pendente', 1))
+        self.assertGreater(email.proxima_tentativa, timezone.now())
+        self.assertEqual(email.corpo, 'Seu código é 123456')
+
+        EmailPendente.objects.filter(pk=email.pk).update(
+            tentativas=emails.MAX_TENTATIVAS - 1, proxima_tentativa=timezone.now()
+        )
+        emails.enviar_pendentes(conexao=conexao)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.corpo), ('falhou', ''))
+
+
+@mock.patch.object(autenticacao, '_pool_hash', lambda: None)
+class LoginTests(TestCase):
+    # Sem o pool de processos: o hash roda no executor padrão de threads
+
+    def setUp(self):
+        self.usuario = criar_usuario('ana')
+
+    def test_hash_desatualizado_e_trocado_sem_perder_a_sessao(self):
+        CustomUser.objects.filter(pk=self.usuario.pk).update(password=make_password('senha', hasher='pbkdf2_sha1'))
+        resposta = self.client.post(reverse('logando'), {'username': 'ana', 'password': 'senha'})
+        self.assertRedirects(resposta, reverse('dashboard'), fetch_redirect_response=False)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$'))
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+    @mock.patch.object(autenticacao, 'BALDE_USERNAME', (2, 1 / 3600))
+    def test_rajada_de_tentativas_recebe_429(self):
+        for _ in range(2):
+            resposta = self.client.post(reverse('logando'), {'username': 'ana', 'password': 'errada'})
+            self.assertEqual(resposta.status_code, 200)
+        resposta = self.client.post(reverse('logando'), {'username': 'ana', 'password': 'senha'})
+        self.assertEqual(resposta.status_code, 429)
+
+    @mock.patch.object(autenticacao, 'BALDE_IP', (1, 1 / 3600))
+    @mock.patch.object(autenticacao, 'CABECALHO_IP', 'HTTP_X_FORWARDED_FOR')
+    def test_balde_por_ip_do_cliente_compartilhado_no_banco(self):
+        url = reverse('logando')
+        dados = {'username': 'ana', 'password': 'errada'}
+        # Mesmo proxy (REMOTE_ADDR), clientes diferentes; o primeiro endereço é forjável
+        self.assertEqual(self.client.post(url, dados, HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.1').status_code, 200)
+        self.assertEqual(self.client.post(url, dados, HTTP_X_FORWARDED_FOR='10.0.0.2').status_code, 200)
+        # Outro processo tem outro cache: o saldo não pode estar nele
+        cache.clear()
+        self.assertEqual(self.client.post(url, dados, HTTP_X_FORWARDED_FOR='2.2.2.2, 10.0.0.1').status_code, 429)
+        self.assertEqual(BaldeFichas.objects.get(chave='login:ip:10.0.0.1').fichas, 0)
+
+    def test_fichas_repostas_com_o_tempo(self):
+        with mock.patch.object(autenticacao.time, 'time', return_value=1000):
+            self.assertEqual([autenticacao.consumir_ficha('teste', 2, 1) for _ in range(3)], [True, True, False])
+        with mock.patch.object(autenticacao.time, 'time', return_value=1001.5):
+            self.assertEqual([autenticacao.consumir_ficha('teste', 2, 1) for _ in range(2)], [True, False])
+        # Cheio de novo: o balde é apagado quando outro é criado
+        with mock.patch.object(autenticacao.time, 'time', return_value=2000):
+            self.assertTrue(autenticacao.consumir_ficha('outro', 2, 1))
+        self.assertEqual(list(BaldeFichas.objects.values_list('chave', flat=True)), ['outro'])
+
+    @mock.patch.object(autenticacao, 'ESPERA_MAXIMA', 0.05)
+    @mock.patch.object(autenticacao, '_semaforo', threading.BoundedSemaphore(1))
+    def test_limite_de_concorrencia_vale_para_o_processo(self):
+        # Um login em andamento em outro loop de eventos (outra requisição WSGI)
+        autenticacao._semaforo.acquire()
+        with self.assertRaises(autenticacao.LoginRecusado) as erro:
+            async_to_sync(autenticacao.averificar_senha)('senha', '')
+        self.assertEqual(erro.exception.status, 503)
+        autenticacao._semaforo.release()
+        self.assertEqual(async_to_sync(autenticacao.averificar_senha)('senha', ''), (False, None))
+
+
+class PerfilProducaoTests(TestCase):
+    def test_pragmas_aplicados_na_conexao(self):
+        # transaction_mode e init_command do SQLite exigem Django 5.1
+        with tempfile.TemporaryDirectory() as pasta:
+            conexoes = ConnectionHandler({'default': {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(Path(pasta) / 'producao.sqlite3'),
+                **settings.SQLITE_PRODUCAO,
+            }})
+            try:
+                with conexoes['default'].cursor() as cursor:
+                    pragmas = {
+                        nome: cursor.execute(f'PRAGMA {nome}').fetchone()[0]
+                        for nome in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store')
+                    }
+            finally:
+                conexoes.close_all()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'temp_store': 2})
+
+    def test_benchmark_compara_os_dois_perfis(self):
+        saida = StringIO()
+        call_command(
+            'benchmark_banco', leitores=1, escritores=1, segundos=0.2, linhas=100, stdout=saida
+        )
+        self.assertIn('Perfil padrao:', saida.getvalue())
+        self.assertIn('Perfil producao:', saida.getvalue())
+
+
+class CommitEmGrupoTests(TransactionTestCase):
+    # TransactionTestCase: dentro do atomic do TestCase criar_mensagem
+    # cai no save() e a thread gravadora não enxergaria os dados do teste
+
+    def setUp(self):
+        self.autor = criar_usuario('autor')
+        self.canal = Canal.objects.create(nome='Geral', criado_por=self.autor)
+        MembroCanal.objects.create(usuario=self.autor, canal=self.canal)
+
+    def test_junta_as_mensagens_num_lote(self):
+        gravador = commit_em_grupo.GravadorEmGrupo(tamanho_lote=10, espera=0.2)
+        bulk_create = QuerySet.bulk_create
+        with mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=bulk_create) as bulk:
+            futuros = [
+                gravador.gravar(Mensagem(canal=self.canal, autor=self.autor, conteudo=f'oi {i}'))
+                for i in range(3)
+            ]
+            mensagens = [futuro.result(timeout=5) for futuro in futuros]
+        self.assertTrue(all(mensagem.pk for mensagem in mensagens))
+        self.assertEqual(Mensagem.objects.count(), 3)
+        self.assertEqual(bulk.call_count, 1)
+
+    def test_mensagem_invalida_nao_derruba_o_lote(self):
+        gravador = commit_em_grupo.GravadorEmGrupo(tamanho_lote=10, espera=0.2)
+        boa = gravador.gravar(Mensagem(canal=self.canal, autor=self.autor, conteudo='oi'))
+        ruim = gravador.gravar(Mensagem(canal=self.canal, autor=self.autor, conteudo=None))
+        self.assertEqual(boa.result(timeout=5).conteudo, 'oi')
+        with self.assertRaises(IntegrityError):
+            ruim.result(timeout=5)
+        self.assertEqual(Mensagem.objects.count(), 1)
+
+    def test_criar_mensagem_checa_permissao(self):
+        estranho = criar_usuario('estranho')
+        privado = Canal.objects.create(nome='Privado', tipo='privado', criado_por=self.autor)
+        with self.assertRaises(ValidationError):
+            commit_em_grupo.criar_mensagem(privado, estranho, 'oi', em_grupo=True)
+        mensagem = commit_em_grupo.criar_mensagem(self.canal, self.autor, 'oi', em_grupo=True)
+        self.assertTrue(Mensagem.objects.filter(pk=mensagem.pk, conteudo='oi').exists())
+
+
+@mock.patch.dict(shards._processo, {'pid': None, 'numero': None})
+@mock.patch.object(shards, '_alocacao', {'versao': None, 'canais': {}})
+@mock.patch.object(shards, 'SHARDS', ['mensagens_0', 'mensagens_1'])
+class ShardsTests(TransactionTestCase):
+    # TransactionTestCase: a reserva do número só vale depois do commit
+
+    def _numero(self, id_mensagem):
+        return (id_mensagem >> 12) & (shards.MAX_PROCESSOS - 1)
+
+    def test_numero_do_processo_reservado_no_banco(self):
+        with mock.patch.object(shards.os, 'getpid', return_value=4242):
+            primeiro, segundo = shards.novo_id(), shards.novo_id()
+        # Mesmos 10 bits de pid (4242 & 0x3FF == 146), mas outro processo
+        with mock.patch.object(shards.os, 'getpid', return_value=146):
+            terceiro = shards.novo_id()
+
+        self.assertLess(primeiro, segundo)
+        self.assertEqual(self._numero(primeiro), self._numero(segundo))
+        self.assertNotEqual(self._numero(primeiro), self._numero(terceiro))
+        self.assertEqual(list(ProcessoGeradorId.objects.values_list('pid', flat=True).order_by('id')), [4242, 146])
+
+    def test_reserva_numa_transacao_so_fica_depois_do_commit(self):
+        with transaction.atomic():
+            shards.novo_id()
+            self.assertIsNone(shards._processo['pid'])
+        self.assertIsNotNone(shards._processo['pid'])
+
+        shards._processo['pid'] = None
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            shards.novo_id()
+            raise RuntimeError
+        self.assertIsNone(shards._processo['pid'])
+
+    @mock.patch.object(versoes, 'INTERVALO', 60)
+    def test_alocacao_muda_com_a_versao_compartilhada(self):
+        autor = criar_usuario('autor')
+        canal = Canal.objects.create(nome='Geral', criado_por=autor)
+        original = shards.SHARDS[canal.id % 2]
+        outro = shards.SHARDS[(canal.id + 1) % 2]
+        self.assertEqual(shards.banco_do_canal(canal.id), original)
+
+        ShardCanal.objects.create(canal=canal, banco=outro)
+        self.assertEqual(shards.banco_do_canal(canal.id), original)
+        # Outro processo (o rebalanceamento) renova a versão
+        VersaoCompartilhada.objects.update_or_create(chave=shards.VERSAO, defaults={'versao': 'nova'})
+        versoes._lidas.clear()
+        self.assertEqual(shards.banco_do_canal(canal.id), outro)
+
+
+@mock.patch.dict(shards._processo, {'pid': None, 'numero': None})
+@mock.patch.object(shards, '_alocacao', {'versao': None, 'canais': {}})
+class ShardRealTests(TransactionTestCase):
+    # Um shard de verdade: banco SQLite temporário só com as tabelas de mensagens.
+    # O alias é criado aqui, então o runner não o conhece ao montar os bancos
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pasta = tempfile.TemporaryDirectory()
+        connections.settings['mensagens_1'] = {
+            **connections.settings['default'], 'NAME': str(Path(cls.pasta.name) / 'mensagens_1.sqlite3')
+        }
+        cls.databases = {'default', 'mensagens_1'}
+        super().setUpClass()
+        # Até o fim da classe: o flush entre os testes também consulta o roteador
+        cls.enterClassContext(mock.patch.object(shards, 'SHARDS', ['mensagens_1']))
+        call_command('migrate', database='mensagens_1', run_syncdb=True, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['mensagens_1'].close()
+        del connections['mensagens_1']
+        del connections.settings['mensagens_1']
+        cls.pasta.cleanup()
+
+    def test_mensagem_do_shard_na_timeline_e_na_exportacao(self):
+        staff = criar_usuario('staff', is_staff=True)
+        autor = criar_usuario('autor')
+        canal = Canal.objects.create(nome='Geral', criado_por=autor)
+        Seguidor.objects.create(seguidor=staff, seguido=autor)
+
+        mensagem = commit_em_grupo.criar_mensagem(canal, autor, 'no shard', em_grupo=False)
+        self.assertEqual(timeline.distribuir_mensagem(mensagem), 1)
+        self.assertEqual(mensagem._state.db, 'mensagens_1')
+        self.assertFalse(Mensagem.objects.using('default').filter(pk=mensagem.pk).exists())
+
+        lidas = timeline.timeline_usuario(staff)[0]
+        self.assertEqual([(lida.pk, lida.autor.username, lida.canal.nome) for lida in lidas], [(mensagem.pk, 'autor', 'Geral')])
+
+        # O autor fica no default: a exportação não pode fazer JOIN no shard
+        self.client.force_login(staff)
+        resposta = self.client.get(reverse('exportar_mensagens_canal', args=[canal.id]))
+        linhas = list(csv.reader(b''.join(resposta.streaming_content).decode().splitlines()))
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[1][:3], [str(mensagem.pk), 'autor', 'no shard'])
+
+
+class AuditoriaConsultasTests(TestCase):
+    def _plano(self, consulta):
+        sql, parametros = consulta.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+            return ' | '.join(linha[-1] for linha in cursor.fetchall())
+
+    def test_problemas_ignora_indices_e_subconsultas(self):
+        plano = [
+            (2, 0, 0, 'SCAN core_mensagem'),
+            (3, 0, 0, 'SCAN core_canal USING INDEX core_canal_criado_idx'),
+            (4, 0, 0, 'SCAN subconsulta'),
+            (5, 0, 0, 'USE TEMP B-TREE FOR ORDER BY'),
+        ]
+        self.assertEqual(list(_problemas(plano, {'core_mensagem', 'core_canal'})), [
+            ('core_mensagem', 'varredura completa: SCAN core_mensagem'),
+            (None, 'B-tree temporário: USE TEMP B-TREE FOR ORDER BY'),
+        ])
+
+    def test_indices_compostos_usados(self):
+        plano = self._plano(Mensagem.objects.filter(canal_id=1).order_by('created_at'))
+        self.assertIn('mensagem_canal_criada_idx', plano)
+        self.assertNotIn('TEMP B-TREE', plano)
+        plano = self._plano(ChatRequest.objects.filter(status='pendente').order_by('created_at'))
+        self.assertIn('chatrequest_status_idx', plano)
+        plano = self._plano(Evento.objects.filter(ativo=True, data__range=(date(2026, 3, 1), date(2026, 3, 31))))
+        self.assertIn('evento_ativo_data_idx', plano)
+
+    def test_comando_audita_as_rotas_sem_gravar(self):
+        admin_usuario = criar_usuario('root', is_staff=True, is_superuser=True)
+        popular('aud', admin_usuario)
+        mensagens = Mensagem.objects.count()
+        saida = StringIO()
+        call_command('auditar_consultas', views=['dashboard', 'chat'], host='testserver', stdout=saida)
+        self.assertRegex(saida.getvalue(), r'dashboard /dashboard/ \[200\]: \d+ consulta\(s\)')
+        self.assertRegex(saida.getvalue(), r'chat /chat/\d+/ \[200\]')
+        self.assertNotIn('erro', saida.getvalue())
+        self.assertEqual(Mensagem.objects.count(), mensagens)
+
+
+class ChangelistAdminTests(TestCase):
+    # Máximo de consultas por página de listagem no admin. O número não pode
+    # depender da quantidade de linhas exibidas (sem N+1).
+    ORCAMENTO_CONSULTAS = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_usuario = CustomUser.objects.create_superuser(
+            'admin', 'admin@exemplo.com', 'senha', fullname='Admin', matricula='0'
+        )
+        popular('a', cls.admin_usuario)
+
+    def setUp(self):
+        self.client.force_login(self.admin_usuario)
+
+    def _consultas_changelist(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200, url)
+        return [consulta['sql'] for consulta in contexto.captured_queries]
+
+    def test_changelists_sem_n_mais_1(self):
+        modelos = [modelo for modelo in admin.site._registry if modelo._meta.app_label == 'core']
+        urls = {
+            modelo: reverse(f'admin:core_{modelo._meta.model_name}_changelist')
+            for modelo in modelos
+        }
+
+        antes = {modelo: self._consultas_changelist(url) for modelo, url in urls.items()}
+        for prefixo in 'bcdef':
+            popular(prefixo, self.admin_usuario)
+
+        for modelo, url in urls.items():
+            with self.subTest(modelo=modelo.__name__):
+                depois = self._consultas_changelist(url)
+                self.assertEqual(
+                    len(depois), len(antes[modelo]),
+                    'Consultas cresceram com o número de linhas:\n' + '\n'.join(depois)
+                )
+                self.assertLessEqual(len(depois), self.ORCAMENTO_CONSULTAS, '\n'.join(depois))
+
+
+# Rota: (máximo de consultas somando todos os bancos, máximo em ms) com o cache vazio,
+# nos dados de DadosSinteticosTestCase e sem shards. As consultas são as de
+# hoje; quem aumentar precisa justificar aqui. Os tempos têm folga para
+# máquinas lentas. As rotas que usam o catálogo ou as estatísticas contam a
+# leitura de cada versão compartilhada (core/versoes.py).
+ORCAMENTOS = {
+    'logando': (0, 300),
+    'registro': (0, 300),
+    'esqueci_senha': (0, 300),
+    'dashboard': (17, 1500),
+    'perfil': (4, 500),
+    'busca_usuarios': (4, 500),
+    # + as mensagens das entradas; os canais inacessíveis vão como subconsulta
+    'timeline': (5, 500),
+    'criar_canal': (3, 500),
+    'chat': (7, 1000),
+    'criar_cargo': (2, 500),
+    'admin_panel': (10, 1000),
+    'admin_panel_lista': (3, 500),
+    'exportar_avaliacoes_disciplinas': (4, 500),
+    'exportar_avaliacoes_professores': (4, 500),
+    'exportar_mensagens_canal': (4, 500),
+    'avaliacao_disciplina': (3, 500),
+    'avalie_disciplina': (4, 500),
+    'avaliar_disciplinas_lote': (2, 500),
+    'avaliacao_professores': (3, 500),
+    'estatisticas_disciplina': (11, 500),
+    'estatisticas_professor': (11, 500),
+    'ranking_disciplinas': (4, 500),
+    'ranking_professores': (4, 500),
+    'telaavdisciplina1': (0, 300),
+    'telaavdisciplina2': (0, 300),
+    'telaavdisciplina3': (0, 300),
+    'telamenu': (0, 300),
+    'listar_eventos': (4, 500),
+    'criar_evento': (2, 500),
+    'editar_evento': (3, 500),
+}
+
+# Os templates destas views ainda não existem
+SEM_ORCAMENTO = {'editar_perfil', 'alterar_senha'}
+
+
+def resumo_consultas(consultas):
+    # Consultas iguais a menos dos valores viram uma linha com a contagem; as
+    # repetidas (cara de N+1) vêm primeiro, marcadas com "+"
+    padroes = Counter(re.sub(r"'[^']*'|\b\d+\b", '?', consulta['sql']) for consulta in consultas)
+    return '\n'.join(
+        f"{'+' if total > 1 else ' '} {total}x {sql}"
+        for sql, total in sorted(padroes.items(), key=lambda item: -item[1])
+    )
+
+
+class SinteticoTimelineTests(TestCase):
+    QUANTIDADES = {'usuarios': 60, 'canais': 12, 'membros': 150, 'mensagens': 400, 'seguidores': 300}
+
+    def _esperadas(self):
+        # O que distribuir_mensagem gravaria para cada mensagem
+        esperadas = set()
+        for mensagem in Mensagem.objects.select_related('canal'):
+            seguidores_ids = Seguidor.objects.filter(seguido_id=mensagem.autor_id).values_list('seguidor_id', flat=True)
+            esperadas.update(
+                (usuario_id, mensagem.id)
+                for usuario_id in timeline.seguidores_com_acesso(mensagem.canal, list(seguidores_ids))
+            )
+        return esperadas
+
+    def test_fan_out_igual_ao_da_escrita(self):
+        with mock.patch('core.sintetico.MAX_ENTRADAS', 10_000):
+            GeradorDados(quantidades=self.QUANTIDADES, escala=0.01, seed=3).executar()
+        gravadas = set(EntradaTimeline.objects.values_list('usuario_id', 'mensagem_id'))
+        self.assertTrue(gravadas)
+        self.assertEqual(gravadas, self._esperadas())
+
+    def test_guarda_so_as_mais_recentes(self):
+        with mock.patch('core.sintetico.MAX_ENTRADAS', 5), mock.patch('core.sintetico.BLOCO_TIMELINE', 50):
+            GeradorDados(quantidades=self.QUANTIDADES, escala=0.01, seed=3).executar()
+        por_usuario = {}
+        for usuario_id, mensagem_id in self._esperadas():
+            por_usuario.setdefault(usuario_id, []).append(mensagem_id)
+        esperadas = {
+            (usuario_id, mensagem_id)
+            for usuario_id, ids in por_usuario.items() for mensagem_id in sorted(ids)[-5:]
+        }
+        self.assertEqual(set(EntradaTimeline.objects.values_list('usuario_id', 'mensagem_id')), esperadas)
+
+
+class DadosSinteticosTestCase(TestCase):
+    # Volume compartilhado pelos testes de desempenho (cerca de 20 mil linhas)
+    ESCALA = 0.02
+    # Com MENSAGENS_SHARDS as mensagens vão para os shards
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        GeradorDados(escala=cls.ESCALA, seed=1, prefixo='orc').executar()
+        # O usuário em mais canais tem o dashboard mais pesado; como admin, vê tudo
+        cls.usuario = (
+            CustomUser.objects.annotate(canais=Count('membros_canal')).order_by('-canais', 'id').first()
+        )
+        cls.usuario.is_staff = cls.usuario.is_superuser = True
+        cls.usuario.save()
+
+
+class OrcamentoViewsTests(DadosSinteticosTestCase):
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_toda_view_tem_orcamento(self):
+        rotas = {nome for nome, _ in _rotas()} - SEM_ORCAMENTO
+        self.assertEqual(rotas, set(ORCAMENTOS), 'Adicione a view nova em ORCAMENTOS')
+
+    def test_consultas_e_tempo_dentro_do_orcamento(self):
+        for nome, kwargs in _rotas():
+            if nome in SEM_ORCAMENTO:
+                continue
+            max_consultas, max_ms = ORCAMENTOS[nome]
+            url = reverse(nome, kwargs=kwargs)
+            with self.subTest(rota=nome, url=url):
+                cache.clear()
+                # Em todos os bancos: com shards parte das consultas sai do default
+                with ExitStack() as pilha:
+                    contextos = [pilha.enter_context(CaptureQueriesContext(connections[banco])) for banco in connections]
+                    inicio = perf_counter()
+                    resposta = self.client.get(url, PARAMETROS.get(nome, {}))
+                    if resposta.streaming:
+                        b''.join(resposta.streaming_content)
+                    ms = (perf_counter() - inicio) * 1000
+                consultas = [consulta for contexto in contextos for consulta in contexto.captured_queries]
+
+                self.assertEqual(resposta.status_code, 200)
+                self.assertLessEqual(
+                    len(consultas), max_consultas,
+                    f'{nome} fez {len(consultas)} consultas (orçamento {max_consultas}):\n'
+                    + resumo_consultas(consultas)
+                )
+                self.assertLessEqual(ms, max_ms, f'{nome} levou {ms:.0f} ms (orçamento {max_ms} ms)')
+
+
+class PerfilamentoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            'perfil', 'perfil@exemplo.com', 'senha', fullname='Perfil', matricula='perfil'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_server_timing_separa_sql_template_e_python(self):
+        with override_settings(PERFILAMENTO_AMOSTRAGEM=0):
+            resposta = self.client.get(reverse('listar_eventos'))
+        metricas = {parte.split(';')[0]: parte for parte in resposta['Server-Timing'].split(', ')}
+        self.assertEqual(set(metricas), {'sql', 'template', 'python', 'total'})
+        self.assertRegex(metricas['sql'], r'sql;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    def test_cadeia_asgi_continua_assincrona(self):
+        # Sem adaptador SyncToAsync entre o servidor e o resto da cadeia
+        cadeia = ASGIHandler()._middleware_chain
+        self.assertTrue(iscoroutinefunction(cadeia))
+        self.assertIsInstance(cadeia.__wrapped__, PerfilamentoMiddleware)
+
+    async def test_server_timing_sob_asgi(self):
+        await self.async_client.aforce_login(self.usuario)
+        with override_settings(PERFILAMENTO_AMOSTRAGEM=0):
+            resposta = await self.async_client.get(reverse('listar_eventos'))
+        self.assertRegex(resposta['Server-Timing'], r'sql;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    def test_requisicao_lenta_sorteada_gera_perfil(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            with override_settings(PERFILAMENTO_AMOSTRAGEM=1, PERFILAMENTO_LIMITE_MS=0, PERFILAMENTO_DIR=diretorio):
+                with self.assertLogs('core.perfilamento', 'WARNING') as logs:
+                    self.client.get(reverse('listar_eventos'))
+            self.assertIn('"rota": "listar_eventos"', logs.output[0])
+            perfis = list(Path(diretorio).glob('*_GET_listar_eventos_*.prof'))
+            self.assertEqual(len(perfis), 1)
+            self.assertTrue(perfis[0].with_suffix('.txt').exists())
+            self.assertGreater(pstats.Stats(str(perfis[0])).total_calls, 0)
+
+    def test_streaming_medido_ate_o_fim_do_corpo(self):
+        staff = criar_usuario('staff', is_staff=True)
+        disciplina = Disciplinas.objects.create(nome='Cálculo', codigo='MAT101')
+        for indice in range(3):
+            avaliacao_disciplina(disciplina, criar_usuario(f'aluno{indice}'), 8).save()
+        self.client.force_login(staff)
+
+        with override_settings(PERFILAMENTO_AMOSTRAGEM=0), CaptureQueriesContext(connection) as contexto:
+            with self.assertLogs('core.perfilamento', 'INFO') as logs:
+                resposta = self.client.get(reverse('exportar_avaliacoes_disciplinas'))
+                # A linha só sai depois que o corpo é consumido
+                self.assertEqual(logs.output, [])
+                corpo = b''.join(resposta.streaming_content)
+
+        self.assertNotIn('Server-Timing', resposta)
+        self.assertEqual(corpo.decode().count('MAT101'), 3)
+        registro = json.loads(logs.output[0].split(':', 2)[2])
+        self.assertEqual((registro['rota'], registro['streaming']), ('exportar_avaliacoes_disciplinas', True))
+        self.assertEqual(registro['consultas'], len(contexto))
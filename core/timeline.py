@@ -0,0 +1,213 @@
+"""
+Timeline de atividades dos usuários seguidos.
+
+Fan-out na escrita: quando alguém posta em um canal, a mensagem é copiada
+para a lista (limitada) de cada seguidor que pode acessar aquele canal.
+Autores com muitos seguidores não fazem fan-out; as mensagens deles são
+mescladas na leitura (fan-out na leitura).
+
+O limite de entradas por seguidor é aplicado fora da requisição pelo
+comando `aparar_timelines` (rode periodicamente, como o enviar_emails). Na
+leitura só aparecem mensagens de canais que o usuário ainda pode acessar.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+
+from . import shards
+from .models import (
+    Canal, EntradaTimeline, MembroCanal, Mensagem, Seguidor, UsuarioCargo
+)
+
+
+# Quantidade máxima de entradas guardadas por seguidor
+MAX_ENTRADAS = getattr(settings, 'TIMELINE_MAX_ENTRADAS', 500)
+
+# Acima deste número de seguidores o autor não faz fan-out na escrita
+LIMITE_FANOUT = getattr(settings, 'TIMELINE_LIMITE_FANOUT', 1000)
+
+# Entradas apagadas por transação ao aparar
+TAMANHO_LOTE = getattr(settings, 'TIMELINE_TAMANHO_LOTE', 1000)
+
+CACHE_AUTORES_POPULARES = 'timeline:autores_populares'
+
+
+def autores_populares():
+    ids = cache.get(CACHE_AUTORES_POPULARES)
+    if ids is None:
+        ids = set(
+            Seguidor.objects.values('seguido_id')
+            .annotate(total=Count('id'))
+            .filter(total__gt=LIMITE_FANOUT)
+            .values_list('seguido_id', flat=True)
+        )
+        cache.set(CACHE_AUTORES_POPULARES, ids, 300)
+    return ids
+
+
+def seguidores_com_acesso(canal, seguidores_ids):
+    if canal.tipo == 'publico':
+        return set(seguidores_ids)
+
+    if canal.tipo == 'privado':
+        return set(
+            MembroCanal.objects.filter(
+                canal=canal,
+                usuario_id__in=seguidores_ids
+            ).values_list('usuario_id', flat=True)
+        )
+
+    if canal.tipo == 'restrito':
+        return set(
+            UsuarioCargo.objects.filter(
+                ativo=True,
+                usuario_id__in=seguidores_ids,
+                cargo__canais=canal
+            ).values_list('usuario_id', flat=True)
+        )
+
+    return set()
+
+
+def canais_inacessiveis(usuario):
+    """
+    Canais que o usuário não acessa (inativos, privados de que não é membro,
+    restritos sem cargo dele). É o complemento dos acessíveis, que crescem
+    com os canais públicos; devolve uma consulta, usada como subconsulta.
+    """
+    cargos_ids = usuario.usuario_cargos.filter(ativo=True).values('cargo_id')
+    return Canal.objects.exclude(
+        Q(tipo='publico')
+        | Q(tipo='privado', id__in=MembroCanal.objects.filter(usuario=usuario).values('canal_id'))
+        | Q(tipo='restrito', id__in=Canal.cargos_permitidos.through.objects.filter(
+            cargo_id__in=cargos_ids
+        ).values('canal_id')),
+        ativo=True
+    ).order_by().values_list('id', flat=True)
+
+
+def aparar_timeline(usuario_id, banco=DEFAULT_DB_ALIAS, tamanho_lote=TAMANHO_LOTE):
+    """Apaga, em lotes, as entradas do usuário além das MAX_ENTRADAS mais recentes."""
+    entradas = EntradaTimeline.objects.using(banco).filter(usuario_id=usuario_id)
+    # A entrada na posição MAX_ENTRADAS sai do índice (usuario, -mensagem)
+    corte = list(
+        entradas.order_by('-mensagem_id').values_list('mensagem_id', flat=True)[MAX_ENTRADAS - 1:MAX_ENTRADAS]
+    )
+    if not corte:
+        return 0
+
+    removidas = 0
+    while True:
+        ids = list(entradas.filter(mensagem_id__lt=corte[0]).values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            return removidas
+        EntradaTimeline.objects.using(banco).filter(id__in=ids).delete()
+        removidas += len(ids)
+
+
+def aparar_timelines(tamanho_lote=TAMANHO_LOTE):
+    """
+    Apara as timelines acima do limite em todos os bancos; devolve
+    {banco: entradas removidas}. Com shards o limite vale por shard; a
+    leitura junta os shards e corta.
+    """
+    removidas = {}
+    for banco in shards.bancos_do_modelo(EntradaTimeline):
+        usuarios_ids = list(
+            EntradaTimeline.objects.using(banco).order_by()
+            .values('usuario_id').annotate(total=Count('id'))
+            .filter(total__gt=MAX_ENTRADAS).values_list('usuario_id', flat=True)
+        )
+        removidas[banco] = sum(aparar_timeline(usuario_id, banco, tamanho_lote) for usuario_id in usuarios_ids)
+    return removidas
+
+
+def distribuir_mensagem(mensagem):
+    """Copia a mensagem para a timeline dos seguidores do autor."""
+    if mensagem.autor_id in autores_populares():
+        return 0
+
+    seguidores_ids = list(
+        Seguidor.objects.filter(seguido_id=mensagem.autor_id)
+        .values_list('seguidor_id', flat=True)
+    )
+    if not seguidores_ids:
+        return 0
+
+    destinatarios = seguidores_com_acesso(mensagem.canal, seguidores_ids)
+    destinatarios.discard(mensagem.autor_id)
+    if not destinatarios:
+        return 0
+
+    # As entradas ficam no mesmo banco (shard) da mensagem
+    banco = mensagem._state.db
+    EntradaTimeline.objects.using(banco).bulk_create(
+        [EntradaTimeline(usuario_id=uid, mensagem=mensagem) for uid in destinatarios],
+        ignore_conflicts=True
+    )
+    return len(destinatarios)
+
+
+def timeline_usuario(usuario, antes=None, limite=20):
+    """
+    Retorna até `limite` mensagens para a timeline do usuário, da mais
+    recente para a mais antiga. `antes` é o id da última mensagem da página
+    anterior (paginação por cursor).
+    """
+    # Entradas de canais que o usuário deixou de acessar depois do fan-out
+    # continuam na tabela; o filtro por canal as esconde
+    inacessiveis = canais_inacessiveis(usuario)
+    if any(banco != DEFAULT_DB_ALIAS for banco in shards.bancos()):
+        # Subconsulta não atravessa bancos: os shards recebem a lista
+        inacessiveis = list(inacessiveis)
+
+    # Os ids de mensagem são únicos entre os shards (core/shards.py), então
+    # cada shard devolve seus `limite` mais recentes e o corte é feito aqui
+    candidatos = {}
+    for banco in shards.bancos():
+        entradas = EntradaTimeline.objects.using(banco).filter(usuario=usuario).exclude(
+            mensagem__canal_id__in=inacessiveis
+        )
+        if antes:
+            entradas = entradas.filter(mensagem_id__lt=antes)
+        candidatos.update(dict.fromkeys(
+            entradas.order_by('-mensagem_id').values_list('mensagem_id', flat=True)[:limite],
+            banco
+        ))
+
+    # Autores populares seguidos pelo usuário são lidos diretamente
+    populares = autores_populares()
+    if populares:
+        seguidos_populares = list(
+            Seguidor.objects.filter(
+                seguidor=usuario,
+                seguido_id__in=populares
+            ).values_list('seguido_id', flat=True)
+        )
+        if seguidos_populares:
+            for banco in shards.bancos():
+                extras = Mensagem.objects.using(banco).filter(
+                    autor_id__in=seguidos_populares
+                ).exclude(canal_id__in=inacessiveis)
+                if antes:
+                    extras = extras.filter(id__lt=antes)
+                candidatos.update(dict.fromkeys(
+                    extras.order_by('-id').values_list('id', flat=True)[:limite],
+                    banco
+                ))
+
+    por_banco = {}
+    for mensagem_id in sorted(candidatos, reverse=True)[:limite]:
+        por_banco.setdefault(candidatos[mensagem_id], []).append(mensagem_id)
+
+    mensagens = []
+    for banco, ids in por_banco.items():
+        mensagens.extend(shards.relacionados(
+            Mensagem.objects.using(banco).filter(id__in=ids), 'autor', 'canal'
+        ))
+    mensagens.sort(key=lambda mensagem: mensagem.id, reverse=True)
+
+    proximo = mensagens[-1].id if len(mensagens) == limite else None
+    return mensagens, proximo
@@ -0,0 +1,46 @@
+"""
+Versões compartilhadas entre processos.
+
+Cada processo guarda caches locais (o catálogo, a alocação dos shards) com
+a versão com que foram montados. Quem altera os dados chama renovar(), que
+grava uma versão aleatória (nunca volta a um valor já visto, nem depois de
+um rollback) numa linha do banco default. Os workers web e os comandos de
+manutenção enxergam essa linha, ao contrário do cache do Django
+(LocMemCache, um por processo, quando CACHES não é configurado).
+
+Para não consultar o banco a cada uso, a versão lida vale por
+VERSOES_INTERVALO segundos no processo: outros processos percebem a
+mudança no máximo esse tempo depois; o processo que renovou, na hora.
+"""
+
+import threading
+import uuid
+from time import monotonic
+
+from django.conf import settings
+
+from .models import VersaoCompartilhada
+
+
+INTERVALO = getattr(settings, 'VERSOES_INTERVALO', 5)
+
+_lock = threading.Lock()
+# chave -> (versão, instante da leitura)
+_lidas = {}
+
+
+def versao(chave):
+    lida = _lidas.get(chave)
+    if lida is not None and monotonic() - lida[1] < INTERVALO:
+        return lida[0]
+
+    atual = VersaoCompartilhada.objects.filter(chave=chave).values_list('versao', flat=True).first() or ''
+    with _lock:
+        _lidas[chave] = (atual, monotonic())
+    return atual
+
+
+def renovar(chave):
+    VersaoCompartilhada.objects.update_or_create(chave=chave, defaults={'versao': uuid.uuid4().hex})
+    with _lock:
+        _lidas.pop(chave, None)
@@ -1,15 +1,17 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, update_session_auth_hash
+from django.core.paginator import Paginator
+from django.contrib.auth import login, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.urls import reverse
-from django.db.models import Q, Avg
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.contrib.auth.hashers import make_password
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from random import randint
 import calendar
 
@@ -17,15 +19,20 @@ from .forms import (
     CustomUserCreationForm, EditarPerfilForm, 
     CriarCanalForm, EnviarMensagemForm,
     BuscarUsuarioForm, CriarCargoForm, AlterarSenhaForm,
-    CriarEventoForm, EditarEventoForm
+    CriarEventoForm, EditarEventoForm, AvaliacaoDisciplinaForm,
+    AvaliacaoLoteFormSet
 )
 
 from .models import (
     CustomUser, Cargo, UsuarioCargo, Canal, MembroCanal, 
-    Mensagem, Notificacao, Novidade, Evento, Seguidor, PesquisaRecente, 
-    ChatRequest, CargoRequest, Disciplinas, Professores, Avaliacao, AvaliacaoDisciplina
+    Notificacao, Novidade, Evento, Seguidor, PesquisaRecente, 
+    ChatRequest, CargoRequest, Professores, Avaliacao, AvaliacaoDisciplina,
+    PosicaoRanking, periodo_atual
 )
 from django.views.decorators.http import require_http_methods
+from . import agregados, autenticacao, catalogo, commit_em_grupo, emails, estatisticas, expurgo, moderacao, painel, shards
+from .exportacao import resposta_exportacao
+from . import timeline as timeline_service
 
 
 # AUTENTICAÇÃO 
@@ -50,20 +57,33 @@ def registro(request):
     return render(request, 'registro.html', {'form': form})
 
 
-def logando(request):
+async def logando(request):
+    # Assíncrona: o hash da senha roda no pool de core/autenticacao.py
     if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        user = authenticate(username=username, password=password)
+        username = request.POST.get('username') or ''
+        password = request.POST.get('password') or ''
         
-        if user:
-            login(request, user)
+        try:
+            await autenticacao.limitar_tentativas(autenticacao.ip_cliente(request), username)
+            user = await CustomUser.objects.filter(username=username).afirst()
+            valida, novo_hash = await autenticacao.averificar_senha(password, user.password if user else None)
+        except autenticacao.LoginRecusado as erro:
+            messages.error(request, str(erro))
+            return await sync_to_async(render)(request, 'login.html', status=erro.status)
+        
+        if valida and user.is_active:
+            if novo_hash:
+                # O hash da sessão sai de user.password; com o antigo, a
+                # próxima requisição não bateria com o banco e deslogaria
+                user.password = novo_hash
+                await CustomUser.objects.filter(pk=user.pk).aupdate(password=novo_hash)
+            await sync_to_async(login)(request, user, backend='django.contrib.auth.backends.ModelBackend')
             messages.success(request, f'Bem-vindo de volta, {user.fullname or user.username}!')
             return redirect('dashboard')
         else:
             messages.error(request, "Usuário ou senha incorretos.")
     
-    return render(request, 'login.html')
+    return await sync_to_async(render)(request, 'login.html')
 
 
 def esqueci_senha(request):
@@ -97,13 +117,8 @@ Caso você não tenha solicitado, basta ignorar este e-mail.
 Atenciosamente,
 Equipe Rede Acadêmica
 """
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@redeacademica.com'),
-                    recipient_list=[email],
-                    fail_silently=False,
-                )
+                # Vai para a caixa de saída; o comando enviar_emails faz o envio
+                emails.enfileirar_email(subject, message, [email])
 
                 messages.success(request, 'Código enviado! Verifique seu e-mail.')
                 return render(request, 'esqueci_senha.html', {'email': email})
@@ -220,23 +235,22 @@ def dashboard(request):
         id__in=canais_ids
     ).prefetch_related('membros', 'cargos_permitidos')
     
+    # Uma consulta por shard em vez de uma por canal
+    ultimas_mensagens = shards.ultimas_mensagens(canais_ids)
+    
+    # Não lidas: a leitura de cada canal do usuário e uma contagem por shard
+    leituras = dict(
+        MembroCanal.objects.filter(usuario=user, canal_id__in=canais_ids)
+        .values_list('canal_id', 'ultima_leitura')
+    )
+    nao_lidas = shards.mensagens_nao_lidas(leituras)
+    
     for canal in canais_disponiveis:
-        # Mensagens não lidas
-        try:
-            membro_canal = canal.canal_membros.get(usuario=user)
-            ultima_leitura = membro_canal.ultima_leitura
-            
-            if ultima_leitura:
-                canal.mensagens_nao_lidas = canal.mensagens.filter(
-                    created_at__gt=ultima_leitura
-                ).count()
-            else:
-                canal.mensagens_nao_lidas = canal.mensagens.count()
-        except:
-            canal.mensagens_nao_lidas = 0
+        # Fora dos membros do canal não há contagem
+        canal.mensagens_nao_lidas = nao_lidas.get(canal.id, 0)
         
         # Última mensagem
-        canal.ultima_mensagem = canal.mensagens.order_by('-created_at').first()
+        canal.ultima_mensagem = ultimas_mensagens.get(canal.id)
     
     # Ordenar por última atividade
     canais_disponiveis = sorted(
@@ -294,10 +308,10 @@ def dashboard(request):
     
     # Eventos por dia do mês para marcar no calendário
     eventos_por_dia = {}
+    # Intervalo de datas em vez de data__month, que impede o uso do índice
     eventos_mes = Evento.objects.filter(
         ativo=True,
-        data__year=ano_cal,
-        data__month=mes_cal
+        data__range=(date(ano_cal, mes_cal, 1), date(ano_cal, mes_cal, calendar.monthrange(ano_cal, mes_cal)[1]))
     )
     for evento in eventos_mes:
         dia = evento.data.day
@@ -505,7 +519,7 @@ def busca_usuarios(request):
 
     # Busca
     if query:
-        perfis = CustomUser.objects.filter(
+        perfis = CustomUser.objects.filter(is_active=True).filter(
             Q(username__icontains=query) |
             Q(fullname__icontains=query) |
             Q(email__icontains=query) |
@@ -526,10 +540,7 @@ def busca_usuarios(request):
         perfil_selecionado = perfis[0]
 
         # Salva pesquisa recente
-        PesquisaRecente.objects.get_or_create(
-            usuario=user,
-            usuario_pesquisado=perfil_selecionado
-        )
+        PesquisaRecente.registrar(user, perfil_selecionado)
 
         # Dados do usuário selecionado
         usuario_selecionado = {
@@ -583,11 +594,30 @@ def limpar_pesquisas(request):
     return redirect('busca_usuarios')
 
 
+# TIMELINE
+
+@login_required
+def timeline(request):
+    try:
+        antes = int(request.GET.get('antes', ''))
+    except ValueError:
+        antes = None
+    
+    mensagens, proximo = timeline_service.timeline_usuario(request.user, antes=antes)
+    
+    context = {
+        'mensagens': mensagens,
+        'proximo': proximo,
+    }
+    
+    return render(request, 'timeline.html', context)
+
+
 # CANAIS E CHAT 
 
 @login_required
 def chat(request, canal_id):
-    canal = get_object_or_404(Canal, id=canal_id)
+    canal = get_object_or_404(Canal, id=canal_id, ativo=True)
     
     # Verificar acesso
     if not canal.usuario_pode_acessar(request.user):
@@ -599,21 +629,16 @@ def chat(request, canal_id):
         form = EnviarMensagemForm(request.POST, request.FILES)
         
         if form.is_valid():
-            mensagem = Mensagem.objects.create(
+            # Com MENSAGENS_COMMIT_EM_GRUPO a gravação é feita em lote (core/commit_em_grupo.py)
+            mensagem = commit_em_grupo.criar_mensagem(
                 canal=canal,
                 autor=request.user,
                 conteudo=form.cleaned_data['conteudo'],
-                arquivo=form.cleaned_data.get('arquivo')
+                arquivo=form.cleaned_data.get('arquivo'),
+                responde_a_id=form.cleaned_data.get('responde_a'),
             )
             
-            # Se for resposta a outra mensagem
-            responde_a_id = form.cleaned_data.get('responde_a')
-            if responde_a_id:
-                try:
-                    mensagem.responde_a = Mensagem.objects.get(id=responde_a_id)
-                    mensagem.save()
-                except Mensagem.DoesNotExist:
-                    pass
+            timeline_service.distribuir_mensagem(mensagem)
             
             messages.success(request, 'Mensagem enviada!')
             return redirect('chat', canal_id=canal.id)
@@ -621,9 +646,8 @@ def chat(request, canal_id):
         form = EnviarMensagemForm()
     
     # Buscar mensagens
-    mensagens = Mensagem.objects.filter(
-        canal=canal
-    ).select_related('autor').order_by('created_at')
+    # canal.mensagens é roteado para o shard do canal
+    mensagens = shards.relacionados(canal.mensagens.all(), 'autor').order_by('created_at')
     
     # Atualizar última leitura
     try:
@@ -682,7 +706,7 @@ def criar_canal(request):
 
 @login_required
 def enviar_mensagem(request, canal_id):
-    canal = get_object_or_404(Canal, id=canal_id)
+    canal = get_object_or_404(Canal, id=canal_id, ativo=True)
     
     if not canal.usuario_pode_acessar(request.user):
         messages.error(request, 'Você não tem permissão para enviar mensagens neste canal.')
@@ -692,20 +716,16 @@ def enviar_mensagem(request, canal_id):
         form = EnviarMensagemForm(request.POST, request.FILES)
         
         if form.is_valid():
-            mensagem = Mensagem.objects.create(
+            # Com MENSAGENS_COMMIT_EM_GRUPO a gravação é feita em lote (core/commit_em_grupo.py)
+            mensagem = commit_em_grupo.criar_mensagem(
                 canal=canal,
                 autor=request.user,
                 conteudo=form.cleaned_data['conteudo'],
-                arquivo=form.cleaned_data.get('arquivo')
+                arquivo=form.cleaned_data.get('arquivo'),
+                responde_a_id=form.cleaned_data.get('responde_a'),
             )
             
-            responde_a_id = form.cleaned_data.get('responde_a')
-            if responde_a_id:
-                try:
-                    mensagem.responde_a = Mensagem.objects.get(id=responde_a_id)
-                    mensagem.save()
-                except Mensagem.DoesNotExist:
-                    pass
+            timeline_service.distribuir_mensagem(mensagem)
             
             messages.success(request, 'Mensagem enviada!')
         else:
@@ -750,6 +770,13 @@ def criar_cargo(request):
 
 # ADMIN PANEL
 
+LISTAS_PAINEL = {
+    'usuarios': (painel.listar_usuarios, painel.usuario_json),
+    'canais': (painel.listar_canais, painel.canal_json),
+    'cargos': (painel.listar_cargos, painel.cargo_json),
+}
+
+
 @login_required
 def admin_panel(request):
     if not request.user.is_staff:
@@ -757,39 +784,64 @@ def admin_panel(request):
         return redirect('dashboard')
     
     # Chat Requests pendentes
-    chat_requests = ChatRequest.objects.filter(status='pendente').select_related('solicitado_por').prefetch_related('cargos_permitidos')
+    chat_requests = list(
+        ChatRequest.objects.filter(status='pendente').select_related('solicitado_por').prefetch_related('cargos_permitidos')
+    )
     
     # Cargo Requests pendentes
-    cargo_requests = CargoRequest.objects.filter(status='pendente').select_related('solicitado_por')
-    
-    # Estatísticas
-    total_usuarios = CustomUser.objects.count()
-    total_canais = Canal.objects.count()
-    total_cargos = Cargo.objects.count()
-    total_chat_requests = ChatRequest.objects.filter(status='pendente').count()
-    total_cargo_requests = CargoRequest.objects.filter(status='pendente').count()
+    cargo_requests = list(
+        CargoRequest.objects.filter(status='pendente').select_related('solicitado_por')
+    )
     
-    # Listas para edição
-    usuarios = CustomUser.objects.all().order_by('-created_at')[:50]
-    canais = Canal.objects.all().order_by('-created_at')[:50]
-    cargos = Cargo.objects.all().order_by('nome')
+    # Estatísticas (cache de curta duração)
+    estatisticas = painel.estatisticas_painel()
     
     context = {
         'chat_requests': chat_requests,
         'cargo_requests': cargo_requests,
-        'total_usuarios': total_usuarios,
-        'total_canais': total_canais,
-        'total_cargos': total_cargos,
-        'total_chat_requests': total_chat_requests,
-        'total_cargo_requests': total_cargo_requests,
-        'usuarios': usuarios,
-        'canais': canais,
-        'cargos': cargos,
+        'total_chat_requests': len(chat_requests),
+        'total_cargo_requests': len(cargo_requests),
+        **estatisticas,
     }
     
+    # Listas para edição: busca e paginação por cursor independentes
+    for nome, (listar, _) in LISTAS_PAINEL.items():
+        q = request.GET.get(f'{nome}_q', '').strip()
+        itens, proximo = listar(q, request.GET.get(f'{nome}_apos'))
+        
+        context[nome] = itens
+        context[f'{nome}_q'] = q
+        context[f'{nome}_proximo'] = None
+        if proximo is not None:
+            parametros = request.GET.copy()
+            parametros[f'{nome}_apos'] = proximo
+            context[f'{nome}_proximo'] = f'?{parametros.urlencode()}'
+    
     return render(request, 'admin_panel.html', context)
 
 
+@login_required
+def admin_panel_lista(request, lista):
+    if not request.user.is_staff:
+        return JsonResponse({'erro': 'Sem permissão.'}, status=403)
+    
+    if lista not in LISTAS_PAINEL:
+        raise Http404("Lista não encontrada.")
+    
+    listar, serializar = LISTAS_PAINEL[lista]
+    try:
+        limite = min(max(int(request.GET.get('limite', painel.TAMANHO_PAGINA)), 1), 200)
+    except ValueError:
+        limite = painel.TAMANHO_PAGINA
+    
+    itens, proximo = listar(request.GET.get('q', '').strip(), request.GET.get('apos'), limite)
+    
+    return JsonResponse({
+        'resultados': [serializar(item) for item in itens],
+        'proximo': proximo,
+    })
+
+
 @login_required
 def aceitar_chat_request(request, request_id):
     if not request.user.is_staff:
@@ -824,6 +876,7 @@ def aceitar_chat_request(request, request_id):
     chat_request.status = 'aprovado'
     chat_request.aprovado_por = request.user
     chat_request.save()
+    painel.invalidar_estatisticas_painel()
     
     messages.success(request, f'Chat "{canal.nome}" aprovado e criado com sucesso!')
     return redirect('admin_panel')
@@ -866,9 +919,9 @@ def deletar_usuario(request, usuario_id):
         messages.error(request, 'Você não pode deletar seu próprio usuário.')
         return redirect('admin_panel')
     
-    username = usuario.username
-    usuario.delete()
-    messages.success(request, f'Usuário "{username}" deletado com sucesso.')
+    # Desativa na hora; o histórico é apagado em lotes pelo comando expurgar_removidos
+    expurgo.agendar_exclusao_usuario(usuario, request.user)
+    messages.success(request, f'Usuário "{usuario.username}" removido. O histórico será apagado em segundo plano.')
     return redirect('admin_panel')
 
 
@@ -879,9 +932,8 @@ def deletar_canal(request, canal_id):
         return redirect('dashboard')
     
     canal = get_object_or_404(Canal, id=canal_id)
-    nome = canal.nome
-    canal.delete()
-    messages.success(request, f'Canal "{nome}" deletado com sucesso.')
+    expurgo.agendar_exclusao_canal(canal, request.user)
+    messages.success(request, f'Canal "{canal.nome}" removido. As mensagens serão apagadas em segundo plano.')
     return redirect('admin_panel')
 
 
@@ -894,6 +946,7 @@ def deletar_cargo(request, cargo_id):
     cargo = get_object_or_404(Cargo, id=cargo_id)
     nome = cargo.nome
     cargo.delete()
+    painel.invalidar_estatisticas_painel()
     messages.success(request, f'Cargo "{nome}" deletado com sucesso.')
     return redirect('admin_panel')
 
@@ -918,6 +971,7 @@ def aceitar_cargo_request(request, request_id):
     cargo_request.status = 'aprovado'
     cargo_request.aprovado_por = request.user
     cargo_request.save()
+    painel.invalidar_estatisticas_painel()
     
     messages.success(request, f'Cargo "{cargo.nome}" aprovado e criado com sucesso!')
     return redirect('admin_panel')
@@ -947,56 +1001,66 @@ def recusar_cargo_request(request, request_id):
     }
     return render(request, 'recusar_cargo_request.html', context)
 
+
+@login_required
+@require_http_methods(["POST"])
+def moderar_solicitacoes(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Você não tem permissão para realizar esta ação.')
+        return redirect('dashboard')
+    
+    tipo = request.POST.get('tipo')
+    acao = request.POST.get('acao')
+    motivo = request.POST.get('motivo', '')
+    ids = [valor for valor in request.POST.getlist('ids') if valor.isdigit()]
+    
+    if tipo not in ('chat', 'cargo') or acao not in ('aprovar', 'recusar'):
+        messages.error(request, 'Ação de moderação inválida.')
+        return redirect('admin_panel')
+    
+    if not ids:
+        messages.error(request, 'Selecione ao menos uma solicitação.')
+        return redirect('admin_panel')
+    
+    if tipo == 'chat':
+        if acao == 'aprovar':
+            total = moderacao.aprovar_chat_requests(ids, request.user)
+            messages.success(request, f'{total} solicitação(ões) de chat aprovada(s).')
+        else:
+            total = moderacao.recusar_chat_requests(ids, request.user, motivo)
+            messages.success(request, f'{total} solicitação(ões) de chat recusada(s).')
+    else:
+        if acao == 'aprovar':
+            total, ignoradas = moderacao.aprovar_cargo_requests(ids, request.user)
+            messages.success(request, f'{total} solicitação(ões) de cargo aprovada(s).')
+            if ignoradas:
+                messages.warning(request, f'{ignoradas} solicitação(ões) ignorada(s): já existe um cargo com o mesmo nome.')
+        else:
+            total = moderacao.recusar_cargo_requests(ids, request.user, motivo)
+            messages.success(request, f'{total} solicitação(ões) de cargo recusada(s).')
+    
+    return redirect('admin_panel')
+
 @login_required
 def avaliacao_professores(request):
     q = request.GET.get("q", "").strip()  # Adiciona validação
     
     disciplina = None
+    candidatos = []
     professores_data = []
 
     if q:
-        disciplina = Disciplinas.objects.filter(
-            Q(codigo__icontains=q) | Q(nome__icontains=q)
-        ).first()
+        candidatos = catalogo.buscar_disciplinas(q)
+        disciplina = candidatos[0] if candidatos else None
 
         if disciplina:
-            # OTIMIZAÇÃO: Uma única query com agregações
-            professores = Professores.objects.filter(
-                disciplinas=disciplina
-            ).annotate(
-                avg_dominio=Avg('avaliacao__dominio', 
-                               filter=Q(avaliacao__disciplina=disciplina)),
-                avg_metodos=Avg('avaliacao__metodos', 
-                               filter=Q(avaliacao__disciplina=disciplina)),
-                avg_relacionamento=Avg('avaliacao__relacionamento', 
-                                      filter=Q(avaliacao__disciplina=disciplina)),
-                avg_compatibilidade=Avg('avaliacao__compatibilidade', 
-                                       filter=Q(avaliacao__disciplina=disciplina)),
-                avg_clareza=Avg('avaliacao__clareza', 
-                               filter=Q(avaliacao__disciplina=disciplina)),
-            ).values(
-                'nome', 
-                'avg_dominio', 
-                'avg_metodos', 
-                'avg_relacionamento', 
-                'avg_compatibilidade', 
-                'avg_clareza'
-            )
-
-            # Formata os dados
-            for prof in professores:
-                professores_data.append({
-                    "nome": prof['nome'],
-                    "dominio": round(prof['avg_dominio'] or 0, 2),
-                    "metodos": round(prof['avg_metodos'] or 0, 2),
-                    "relacionamento": round(prof['avg_relacionamento'] or 0, 2),
-                    "compatibilidade": round(prof['avg_compatibilidade'] or 0, 2),
-                    "clareza": round(prof['avg_clareza'] or 0, 2),
-                })
+            # Médias lidas dos agregados por (professor, disciplina)
+            professores_data = agregados.medias_professores(disciplina)
 
     return render(request, "avaliacao_professores.html", {
         "disciplina": disciplina,
         "professores": professores_data,
+        "candidatos": candidatos if len(candidatos) > 1 else [],
         "q": q,
     })
 
@@ -1006,62 +1070,60 @@ def avaliacao_disciplina(request):
     q = request.GET.get("q", "").strip()  # Adiciona validação
     
     disciplina = None
+    candidatos = []
     medias = {}
 
     if q:
-        disciplina = Disciplinas.objects.filter(
-            Q(codigo__icontains=q) | Q(nome__icontains=q)
-        ).first()
+        candidatos = catalogo.buscar_disciplinas(q)
+        disciplina = candidatos[0] if candidatos else None
 
         if disciplina:
-            # OTIMIZAÇÃO: Uma única query com todas as agregações
-            avaliacoes = AvaliacaoDisciplina.objects.filter(
-                disciplina=disciplina
-            ).aggregate(
-                avg_contribuicao=Avg("contribuicao"),
-                avg_equilibrio=Avg("equilibrio"),
-                avg_aplicacao=Avg("aplicacao"),
-                avg_material=Avg("material"),
-                avg_distribuicao=Avg("distribuicao"),
-            )
-            
-            medias = {
-                "contribuicao": round(avaliacoes["avg_contribuicao"] or 0, 2),
-                "equilibrio": round(avaliacoes["avg_equilibrio"] or 0, 2),
-                "aplicacao": round(avaliacoes["avg_aplicacao"] or 0, 2),
-                "material": round(avaliacoes["avg_material"] or 0, 2),
-                "distribuicao": round(avaliacoes["avg_distribuicao"] or 0, 2),
-            }
+            # Médias lidas da tabela de agregados (sem varrer as avaliações)
+            medias = agregados.medias_disciplina(disciplina)
 
     return render(request, "avaliacao_disciplina.html", {
         "disciplina": disciplina,
         "medias": medias,
+        "candidatos": candidatos if len(candidatos) > 1 else [],
         "q": q,
     })
 
 @login_required
 def avaliar_disciplina(request, codigo):
     # 1. Buscar disciplina usando o código vindo da URL
-    disciplina = get_object_or_404(
-        Disciplinas,
-        Q(codigo__iexact=codigo) | Q(nome__iexact=codigo)
-    )
+    disciplina = catalogo.disciplina_por_codigo(codigo)
+    if disciplina is None:
+        raise Http404("Disciplina não encontrada.")
 
     # 2. Se for POST, salvar avaliação
     if request.method == "POST":
-        AvaliacaoDisciplina.objects.create(
-            disciplina=disciplina,
+        form = AvaliacaoDisciplinaForm(request.POST)
+        
+        ja_avaliou = AvaliacaoDisciplina.objects.filter(
             usuario=request.user,
-            contribuicao=request.POST["contribuicao"],
-            equilibrio=request.POST["equilibrio"],
-            aplicacao=request.POST["aplicacao"],
-            material=request.POST["material"],
-            distribuicao=request.POST["distribuicao"],
-            comentario=request.POST.get("comentario", "")
-        )
-
-        messages.success(request, 'Avaliação enviada com sucesso!')
-        return redirect(f"{reverse('avaliacao_disciplina')}?q={disciplina.codigo}")
+            disciplina=disciplina,
+            periodo=periodo_atual()
+        ).exists()
+        
+        if ja_avaliou:
+            messages.error(request, 'Você já avaliou esta disciplina neste período.')
+        elif form.is_valid():
+            avaliacao = form.save(commit=False)
+            avaliacao.disciplina = disciplina
+            avaliacao.usuario = request.user
+            avaliacao.periodo = periodo_atual()
+            try:
+                with transaction.atomic():
+                    avaliacao.save()
+                    agregados.registrar_avaliacao_disciplina(avaliacao)
+            except IntegrityError:
+                # Envio duplo: a outra requisição gravou depois do exists()
+                messages.error(request, 'Você já avaliou esta disciplina neste período.')
+            else:
+                messages.success(request, 'Avaliação enviada com sucesso!')
+                return redirect(f"{reverse('avaliacao_disciplina')}?q={disciplina.codigo}")
+        else:
+            messages.error(request, 'As notas devem ser números inteiros de 0 a 10.')
 
     # 3. Renderizar formulário
     return render(request, "avalie_disciplina.html", {
@@ -1069,6 +1131,185 @@ def avaliar_disciplina(request, codigo):
         "q": codigo,  # apenas para mostrar no campo de busca se precisar
     })
 
+# ESTATÍSTICAS (JSON para os gráficos)
+
+@login_required
+def estatisticas_disciplina(request, codigo):
+    disciplina = catalogo.disciplina_por_codigo(codigo)
+    if disciplina is None:
+        raise Http404("Disciplina não encontrada.")
+    
+    return JsonResponse({
+        'disciplina': {'codigo': disciplina.codigo, 'nome': disciplina.nome},
+        **estatisticas.estatisticas_disciplina(disciplina.id),
+    })
+
+
+@login_required
+def estatisticas_professor(request, professor_id):
+    professor = get_object_or_404(Professores, id=professor_id)
+    
+    disciplina = None
+    codigo = request.GET.get('disciplina')
+    if codigo:
+        disciplina = catalogo.disciplina_por_codigo(codigo)
+        if disciplina is None:
+            raise Http404("Disciplina não encontrada.")
+    
+    return JsonResponse({
+        'professor': {'id': professor.id, 'nome': professor.nome},
+        'disciplina': disciplina.codigo if disciplina else None,
+        **estatisticas.estatisticas_professor(professor.id, disciplina.id if disciplina else None),
+    })
+
+
+# EXPORTAÇÃO (somente staff)
+
+def _filtro_periodo(request, queryset, campo):
+    # `inicio` e `fim` valem como sinônimos de `de` e `ate`
+    for parametro, lookup in (('de', 'gte'), ('inicio', 'gte'), ('ate', 'lte'), ('fim', 'lte')):
+        valor = request.GET.get(parametro)
+        if valor:
+            try:
+                data = datetime.strptime(valor, '%Y-%m-%d').date()
+            except ValueError:
+                # Ignorar o filtro exportaria a tabela inteira
+                raise BadRequest(f'Data inválida em "{parametro}": use AAAA-MM-DD.')
+            queryset = queryset.filter(**{f'{campo}__date__{lookup}': data})
+    return queryset
+
+
+def _opcoes_exportacao(request):
+    return {
+        'formato': request.GET.get('formato', 'csv'),
+        'comprimir': request.GET.get('gzip') == '1',
+    }
+
+
+@login_required
+def exportar_avaliacoes_disciplinas(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Você não tem permissão para realizar esta ação.')
+        return redirect('dashboard')
+    
+    avaliacoes = AvaliacaoDisciplina.objects.order_by('id')
+    
+    codigo = request.GET.get('disciplina')
+    if codigo:
+        disciplina = catalogo.disciplina_por_codigo(codigo)
+        if disciplina is None:
+            raise Http404("Disciplina não encontrada.")
+        avaliacoes = avaliacoes.filter(disciplina=disciplina)
+    
+    avaliacoes = _filtro_periodo(request, avaliacoes, 'criado_em')
+    
+    colunas = (
+        'id', 'disciplina__codigo', 'disciplina__nome', 'usuario__username',
+        'contribuicao', 'equilibrio', 'aplicacao', 'material', 'distribuicao',
+        'comentario', 'criado_em',
+    )
+    return resposta_exportacao(avaliacoes, colunas, 'avaliacoes_disciplinas', **_opcoes_exportacao(request))
+
+
+@login_required
+def exportar_avaliacoes_professores(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Você não tem permissão para realizar esta ação.')
+        return redirect('dashboard')
+    
+    avaliacoes = Avaliacao.objects.order_by('id')
+    
+    codigo = request.GET.get('disciplina')
+    if codigo:
+        disciplina = catalogo.disciplina_por_codigo(codigo)
+        if disciplina is None:
+            raise Http404("Disciplina não encontrada.")
+        avaliacoes = avaliacoes.filter(disciplina=disciplina)
+    # Avaliações sem data (anteriores ao campo) ficam fora quando há período
+    avaliacoes = _filtro_periodo(request, avaliacoes, 'criado_em')
+    
+    colunas = (
+        'id', 'professor__nome', 'disciplina__codigo', 'disciplina__nome',
+        'dominio', 'metodos', 'relacionamento', 'compatibilidade', 'clareza',
+        'comentario', 'criado_em',
+    )
+    return resposta_exportacao(avaliacoes, colunas, 'avaliacoes_professores', **_opcoes_exportacao(request))
+
+
+@login_required
+def exportar_mensagens_canal(request, canal_id):
+    if not request.user.is_staff:
+        messages.error(request, 'Você não tem permissão para realizar esta ação.')
+        return redirect('dashboard')
+    
+    canal = get_object_or_404(Canal, id=canal_id)
+    mensagens = _filtro_periodo(request, canal.mensagens.order_by('id'), 'created_at')
+    
+    colunas = (
+        'id', 'autor__username', 'conteudo', 'arquivo', 'responde_a_id',
+        'editada', 'created_at',
+    )
+    # Com shards os autores ficam em outro banco
+    entre_bancos = {'autor__username': ('autor_id', CustomUser, 'username')} if shards.SHARDS else None
+    return resposta_exportacao(
+        mensagens, colunas, f'canal_{canal.id}_mensagens', entre_bancos=entre_bancos, **_opcoes_exportacao(request)
+    )
+
+
+# RANKING
+
+@login_required
+def ranking(request, tipo):
+    posicoes = PosicaoRanking.objects.filter(
+        tipo=tipo
+    ).select_related('disciplina', 'professor').order_by('posicao')
+    
+    pagina = Paginator(posicoes, 25).get_page(request.GET.get('pagina'))
+    
+    return render(request, "ranking.html", {
+        "tipo": tipo,
+        "pagina": pagina,
+    })
+
+@login_required
+def avaliar_disciplinas_lote(request):
+    if request.method == "POST":
+        formset = AvaliacaoLoteFormSet(request.POST, usuario=request.user)
+        
+        if formset.is_valid():
+            avaliacoes = []
+            for form in formset:
+                if not form.has_changed():
+                    continue
+                avaliacao = form.save(commit=False)
+                avaliacao.usuario = request.user
+                avaliacao.periodo = periodo_atual()
+                avaliacoes.append(avaliacao)
+            
+            try:
+                with transaction.atomic():
+                    AvaliacaoDisciplina.objects.bulk_create(avaliacoes)
+                    agregados.registrar_avaliacoes_disciplinas(avaliacoes)
+            except IntegrityError:
+                # Outra requisição gravou uma das avaliações ao mesmo tempo
+                messages.error(request, 'Você já avaliou uma destas disciplinas neste período.')
+            else:
+                messages.success(request, f'{len(avaliacoes)} avaliação(ões) enviada(s) com sucesso!')
+                return redirect('avaliacao_disciplina')
+        else:
+            messages.error(request, 'Por favor, corrija os erros abaixo.')
+    else:
+        codigos = [c for c in request.GET.get('disciplinas', '').split(',') if c.strip()]
+        formset = AvaliacaoLoteFormSet(
+            initial=[{'disciplina_codigo': c.strip()} for c in codigos] or [{}],
+            usuario=request.user
+        )
+    
+    return render(request, "avaliar_disciplinas_lote.html", {
+        "formset": formset,
+        "periodo": periodo_atual(),
+    })
+
 def telaavdisciplina1(request): return render(request, 'indexavdisciplina1.html')
 def telaavdisciplina2(request): return render(request, 'indexavdisciplina2.html')
 def telaavdisciplina3(request): return render(request, 'indexavdisciplina3.html')
@@ -1106,10 +1347,10 @@ def listar_eventos(request):
     
     # Eventos por dia do mês
     eventos_por_dia = {}
+    # Intervalo de datas em vez de data__month, que impede o uso do índice
     eventos_mes = Evento.objects.filter(
         ativo=True,
-        data__year=ano_cal,
-        data__month=mes_cal
+        data__range=(date(ano_cal, mes_cal, 1), date(ano_cal, mes_cal, calendar.monthrange(ano_cal, mes_cal)[1]))
     )
     for evento in eventos_mes:
         dia = evento.data.day